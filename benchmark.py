@@ -0,0 +1,78 @@
+#!/usr/bin/env -S uv run
+import sys
+import time
+import argparse
+from typing import Iterable
+from race_harness.parser import RHParser
+from race_harness.ir import RHContext
+from race_harness.ir.transform import optimize_module_control_flow
+from race_harness.ir.util import rh_process_reachable_blocks
+
+def generate_model(statements: int) -> str:
+    lines = [
+        'channel messages {',
+        '    ping',
+        '}',
+        '',
+        'proc worker in messages out messages (peer) {',
+        '    loop {'
+    ]
+    for index in range(statements):
+        if index % 3 == 0:
+            lines.append(f'        if nondet then {{ do step{index} }} else if recv ping then send ping peer')
+        elif index % 3 == 1:
+            lines.append(f'        spin{index}: loop if nondet then do spin{index} else break spin{index}')
+        else:
+            lines.append(f'        do act{index}')
+    lines.extend([
+        '    }',
+        '}',
+        '',
+        'run w1 worker (w2)',
+        'run w2 worker (w1)'
+    ])
+    return '\n'.join(lines)
+
+def benchmark_parse(sizes: Iterable[int], repeat: int):
+    print('statements\tlines\tseconds\tlines/s')
+    parser = RHParser()
+    for size in sizes:
+        model = generate_model(size)
+        num_of_lines = model.count('\n') + 1
+        best = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            parser.parse(model, RHContext())
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        print(f'{size}\t{num_of_lines}\t{best:.4f}\t{num_of_lines / best:.0f}')
+
+def benchmark_control_flow(sizes: Iterable[int], repeat: int):
+    print('statements\tblocks\tseconds\tus/block')
+    for size in sizes:
+        model = generate_model(size)
+        best = None
+        for _ in range(repeat):
+            context = RHContext()
+            module = RHParser().parse(model, context)
+            num_of_blocks = sum(
+                len(list(rh_process_reachable_blocks(process)))
+                for process in module.processes
+            )
+            start = time.perf_counter()
+            optimize_module_control_flow(context, module)
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        print(f'{size}\t{num_of_blocks}\t{best:.4f}\t{best / num_of_blocks * 1e6:.2f}')
+
+if __name__ == '__main__':
+    argparser = argparse.ArgumentParser(prog=sys.argv[0], description='Race harness generator benchmarks')
+    argparser.add_argument('--repeat', type=int, default=3, help='Number of repetitions, the best time is reported')
+    argparser.add_argument('--sizes', type=int, nargs='+', default=[250, 500, 1000, 2000, 4000], help='Number of statements of the generated process')
+    argparser.add_argument('benchmark', type=str, choices=['parse', 'control-flow'], help='Benchmarked pass')
+    args = argparser.parse_args(sys.argv[1:])
+
+    if args.benchmark == 'parse':
+        benchmark_parse(args.sizes, args.repeat)
+    elif args.benchmark == 'control-flow':
+        benchmark_control_flow(args.sizes, args.repeat)
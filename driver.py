@@ -1,22 +1,23 @@
 #!/usr/bin/env -S uv run
 import sys
-import os
 import enum
 import argparse
 import pathlib
 import io
-import tempfile
-import subprocess
 import csv
-from typing import Optional, Iterable
+from typing import Optional, Iterable, Tuple
 from race_harness.parser import RHParser
 from race_harness.ir import RHContext
 from race_harness.ir.mutex import RHMutualExclusion, RHMutualInclusion
 from race_harness.ir.transform import optimize_module_control_flow
+from race_harness.ir.util.parallel import RHMayHappenInParallel
+from race_harness.ir.util.communication import RHCommunicationIndex
 from race_harness.stir import STModule, STNodeID
-from race_harness.stir.translator import RHSTTranslator
+from race_harness.stir.translator import RHSTTranslator, STChannelEncoding
 from race_harness.stir.serialize import STSerialize
 from race_harness.stir.compact import compact_st_module
+from race_harness.stir.domain import infer_st_value_ranges
+from race_harness.stir.transform import STRenaming, optimize_st_module_slots, optimize_st_module_nodes, optimize_st_module_local_transitions, optimize_st_module_slot_liveness, merge_st_module_alternatives
 from race_harness.control_flow import CFConstructor
 from race_harness.codegen.goblint import GoblintLBECodegen
 from race_harness.codegen.executable import ExecutableLBECodegen
@@ -24,6 +25,7 @@ from race_harness.codegen.header import HeaderCodegen
 from race_harness.codegen.state_transition import ExecutableStirCodegen
 from race_harness.codegen.payloads import CodegenPayloads
 from race_harness.codegen.canonical import CanonicalCodegen
+from race_harness.state_space import RHCooccurrenceIndex, STModelChecker, STCompositionalExplorer, STCommunicationComponents
 
 class RaceHarnessEncoding(enum.Enum):
     Executable = 'executable'
@@ -35,58 +37,93 @@ class RaceHarnessEncoding(enum.Enum):
     StateSpace = 'state_space'
     ExecutableStir = 'executable-stir'
     Canonical = 'canonical'
+    CooccurrenceIndex = 'cooccurrence_index'
+
+class RaceHarnessExporter(enum.Enum):
+    Native = 'native'
+    NumPy = 'numpy'
+
+class RaceHarnessAnalysis(enum.Enum):
+    ModelCheck = 'model-check'
+    Static = 'static'
+    Simulation = 'simulation'
+    Compositional = 'compositional'
 
 class RaceHarnessDriver:
-    def __init__(self, *, ltsmin: Optional[pathlib.Path], pins_stir: Optional[pathlib.Path], quiet: bool = False):
+    def __init__(self, *, ltsmin: Optional[pathlib.Path], pins_stir: Optional[pathlib.Path], quiet: bool = False, exporter: RaceHarnessExporter = RaceHarnessExporter.Native, analysis: RaceHarnessAnalysis = RaceHarnessAnalysis.ModelCheck, jobs: Optional[int] = None, time_budget: Optional[float] = None, step_budget: Optional[int] = None, walkers: Optional[int] = None, max_depth: Optional[int] = None, seed: Optional[int] = None, compositional_depth: int = 0, bisimulation: bool = False, bitmask_sets: bool = False, channel_encoding: STChannelEncoding = STChannelEncoding.Pairwise, merge_alternatives: bool = False):
         self._ltsmin = ltsmin
         self._pins_stir = pins_stir
         self._quiet = quiet
+        self._exporter = exporter
+        self._analysis = analysis
+        self._jobs = jobs
+        self._time_budget = time_budget
+        self._step_budget = step_budget
+        self._walkers = walkers
+        self._max_depth = max_depth
+        self._seed = seed
+        self._compositional_depth = compositional_depth
+        self._bisimulation = bisimulation
+        self._bitmask_sets = bitmask_sets
+        self._channel_encoding = channel_encoding
+        self._merge_alternatives = merge_alternatives
         self._parser = RHParser()
 
     def run(self, model: io.TextIOBase, *, output: io.TextIOBase, encoding: RaceHarnessEncoding, embed_header: bool = False, state_space: Optional[pathlib.Path], payloads: Optional[CodegenPayloads]):
         rh_context = RHContext()
         rh_module = self._parser.parse(model.read(), rh_context)
         optimize_module_control_flow(rh_context, rh_module)
+        communication = RHCommunicationIndex(rh_context)
+        communication.build(rh_module)
 
         if encoding == RaceHarnessEncoding.Rhir:
             print(rh_context, file=output)
         elif encoding == RaceHarnessEncoding.Canonical:
-            codegen = CanonicalCodegen(output)
+            codegen = CanonicalCodegen(output, communication)
             codegen.codegen_module(rh_context, rh_module)
         else:
             st_module = STModule()
-            rhst_translator = RHSTTranslator(rh_context, st_module)
+            rhst_translator = RHSTTranslator(rh_context, st_module, bitmask_sets=self._bitmask_sets, channel_encoding=self._channel_encoding, jobs=self._jobs, communication=communication)
             rhst_translator.translate_module(rh_module)
             st_module = compact_st_module(st_module)
 
             if encoding == RaceHarnessEncoding.Stir:
                 serializer = STSerialize(output)
-                serializer.serialize_module(st_module)
+                serializer.serialize_module(self._optimize(st_module)[0])
             elif encoding == RaceHarnessEncoding.ExecutableStir:
                 codegen = ExecutableStirCodegen(output)
-                codegen.codegen_module(st_module)
+                codegen.codegen_module(self._optimize(st_module)[0])
             elif encoding == RaceHarnessEncoding.StateSpace:
-                for line in self._model_check(st_module):
-                    output.write(line)
+                for slot1, node1, slot2, node2 in self._cooccurrences(st_module, rhst_translator):
+                    output.write(f'{slot1},{node1},{slot2},{node2}\n')
             else:
                 mutinc = RHMutualInclusion()
                 mutex = RHMutualExclusion(rh_context, mutinc)
-                def process_csv_line(line):
-                    st_node1 = STNodeID(int(line[1]))
-                    st_node2 = STNodeID(int(line[3]))
-                    instance_block1_ref = rhst_translator.mapping.get_mapping(st_node1)
-                    instance_block2_ref = rhst_translator.mapping.get_mapping(st_node2)
+                def process_cooccurrence(node1: int, node2: int):
+                    instance_block1_ref = rhst_translator.mapping.get_mapping(STNodeID(node1))
+                    instance_block2_ref = rhst_translator.mapping.get_mapping(STNodeID(node2))
                     if instance_block1_ref and instance_block2_ref:
                         mutinc.add_cooccuring_states(*instance_block1_ref, *instance_block2_ref)
 
-                if state_space is None:
-                    for line in self._model_check(st_module):
-                        for line in csv.reader((line,)):
-                            process_csv_line(line)
+                if state_space is None and self._analysis == RaceHarnessAnalysis.Static:
+                    mhp = RHMayHappenInParallel(rh_context)
+                    mhp.build(rh_module)
+                    mhp.populate(mutinc)
+                elif state_space is None:
+                    for _, node1, _, node2 in self._cooccurrences(st_module, rhst_translator):
+                        process_cooccurrence(node1, node2)
                 else:
                     with open(state_space) as state_space_file:
-                        for line in csv.reader(state_space_file):
-                            process_csv_line(line)
+                        if RHCooccurrenceIndex.is_index(state_space_file):
+                            RHCooccurrenceIndex.load(state_space_file).populate(rh_context, rh_module, mutinc)
+                        else:
+                            for line in csv.reader(state_space_file):
+                                process_cooccurrence(int(line[1]), int(line[3]))
+
+                if encoding == RaceHarnessEncoding.CooccurrenceIndex:
+                    index = RHCooccurrenceIndex.build(rh_module, mutinc, rhst_translator.mapping)
+                    index.save(output)
+                    return
 
                 cf_constructor = CFConstructor(rh_context, mutex)
                 cf_module = cf_constructor.construct_module(rh_module)
@@ -107,58 +144,63 @@ class RaceHarnessDriver:
                     raise RuntimeError(f'Unexpected encoding: {encoding.value}')
                 codegen.codegen_module(cf_module, payloads)
 
-    def _model_check(self, st_module: STModule) -> Iterable[str]:
+    def _cooccurrences(self, st_module: STModule, rhst_translator: RHSTTranslator) -> Iterable[Tuple[int, int, int, int]]:
+        components = STCommunicationComponents(st_module, rhst_translator)
+        if len(components) > 1:
+            return components.explore(self._explore)
+        else:
+            return self._explore(st_module)
+
+    def _optimize(self, st_module: STModule) -> Tuple[STModule, STRenaming]:
+        st_module, slot_renaming = optimize_st_module_slots(st_module)
+        st_module, local_renaming = optimize_st_module_local_transitions(st_module)
+        st_module, liveness_renaming = optimize_st_module_slot_liveness(st_module)
+        st_module, node_renaming = optimize_st_module_nodes(st_module, bisimulation=self._bisimulation)
+        renaming = slot_renaming.then(local_renaming).then(liveness_renaming).then(node_renaming)
+        if self._merge_alternatives:
+            st_module, alternative_renaming = merge_st_module_alternatives(st_module)
+            renaming = renaming.then(alternative_renaming)
+        infer_st_value_ranges(st_module)
+        return st_module, renaming
+
+    def _explore(self, st_module: STModule) -> Iterable[Tuple[int, int, int, int]]:
+        st_module, renaming = self._optimize(st_module)
+        if self._analysis == RaceHarnessAnalysis.Simulation:
+            return renaming.restore(self._simulate(st_module))
+        else:
+            return renaming.restore(self._model_check(st_module))
+
+    def _simulate(self, st_module: STModule) -> Iterable[Tuple[int, int, int, int]]:
+        from race_harness.state_space.simulation import STRandomSimulator
+        if self._time_budget is None and self._step_budget is None:
+            raise RuntimeError('Expected time or step budget to be provided for random simulation')
+
+        simulator = STRandomSimulator(st_module, walkers=self._walkers or 1024, max_depth=self._max_depth, seed=self._seed)
+        yield from simulator.simulate(time_budget=self._time_budget, step_budget=self._step_budget)
+        if not self._quiet:
+            for sample in simulator.saturation:
+                print(f'simulation: {sample.elapsed:.1f}s steps={sample.steps} pairs={sample.num_of_pairs} new_pairs/s={sample.new_pairs_per_second:.1f}', file=sys.stderr)
+
+    def _model_check(self, st_module: STModule) -> Iterable[Tuple[int, int, int, int]]:
+        checker = self._model_checker()
+        if self._analysis == RaceHarnessAnalysis.Compositional:
+            explorer = STCompositionalExplorer(st_module, checker, depth=self._compositional_depth, jobs=self._jobs)
+            return explorer.explore()
+        else:
+            return checker.explore(st_module)
+
+    def _model_checker(self) -> STModelChecker:
         if self._ltsmin is None:
             raise RuntimeError('Expected LTSmin installation directory to be provided for C code generation')
         if self._pins_stir is None:
             raise RuntimeError('Expected PINS-STIR plugin directory to be provided for C code generation')
-        
-        with tempfile.TemporaryDirectory() as tmpdir:
-            stir_filepath = pathlib.Path(tmpdir) / 'module.stir'
-            state_space_bin_filepath = pathlib.Path(tmpdir) / 'state_space.bin'
-            state_space_csv_filepath = pathlib.Path(tmpdir) / 'state_space.csv'
-            with open(stir_filepath, 'w') as stir_file:
-                serializer = STSerialize(stir_file)
-                serializer.serialize_module(st_module)
-
-            pins2lts_seq_filepath = str((self._ltsmin / 'bin/pins2lts-seq').resolve())
-            libpins_stir_filepath = str((self._pins_stir / 'libpins-stir.so').resolve())
-            stir_bin_export_filepath = str((self._pins_stir / 'stir-bin-export').resolve())
-            pins2lts_seq_proc = subprocess.Popen(
-                args=[
-                    pins2lts_seq_filepath,
-                    libpins_stir_filepath
-                ],
-                executable=pins2lts_seq_filepath,
-                stdin=subprocess.DEVNULL,
-                stdout=subprocess.DEVNULL if self._quiet else sys.stderr,
-                stderr=subprocess.DEVNULL if self._quiet else sys.stderr,
-                shell=False,
-                env={
-                    **os.environ,
-                    'PINS_STIR_MODEL': str(stir_filepath),
-                    'PINS_STIR_OUTPUT': str(state_space_bin_filepath)
-                }
-            )
-            pins2lts_seq_proc.wait()
-
-            stir_bin_export = subprocess.Popen(
-                args=[
-                    stir_bin_export_filepath,
-                    str(stir_filepath),
-                    str(state_space_bin_filepath)
-                ],
-                executable=stir_bin_export_filepath,
-                stdout=subprocess.PIPE,
-                shell=False
-            )
-            output = b''
-            for buf in stir_bin_export.stdout:
-                output += buf
-            stir_bin_export.wait()
-            
-            for line in output.decode().splitlines():
-                yield f'{line}\n'
+        return STModelChecker(
+            ltsmin=self._ltsmin,
+            pins_stir=self._pins_stir,
+            quiet=self._quiet,
+            numpy_exporter=self._exporter == RaceHarnessExporter.NumPy,
+            jobs=self._jobs
+        )
 
 if __name__ == '__main__':
     argparser = argparse.ArgumentParser(prog=sys.argv[0], description='Race harness generator')
@@ -166,17 +208,43 @@ if __name__ == '__main__':
     argparser.add_argument('--pins-stir', type=str, required=False, help='PINS-STIR plugin directory')
     argparser.add_argument('--encoding', type=str, default=RaceHarnessEncoding.Executable.value, choices=[enc.value for enc in RaceHarnessEncoding], help='Generated race harness encoding')
     argparser.add_argument('--embed-header', default=False, action='store_true', help='Embed header into the generated harness')
-    argparser.add_argument('--state-space', type=str, required=False, help='Precomputed state space CSV file')
+    argparser.add_argument('--state-space', type=str, required=False, help='Precomputed state space CSV file or co-occurrence index')
     argparser.add_argument('--payloads', type=str, required=False, help='Payloads to embed into the generated harness')
     argparser.add_argument('--output', type=str, default=None, required=False, help='Output file')
     argparser.add_argument('--quiet', default=False, action='store_true', help='Suppress tool output')
+    argparser.add_argument('--exporter', type=str, default=RaceHarnessExporter.Native.value, choices=[exp.value for exp in RaceHarnessExporter], help='State space co-occurrence exporter')
+    argparser.add_argument('--analysis', type=str, default=RaceHarnessAnalysis.ModelCheck.value, choices=[analysis.value for analysis in RaceHarnessAnalysis], help='Co-occurrence analysis used for lock placement')
+    argparser.add_argument('--jobs', type=int, default=None, required=False, help='Number of parallel worker processes')
+    argparser.add_argument('--time-budget', type=float, default=None, required=False, help='Random simulation time budget in seconds')
+    argparser.add_argument('--step-budget', type=int, default=None, required=False, help='Random simulation step budget')
+    argparser.add_argument('--walkers', type=int, default=None, required=False, help='Number of concurrent random simulation walkers')
+    argparser.add_argument('--max-depth', type=int, default=None, required=False, help='Restart random simulation walkers after this many steps')
+    argparser.add_argument('--seed', type=int, default=None, required=False, help='Random simulation seed')
+    argparser.add_argument('--compositional-depth', type=int, default=0, required=False, help='Communication distance of instances explored exactly alongside each instance pair in compositional analysis')
+    argparser.add_argument('--bisimulation', default=False, action='store_true', help='Merge bisimilar STIR nodes before exploration (over-approximates co-occurrence)')
+    argparser.add_argument('--bitmask-sets', default=False, action='store_true', help='Encode each set as bitmask STIR slots instead of one slot per element')
+    argparser.add_argument('--channel-encoding', type=str, default=STChannelEncoding.Pairwise.value, choices=[enc.value for enc in STChannelEncoding], help='Most compact message slot encoding the translator may choose per channel domain (mailbox loses co-occurrences)')
+    argparser.add_argument('--merge-alternatives', default=False, action='store_true', help='Merge STIR transitions between the same nodes into set-membership guards and guarded alternatives')
     argparser.add_argument('model', type=str, help='Race harness model')
     args = argparser.parse_args(sys.argv[1:])
     
     driver = RaceHarnessDriver(
         ltsmin=pathlib.Path(args.ltsmin) if args.ltsmin else None,
         pins_stir=pathlib.Path(args.pins_stir) if args.pins_stir else None,
-        quiet=args.quiet
+        quiet=args.quiet,
+        exporter=RaceHarnessExporter(args.exporter),
+        analysis=RaceHarnessAnalysis(args.analysis),
+        jobs=args.jobs,
+        time_budget=args.time_budget,
+        step_budget=args.step_budget,
+        walkers=args.walkers,
+        max_depth=args.max_depth,
+        seed=args.seed,
+        compositional_depth=args.compositional_depth,
+        bisimulation=args.bisimulation,
+        bitmask_sets=args.bitmask_sets,
+        channel_encoding=STChannelEncoding(args.channel_encoding),
+        merge_alternatives=args.merge_alternatives
     )
     with open(args.model) as model_file:
         output = sys.stdout
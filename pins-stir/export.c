@@ -37,8 +37,8 @@ static void process_bin_content(const struct stir_model *model, const char *bin_
     }
     memset(matrix, 0, sizeof(_Bool) * matrix_len);
 
-    for (size_t i = 0; i < bin_length / (sizeof(int) * model->state.num_of_slots); i++) {
-        const int *state = (const int *) (((uintptr_t) bin_content) + i * sizeof(int) * model->state.num_of_slots);
+    for (size_t i = 0; i < bin_length / (model->state.dump_width * model->state.num_of_slots); i++) {
+        const void *state = (const void *) (((uintptr_t) bin_content) + i * model->state.dump_width * model->state.num_of_slots);
         for (size_t j = 0; j < num_of_nodes; j++) {
             size_t node1 = slot_id_mapping[j];
             for (size_t k = j + 1; k < num_of_nodes; k++) {
@@ -47,7 +47,7 @@ static void process_bin_content(const struct stir_model *model, const char *bin_
                 }
 
                 size_t node2 = slot_id_mapping[k];
-                size_t index = (j * (max_node_value + 1) + state[node1]) * num_of_nodes * (max_node_value + 1) + k * (max_node_value + 1) + state[node2];
+                size_t index = (j * (max_node_value + 1) + stir_model_dumped_value(&model->state, state, node1)) * num_of_nodes * (max_node_value + 1) + k * (max_node_value + 1) + stir_model_dumped_value(&model->state, state, node2);
                 matrix[index] = 1;
             }    
         }
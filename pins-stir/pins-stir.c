@@ -19,7 +19,16 @@ static struct stir_model STIR_MODEL = {0};
 static FILE *STIR_STATES_FP = NULL;
 
 static void write_pins_stir_state(const struct stir_model *model, int *state) {
-    fwrite(state, sizeof(int), model->state.num_of_slots, STIR_STATES_FP);
+    static _Thread_local void *packed = NULL;
+    if (packed == NULL) {
+        packed = malloc(sizeof(int) * model->state.num_of_slots);
+        if (packed == NULL) {
+            stir_fatal("failed to allocate memory");
+        }
+    }
+
+    stir_model_pack_state(&model->state, state, packed);
+    fwrite(packed, model->state.dump_width, model->state.num_of_slots, STIR_STATES_FP);
 }
 
 static void init_pins_types_from_stir(const struct stir_model *stir_model, model_t model, struct pins_types *types) {
@@ -70,25 +79,46 @@ static void init_pins_dependency_matrix_from_stir(const struct stir_model *stir_
 
         dm_set(dm_info, transition->transition_id, transition->component_slot_id);
         for (size_t j = 0; j < transition->num_of_guards; j++) {
-            switch (transition->guards[j].type) {
-                case STIR_MODEL_GUARD_INT:
-                    dm_set(dm_info, transition->transition_id, transition->guards[j].int_guard.slot_id);
-                    break;
-            }
+            dm_set(dm_info, transition->transition_id, stir_model_guard_slot(&transition->guards[j]));
         }
 
         for (size_t j = 0; j < transition->num_of_instr; j++) {
-            switch (transition->instructions[j].type) {
-                case STIR_MODEL_INSTR_SET_INT:
-                    dm_set(dm_info, transition->transition_id, transition->instructions[j].set_int.slot_id);
-                    break;
-            }
+            dm_set(dm_info, transition->transition_id, stir_model_instr_slot(&transition->instructions[j]));
         }
     }
 
     GBsetDMInfo(model, dm_info);
 }
 
+static int next_state_alternatives(const struct stir_model_transition *transition, int group, int *src, int *dst, TransitionCB cb, void *user_context) {
+    int count = 0;
+    for (size_t alternative = 0; alternative < transition->num_of_alternatives; alternative++) {
+        int satisfies_cond = 1;
+        for (size_t i = 0; i < transition->num_of_guards && satisfies_cond; i++) {
+            if (transition->guards[i].alternative == alternative && !stir_model_guard_holds(&transition->guards[i], src)) {
+                satisfies_cond = 0;
+            }
+        }
+        if (!satisfies_cond) {
+            continue;
+        }
+
+        memcpy(dst, src, sizeof(int) * STIR_MODEL.state.num_of_slots);
+        dst[transition->component_slot_id] = transition->dst_node;
+        for (size_t i = 0; i < transition->num_of_instr; i++) {
+            if (transition->instructions[i].alternative < 0 || (size_t) transition->instructions[i].alternative == alternative) {
+                stir_model_instr_apply(&transition->instructions[i], dst);
+            }
+        }
+
+        transition_info_t ti = GB_TI(NULL, group);
+        cb(user_context, &ti, dst, NULL);
+        write_pins_stir_state(&STIR_MODEL, dst);
+        count++;
+    }
+    return count;
+}
+
 static int next_state(model_t model, int group, int *src, TransitionCB cb, void *user_context) {
     (void) model;
 
@@ -105,26 +135,21 @@ static int next_state(model_t model, int group, int *src, TransitionCB cb, void
     if (src[transition->component_slot_id] != transition->src_node) {
         return 0;
     }
+    if (transition->num_of_alternatives > 1) {
+        return next_state_alternatives(transition, group, src, dst, cb, user_context);
+    }
     int satisfies_cond = 1;
     if (!transition->invert_guard) {
         for (size_t i = 0; i < transition->num_of_guards; i++) {
-            switch (transition->guards[i].type) {
-                case STIR_MODEL_GUARD_INT:
-                    if (src[transition->guards[i].int_guard.slot_id] != transition->guards[i].int_guard.value) {
-                        satisfies_cond = 0;
-                    }
-                    break;
+            if (!stir_model_guard_holds(&transition->guards[i], src)) {
+                satisfies_cond = 0;
             }
         }
     } else {
         satisfies_cond = 0;
         for (size_t i = 0; i < transition->num_of_guards; i++) {
-            switch (transition->guards[i].type) {
-                case STIR_MODEL_GUARD_INT:
-                    if (src[transition->guards[i].int_guard.slot_id] != transition->guards[i].int_guard.value) {
-                        satisfies_cond = 1;
-                    }
-                    break;
+            if (!stir_model_guard_holds(&transition->guards[i], src)) {
+                satisfies_cond = 1;
             }
         }
     }
@@ -135,11 +160,7 @@ static int next_state(model_t model, int group, int *src, TransitionCB cb, void
     memcpy(dst, src, sizeof(int) * STIR_MODEL.state.num_of_slots);
     dst[transition->component_slot_id] = transition->dst_node;
     for (size_t i = 0; i < transition->num_of_instr; i++) {
-        switch (transition->instructions[i].type) {
-            case STIR_MODEL_INSTR_SET_INT:
-                dst[transition->instructions[i].set_int.slot_id] = transition->instructions[i].set_int.value;
-                break;
-        }
+        stir_model_instr_apply(&transition->instructions[i], dst);
     }
 
     transition_info_t ti = GB_TI(NULL, group);
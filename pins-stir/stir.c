@@ -2,6 +2,7 @@
 #include <stdio.h>
 #include <stdarg.h>
 #include <string.h>
+#include <stdint.h>
 #include <fcntl.h>
 #include <unistd.h>
 #include <sys/mman.h>
@@ -91,10 +92,17 @@ static struct stir_model_state load_stir_model_state(const char **content) {
 
         stir_fatal("Failed to parse stir model slot");
     }
+
+    size_t dump_width = sizeof(int);
+    rc = sscanf(*content, "dump_width %zu\n%n", &dump_width, &read);
+    if (rc != 0) {
+        *content += read;
+    }
     
     return (struct stir_model_state) {
         .slots = slots,
-        .num_of_slots = num_of_slots
+        .num_of_slots = num_of_slots,
+        .dump_width = dump_width
     };
 }
 
@@ -130,6 +138,12 @@ static void load_model_transitions(const char **content, struct stir_model *mode
         }
         *content += read;
 
+        transition->num_of_alternatives = 1;
+        rc = sscanf(*content, "alternatives %zu\n%n", &transition->num_of_alternatives, &read);
+        if (rc != 0) {
+            *content += read;
+        }
+
         transition->guards = malloc(sizeof(struct stir_model_transition_guard) * transition->num_of_guards);
         if (transition->guards == NULL) {
             stir_fatal("failed to allocate memory");
@@ -141,6 +155,12 @@ static void load_model_transitions(const char **content, struct stir_model *mode
         }
         
         for (size_t j = 0; j < transition->num_of_guards; j++) {
+            transition->guards[j].alternative = 0;
+            rc = sscanf(*content, "@%zu %n", &transition->guards[j].alternative, &read);
+            if (rc != 0) {
+                *content += read;
+            }
+
             rc = sscanf(*content, "int_guard %zu %d\n%n",
                 &transition->guards[j].int_guard.slot_id, &transition->guards[j].int_guard.value, &read);
             if (rc != 0) {
@@ -149,10 +169,53 @@ static void load_model_transitions(const char **content, struct stir_model *mode
                 continue;
             }
 
+            rc = sscanf(*content, "bit_guard %zu %u\n%n",
+                &transition->guards[j].bit_guard.slot_id, &transition->guards[j].bit_guard.bit, &read);
+            if (rc != 0) {
+                *content += read;
+                transition->guards[j].type = STIR_MODEL_GUARD_BIT;
+                continue;
+            }
+
+            rc = sscanf(*content, "zero_guard %zu\n%n",
+                &transition->guards[j].mask_zero_guard.slot_id, &read);
+            if (rc != 0) {
+                *content += read;
+                transition->guards[j].type = STIR_MODEL_GUARD_MASK_ZERO;
+                continue;
+            }
+
+            rc = sscanf(*content, "int_set_guard %zu %zu%n",
+                &transition->guards[j].int_set_guard.slot_id, &transition->guards[j].int_set_guard.num_of_values, &read);
+            if (rc != 0) {
+                *content += read;
+                transition->guards[j].type = STIR_MODEL_GUARD_INT_SET;
+                transition->guards[j].int_set_guard.values = malloc(sizeof(int) * transition->guards[j].int_set_guard.num_of_values);
+                if (transition->guards[j].int_set_guard.values == NULL) {
+                    stir_fatal("failed to allocate memory");
+                }
+                for (size_t k = 0; k < transition->guards[j].int_set_guard.num_of_values; k++) {
+                    rc = sscanf(*content, " %d%n", &transition->guards[j].int_set_guard.values[k], &read);
+                    if (rc == 0) {
+                        stir_fatal("failed to parse stir model transition guard");
+                    }
+                    *content += read;
+                }
+                rc = sscanf(*content, "\n%n", &read);
+                *content += read;
+                continue;
+            }
+
             stir_fatal("failed to parse stir model transition guard");
         }
 
-        for (size_t j = 0; j < transition->num_of_instr; j++) {            
+        for (size_t j = 0; j < transition->num_of_instr; j++) {
+            transition->instructions[j].alternative = -1;
+            rc = sscanf(*content, "@%zd %n", &transition->instructions[j].alternative, &read);
+            if (rc != 0) {
+                *content += read;
+            }
+
             rc = sscanf(*content, "set_int_instr %zu %d\n%n",
                 &transition->instructions[j].set_int.slot_id, &transition->instructions[j].set_int.value, &read);
             if (rc != 0) {
@@ -161,6 +224,22 @@ static void load_model_transitions(const char **content, struct stir_model *mode
                 continue;
             }
 
+            rc = sscanf(*content, "set_bit_instr %zu %u\n%n",
+                &transition->instructions[j].set_bit.slot_id, &transition->instructions[j].set_bit.bit, &read);
+            if (rc != 0) {
+                *content += read;
+                transition->instructions[j].type = STIR_MODEL_INSTR_SET_BIT;
+                continue;
+            }
+
+            rc = sscanf(*content, "clear_bit_instr %zu %u\n%n",
+                &transition->instructions[j].clear_bit.slot_id, &transition->instructions[j].clear_bit.bit, &read);
+            if (rc != 0) {
+                *content += read;
+                transition->instructions[j].type = STIR_MODEL_INSTR_CLEAR_BIT;
+                continue;
+            }
+
             stir_fatal("failed to parse stir transition instruction");
         }
     }
@@ -175,9 +254,116 @@ void free_stir_model(struct stir_model *model) {
     free_stir_model_state(&model->state);
 
     for (size_t i = 0; i < model->num_of_transitions; i++) {
+        for (size_t j = 0; j < model->transitions[i].num_of_guards; j++) {
+            if (model->transitions[i].guards[j].type == STIR_MODEL_GUARD_INT_SET) {
+                free(model->transitions[i].guards[j].int_set_guard.values);
+            }
+        }
         free(model->transitions[i].guards);
         free(model->transitions[i].instructions);
     }
     free(model->transitions);
     model->num_of_transitions = 0;
 }
+
+size_t stir_model_guard_slot(const struct stir_model_transition_guard *guard) {
+    switch (guard->type) {
+        case STIR_MODEL_GUARD_INT:
+            return guard->int_guard.slot_id;
+
+        case STIR_MODEL_GUARD_BIT:
+            return guard->bit_guard.slot_id;
+
+        case STIR_MODEL_GUARD_MASK_ZERO:
+            return guard->mask_zero_guard.slot_id;
+
+        case STIR_MODEL_GUARD_INT_SET:
+            return guard->int_set_guard.slot_id;
+    }
+    stir_fatal("unknown stir model guard type");
+}
+
+int stir_model_guard_holds(const struct stir_model_transition_guard *guard, const int *state) {
+    switch (guard->type) {
+        case STIR_MODEL_GUARD_INT:
+            return state[guard->int_guard.slot_id] == guard->int_guard.value;
+
+        case STIR_MODEL_GUARD_BIT:
+            return (((unsigned int) state[guard->bit_guard.slot_id]) >> guard->bit_guard.bit) & 1u;
+
+        case STIR_MODEL_GUARD_MASK_ZERO:
+            return state[guard->mask_zero_guard.slot_id] == 0;
+
+        case STIR_MODEL_GUARD_INT_SET:
+            for (size_t i = 0; i < guard->int_set_guard.num_of_values; i++) {
+                if (state[guard->int_set_guard.slot_id] == guard->int_set_guard.values[i]) {
+                    return 1;
+                }
+            }
+            return 0;
+    }
+    stir_fatal("unknown stir model guard type");
+}
+
+size_t stir_model_instr_slot(const struct stir_model_transition_instr *instr) {
+    switch (instr->type) {
+        case STIR_MODEL_INSTR_SET_INT:
+            return instr->set_int.slot_id;
+
+        case STIR_MODEL_INSTR_SET_BIT:
+            return instr->set_bit.slot_id;
+
+        case STIR_MODEL_INSTR_CLEAR_BIT:
+            return instr->clear_bit.slot_id;
+    }
+    stir_fatal("unknown stir model instruction type");
+}
+
+void stir_model_instr_apply(const struct stir_model_transition_instr *instr, int *state) {
+    switch (instr->type) {
+        case STIR_MODEL_INSTR_SET_INT:
+            state[instr->set_int.slot_id] = instr->set_int.value;
+            break;
+
+        case STIR_MODEL_INSTR_SET_BIT:
+            state[instr->set_bit.slot_id] = (int) (((unsigned int) state[instr->set_bit.slot_id]) | (1u << instr->set_bit.bit));
+            break;
+
+        case STIR_MODEL_INSTR_CLEAR_BIT:
+            state[instr->clear_bit.slot_id] = (int) (((unsigned int) state[instr->clear_bit.slot_id]) & ~(1u << instr->clear_bit.bit));
+            break;
+    }
+}
+
+void stir_model_pack_state(const struct stir_model_state *state, const int *values, void *out) {
+    switch (state->dump_width) {
+        case sizeof(int8_t):
+            for (size_t i = 0; i < state->num_of_slots; i++) {
+                ((int8_t *) out)[i] = (int8_t) values[i];
+            }
+            break;
+
+        case sizeof(int16_t):
+            for (size_t i = 0; i < state->num_of_slots; i++) {
+                ((int16_t *) out)[i] = (int16_t) values[i];
+            }
+            break;
+
+        default:
+            memcpy(out, values, sizeof(int) * state->num_of_slots);
+            break;
+    }
+}
+
+int stir_model_dumped_value(const struct stir_model_state *state, const void *dumped, size_t slot) {
+    switch (state->dump_width) {
+        case sizeof(int8_t):
+            return ((const int8_t *) dumped)[slot];
+
+        case sizeof(int16_t):
+            return ((const int16_t *) dumped)[slot];
+
+        default:
+            return ((const int *) dumped)[slot];
+    }
+}
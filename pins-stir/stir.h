@@ -18,33 +18,61 @@ struct stir_model_slot {
 struct stir_model_state {
     struct stir_model_slot *slots;
     size_t num_of_slots;
+    size_t dump_width;
 };
 
 enum stir_model_transition_guard_type {
-    STIR_MODEL_GUARD_INT
+    STIR_MODEL_GUARD_INT,
+    STIR_MODEL_GUARD_BIT,
+    STIR_MODEL_GUARD_MASK_ZERO,
+    STIR_MODEL_GUARD_INT_SET
 };
 
 enum stir_model_transition_instr_type {
-    STIR_MODEL_INSTR_SET_INT
+    STIR_MODEL_INSTR_SET_INT,
+    STIR_MODEL_INSTR_SET_BIT,
+    STIR_MODEL_INSTR_CLEAR_BIT
 };
 
 struct stir_model_transition_guard {
     enum stir_model_transition_guard_type type;
+    size_t alternative;
     union {
         struct {
             size_t slot_id;
             int value;
         } int_guard;
+        struct {
+            size_t slot_id;
+            unsigned int bit;
+        } bit_guard;
+        struct {
+            size_t slot_id;
+        } mask_zero_guard;
+        struct {
+            size_t slot_id;
+            size_t num_of_values;
+            int *values;
+        } int_set_guard;
     };
 };
 
 struct stir_model_transition_instr {
     enum stir_model_transition_instr_type type;
+    ssize_t alternative;
     union {
         struct {
             size_t slot_id;
             int value;
         } set_int;
+        struct {
+            size_t slot_id;
+            unsigned int bit;
+        } set_bit;
+        struct {
+            size_t slot_id;
+            unsigned int bit;
+        } clear_bit;
     };
 };
 
@@ -53,6 +81,7 @@ struct stir_model_transition {
     size_t component_slot_id;
     size_t num_of_guards;
     size_t num_of_instr;
+    size_t num_of_alternatives;
     int src_node;
     int dst_node;
     int invert_guard;
@@ -78,4 +107,12 @@ void close_stir_model_text(const char *, size_t);
 void load_stir_model(const char **, struct stir_model *);
 void free_stir_model(struct stir_model *);
 
+size_t stir_model_guard_slot(const struct stir_model_transition_guard *);
+int stir_model_guard_holds(const struct stir_model_transition_guard *, const int *);
+size_t stir_model_instr_slot(const struct stir_model_transition_instr *);
+void stir_model_instr_apply(const struct stir_model_transition_instr *, int *);
+
+void stir_model_pack_state(const struct stir_model_state *, const int *, void *);
+int stir_model_dumped_value(const struct stir_model_state *, const void *, size_t);
+
 #endif
@@ -0,0 +1,47 @@
+#!/usr/bin/env -S uv run
+import sys
+import argparse
+from typing import Optional, Tuple
+from race_harness.error import RHError
+from race_harness.state_space import RHCooccurrenceIndex
+
+def parse_location(location: str) -> Tuple[str, Optional[int]]:
+    if '@' not in location:
+        return location, None
+    instance, block = location.split('@', 1)
+    return instance, int(block.removeprefix('%'))
+
+def run_query(index: RHCooccurrenceIndex, first: str, second: Optional[str]) -> bool:
+    instance1, block1 = parse_location(first)
+    if block1 is None:
+        raise RHError(f'Expected a block for {first}')
+
+    if second is None:
+        found = False
+        for instance2, block2 in index.cooccurring(instance1, block1):
+            print(f'{instance2}@{block2}')
+            found = True
+        return found
+
+    instance2, block2 = parse_location(second)
+    if block2 is None:
+        found = False
+        for block2 in index.cooccurring_blocks(instance1, block1, instance2):
+            print(f'{instance2}@{block2}')
+            found = True
+        return found
+
+    cooccurring = index.is_cooccurring(instance1, block1, instance2, block2)
+    print('yes' if cooccurring else 'no')
+    return cooccurring
+
+if __name__ == '__main__':
+    argparser = argparse.ArgumentParser(prog=sys.argv[0], description='Race harness co-occurrence index query')
+    argparser.add_argument('index', type=str, help='Co-occurrence index produced with --encoding cooccurrence_index')
+    argparser.add_argument('first', type=str, help='Queried instance block (instance@block)')
+    argparser.add_argument('second', type=str, nargs='?', default=None, help='Other instance (instance) or instance block (instance@block)')
+    args = argparser.parse_args(sys.argv[1:])
+
+    with open(args.index) as index_file:
+        index = RHCooccurrenceIndex.load(index_file)
+    sys.exit(0 if run_query(index, args.first, args.second) else 1)
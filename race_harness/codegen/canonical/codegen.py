@@ -3,6 +3,7 @@ import dataclasses
 from typing import Dict, Set, List, Optional
 from race_harness.codegen.base import BaseCodegen
 from race_harness.ir import RHContext, RHModule, RHInstance, RHProcess, RHRef, RHConditionalControlFlowEdge, RHPredicate, RHEffectBlock, RHSet, RHUnconditionalControlFlowEdge, RHOperation, RHControlFlowEdge
+from race_harness.ir.util.communication import RHCommunicationIndex
 
 @dataclasses.dataclass
 class InstanceState:
@@ -15,20 +16,27 @@ class InstanceState:
 class ModuleState:
     context: RHContext
     module: RHModule
+    communication: RHCommunicationIndex
     instances: Dict[RHRef, InstanceState]
     message_channels: Dict[RHRef, RHRef]
 
 class CanonicalCodegen(BaseCodegen):
-    def __init__(self, out: io.TextIOBase):
+    def __init__(self, out: io.TextIOBase, communication: Optional[RHCommunicationIndex] = None):
         self._out = out
+        self._communication = communication
 
     def codegen_module(self, context: RHContext, module: RHModule):
         self._do_codegen(self._codegen_module, context, module)
 
     def _codegen_module(self, context: RHContext, module: RHModule):
+        communication = self._communication
+        if communication is None:
+            communication = RHCommunicationIndex(context)
+            communication.build(module)
         module_state = ModuleState(
             context=context,
             module=module,
+            communication=communication,
             instances=dict(),
             message_channels=dict()
         )
@@ -300,12 +308,10 @@ class CanonicalCodegen(BaseCodegen):
             yield from unroll_conj(list(conj.conjuncts))
         elif receival := condition.operation.as_receival():
             for msg in receival.messages:
-                for instance_state in module_state.instances.values():
-                    has_msg = any(msg in channel for channel in instance_state.process.protocol.out_protocol)
-                    if has_msg:
-                        yield {
-                            msg: instance_state
-                        }
+                for instance in module_state.communication.message_sender_instances(msg):
+                    yield {
+                        msg: module_state.instances[instance.ref]
+                    }
         else:
             yield from (dict(),)
 
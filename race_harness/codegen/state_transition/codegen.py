@@ -2,6 +2,14 @@ import io
 from race_harness.codegen.base import BaseCodegen
 from race_harness.stir import STModule, STTransition
 
+SLOT_TYPES = {
+    1: 'int8_t',
+    2: 'int16_t',
+    4: 'int32_t'
+}
+
+LOCK_FREE_STATE_SIZE = 8
+
 class ExecutableStirCodegen(BaseCodegen):
     def __init__(self, out: io.TextIOBase):
         self._out = out
@@ -14,11 +22,12 @@ class ExecutableStirCodegen(BaseCodegen):
         yield '#include <stdio.h>'
         yield '#include <pthread.h>'
         yield '#include <stdatomic.h>'
+        yield '#include <stdint.h>'
         yield ''
         
         yield '_Atomic struct State {'
         yield 1
-        yield f'int slots[{len(module.state)}];'
+        yield f'{SLOT_TYPES[module.state.value_width]} slots[{self._padded_num_of_slots(module)}];'
         yield -1
         yield f'}} state = (struct State) {{'
         yield 1
@@ -58,46 +67,78 @@ class ExecutableStirCodegen(BaseCodegen):
         yield f'void *transition{transition.identifier.transition_id}(void *arg) {{'
         yield 1
         yield '(void) arg;'
+        if transition.num_of_alternatives > 1:
+            yield f'unsigned int seed = {transition.identifier.transition_id};'
         yield 'for (;;) {'
         yield 1
 
         yield 'struct State current_state = state;'
         yield 'struct State next_state = current_state;'
-        
+
         slots = set()
         slots.add(transition.node_slot)
-        guards = list()
         for guard in transition.guards:
-            if int_guard := guard.as_int():
-                slots.add(int_guard.slot_id)
-                guards.append(
-                    f'current_state.slots[{int_guard.slot_id.identifier}] == {int_guard.value}'
-                )
-
-        guards_flat = ' && '.join(guards)
-        conditions = [
-            f'current_state.slots[{transition.node_slot.identifier}] == {transition.source_node_id.node_id}'
-        ]
-        if guards_flat:
-            if transition.invert_guard:
-                conditions.append(f'!({guards_flat})')
-            else:
-                conditions.append(guards_flat)
-        yield 'if (!({})) continue;'.format(' && '.join(conditions))
-
-        actions = [
-            # f'printf("DO {transition.identifier.transition_id}\\n");'
-        ]
-        yield f'next_state.slots[{transition.node_slot.identifier}] = {transition.target_node_id.node_id};'
-        for instr in transition.instructions:
-            if set_int := instr.as_set_int():
-                yield f'next_state.slots[{set_int.slot_id.identifier}] = {set_int.value};'
-            elif ext_act := instr.as_external_action():
-                actions.append(f'printf("{ext_act.action}\\n");')
+            slots.add(guard.slot_id)
+
+        if transition.num_of_alternatives > 1:
+            # Every alternative whose guards hold may fire, so one of them is picked at random
+            yield 'int alternative;'
+            yield f'int enabled[{transition.num_of_alternatives}];'
+            yield 'int num_of_enabled = 0;'
+            yield 'if (!(current_state.slots[{}] == {})) continue;'.format(transition.node_slot.identifier, transition.source_node_id.node_id)
+            yield f'next_state.slots[{transition.node_slot.identifier}] = {transition.target_node_id.node_id};'
+            for index, alternative in enumerate(transition.alternatives):
+                guards_flat = ' && '.join(self._codegen_guard(guard) for guard in alternative.guards) or '1'
+                yield f'if ({guards_flat}) enabled[num_of_enabled++] = {index};'
+            yield 'if (num_of_enabled == 0) continue;'
+            yield 'alternative = enabled[rand_r(&seed) % num_of_enabled];'
+            yield 'switch (alternative) {'
+            yield 1
+            actions = list()
+            for index, alternative in enumerate(transition.alternatives):
+                yield f'case {index}:'
+                yield 1
+                alternative_actions = list()
+                yield from self._codegen_instructions(alternative.instructions, alternative_actions)
+                actions.append(alternative_actions)
+                yield 'break;'
+                yield -1
+            yield -1
+            yield '}'
+        else:
+            guards_flat = ' && '.join(self._codegen_guard(guard) for guard in transition.guards)
+            conditions = [
+                f'current_state.slots[{transition.node_slot.identifier}] == {transition.source_node_id.node_id}'
+            ]
+            if guards_flat:
+                if transition.invert_guard:
+                    conditions.append(f'!({guards_flat})')
+                else:
+                    conditions.append(guards_flat)
+            yield 'if (!({})) continue;'.format(' && '.join(conditions))
+
+            actions = [
+                # f'printf("DO {transition.identifier.transition_id}\\n");'
+            ]
+            yield f'next_state.slots[{transition.node_slot.identifier}] = {transition.target_node_id.node_id};'
+            yield from self._codegen_instructions(transition.instructions, actions)
+            actions = [actions]
 
         yield 'atomic_compare_exchange_strong(&state, &current_state, next_state);'
 
-        yield from actions
+        if len(actions) > 1 and any(actions):
+            yield 'switch (alternative) {'
+            yield 1
+            for index, alternative_actions in enumerate(actions):
+                yield f'case {index}:'
+                yield 1
+                yield from alternative_actions
+                yield 'break;'
+                yield -1
+            yield -1
+            yield '}'
+        else:
+            yield from actions[0]
 
         yield -1
         yield '}'
@@ -105,3 +146,38 @@ class ExecutableStirCodegen(BaseCodegen):
         yield -1
         yield '}'
         yield ''
+
+    def _padded_num_of_slots(self, module: STModule) -> int:
+        # Pad small states to a power-of-two size of at most 8 bytes, which x86-64 compare-and-swaps without
+        # locking; larger states still need libatomic (-latomic)
+        size = module.state.value_width * len(module.state)
+        if size > LOCK_FREE_STATE_SIZE:
+            return len(module.state)
+        padded_size = 1
+        while padded_size < size:
+            padded_size *= 2
+        return max(len(module.state), padded_size // module.state.value_width)
+
+    def _codegen_guard(self, guard) -> str:
+        if int_guard := guard.as_int():
+            return f'current_state.slots[{int_guard.slot_id.identifier}] == {int_guard.value}'
+        elif bit_guard := guard.as_bit():
+            return f'((current_state.slots[{bit_guard.slot_id.identifier}] >> {bit_guard.bit}) & 1)'
+        elif mask_zero_guard := guard.as_mask_zero():
+            return f'current_state.slots[{mask_zero_guard.slot_id.identifier}] == 0'
+        elif int_set_guard := guard.as_int_set():
+            return '({})'.format(' || '.join(
+                f'current_state.slots[{int_set_guard.slot_id.identifier}] == {value}'
+                for value in int_set_guard.values
+            ))
+
+    def _codegen_instructions(self, instructions, actions):
+        for instr in instructions:
+            if set_int := instr.as_set_int():
+                yield f'next_state.slots[{set_int.slot_id.identifier}] = {set_int.value};'
+            elif set_bit := instr.as_set_bit():
+                yield f'next_state.slots[{set_bit.slot_id.identifier}] |= 1 << {set_bit.bit};'
+            elif clear_bit := instr.as_clear_bit():
+                yield f'next_state.slots[{clear_bit.slot_id.identifier}] &= ~(1 << {clear_bit.bit});'
+            elif ext_act := instr.as_external_action():
+                actions.append(f'printf("{ext_act.action}\\n");')
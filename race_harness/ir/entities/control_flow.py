@@ -59,7 +59,7 @@ class RHControlFlow(RHEntity):
         if source in self._edges:
             edge = self._edges[source]
             for successor in edge.successors:
-                self._reverse_edges[successor.ref].remove(source)
+                self._reverse_edges[successor.ref].discard(source)
             del self._edges[source]
 
     def edge_from(self, source: RHRef) -> Optional[Union[RHUnconditionalControlFlowEdge, RHConditionalControlFlowEdge]]:
@@ -22,6 +22,9 @@ class RHMutualInclusion:
         min_key = min(key1, key2)
         max_key = max(key1, key2)
         return (min_key, max_key) in self._mutual_inclusion
+    
+    def __iter__(self) -> Iterable[tuple[tuple[RHRef, RHRef], tuple[RHRef, RHRef]]]:
+        yield from self._mutual_inclusion
 
 class RHMutualExclusion:
     def __init__(self, context: RHContext, mutinc: RHMutualInclusion):
@@ -0,0 +1,59 @@
+from typing import Dict, List
+from race_harness.ir import RHContext, RHModule, RHProcess, RHInstance, RHDomain, RHRef
+from race_harness.error import RHError
+
+class RHCommunicationIndex:
+    def __init__(self, context: RHContext):
+        self._ctx = context
+        self._message_domains = dict()
+        self._instance_processes = dict()
+        self._domain_sender_instances = dict()
+        self._message_sender_instances = dict()
+
+    def build(self, module: RHModule):
+        self._message_domains = dict()
+        self._instance_processes = dict()
+        self._domain_sender_instances = dict()
+        self._message_sender_instances = dict()
+
+        protocol_impl = dict()
+        domain_senders = dict()
+        for process in module.processes:
+            protocol_impl[process.protocol.ref] = process
+            for domain in process.protocol.in_protocol:
+                for message in domain:
+                    self._message_domains[message] = domain
+            for domain in process.protocol.out_protocol:
+                for message in domain:
+                    self._message_domains[message] = domain
+                domain_senders.setdefault(domain.ref, dict())[process.ref] = process
+
+        process_instances = dict()
+        for instance in module.instances:
+            process = protocol_impl.get(instance.protocol.ref, None)
+            if process is None:
+                raise RHError(f'Unable to find process for instance {instance.ref}')
+            self._instance_processes[instance.ref] = process
+            process_instances.setdefault(process.ref, list()).append(instance)
+            for message in {message for domain in process.protocol.out_protocol for message in domain}:
+                self._message_sender_instances.setdefault(message, list()).append(instance)
+
+        for domain_ref, senders in domain_senders.items():
+            self._domain_sender_instances[domain_ref] = [
+                instance
+                for process in sorted(senders.values(), key=lambda process: process.ref)
+                for instance in process_instances.get(process.ref, ())
+            ]
+
+    @property
+    def message_domains(self) -> Dict[RHRef, RHDomain]:
+        return self._message_domains
+
+    def instance_process(self, instance_ref: RHRef) -> RHProcess:
+        return self._instance_processes[instance_ref]
+
+    def domain_sender_instances(self, domain_ref: RHRef) -> List[RHInstance]:
+        return self._domain_sender_instances.get(domain_ref, [])
+
+    def message_sender_instances(self, message_ref: RHRef) -> List[RHInstance]:
+        return self._message_sender_instances.get(message_ref, [])
@@ -1,44 +1,124 @@
-import itertools
-from race_harness.ir import RHRef, RHControlFlow, RHContext
-from race_harness.ir.util.reachability import rh_block_reachability
+from typing import FrozenSet, Iterable, List, Optional
+from race_harness.ir import RHRef, RHControlFlow, RHContext, RHConditionalControlFlowEdge
 
 class RHControlFlowDominators:
     def __init__(self, context: RHContext):
         self._ctx = context
-        self._doms = dict()
+        self._control_flow = None
+        self._entry = None
+        self._idoms = dict()
+        self._children = dict()
+        self._preorder = dict()
+        self._postorder = dict()
 
     def build(self, entry_ref: RHRef, control_flow: RHControlFlow):
-        self._doms = {
-            entry_ref: {entry_ref}
+        # Cooper, Harvey & Kennedy: iterate immediate dominators over the reverse postorder
+        self._control_flow = control_flow
+        self._entry = entry_ref
+        order = self._reverse_postorder(entry_ref, control_flow)
+        position = {
+            ref: index
+            for index, ref in enumerate(order)
         }
-        blocks = list(rh_block_reachability(control_flow, self._ctx[entry_ref].to_effect_block()))
-        for block in blocks:
-            if block.ref != entry_ref:
-                self._doms[block.ref] = {
-                    block.ref
-                    for block in blocks
-                }
+        idoms = {
+            entry_ref: entry_ref
+        }
+
+        def intersect(ref1: RHRef, ref2: RHRef) -> RHRef:
+            while ref1 != ref2:
+                while position[ref1] > position[ref2]:
+                    ref1 = idoms[ref1]
+                while position[ref2] > position[ref1]:
+                    ref2 = idoms[ref2]
+            return ref1
 
         fixpoint_reached = False
         while not fixpoint_reached:
             fixpoint_reached = True
-
-            for block in blocks:
-                if block.ref == entry_ref:
-                    continue
-
-                block_doms = {
-                    block.ref
-                    for block in blocks
-                }
-                for pred in control_flow.edges_to(block.ref):
-                    if pred_doms := self._doms.get(pred):
-                        block_doms.intersection_update(pred_doms)
-                block_doms = block_doms.union((block.ref,))
-
-                if block_doms.symmetric_difference(self._doms[block.ref]):
-                    self._doms[block.ref] = block_doms
+            for ref in order[1:]:
+                idom = None
+                for pred in control_flow.edges_to(ref):
+                    if pred in idoms:
+                        idom = pred if idom is None else intersect(pred, idom)
+                if idoms.get(ref, None) != idom:
+                    idoms[ref] = idom
                     fixpoint_reached = False
 
-    def __getitem__(self, ref: RHRef):
-        return self._doms[ref]
+        self._idoms = idoms
+        self._children = {
+            ref: list()
+            for ref in order
+        }
+        for ref in order[1:]:
+            self._children[idoms[ref]].append(ref)
+        self._number_tree()
+
+    def immediate_dominator(self, ref: RHRef) -> Optional[RHRef]:
+        if ref == self._entry:
+            return None
+        return self._idoms[ref]
+
+    def children(self, ref: RHRef) -> Iterable[RHRef]:
+        yield from self._children.get(ref, ())
+
+    def dominates(self, dominator_ref: RHRef, ref: RHRef) -> bool:
+        if dominator_ref not in self._preorder or ref not in self._preorder:
+            return False
+        return self._preorder[dominator_ref] <= self._preorder[ref] and self._postorder[ref] <= self._postorder[dominator_ref]
+
+    def dominators(self, ref: RHRef) -> Iterable[RHRef]:
+        if ref not in self._idoms:
+            return
+        yield ref
+        while ref != self._entry:
+            ref = self._idoms[ref]
+            yield ref
+
+    def conditional_dominators(self, ref: RHRef) -> Iterable[RHConditionalControlFlowEdge]:
+        for dom in self.dominators(ref):
+            edge = self._control_flow.edge_from(dom)
+            if isinstance(edge, RHConditionalControlFlowEdge):
+                yield edge
+
+    def __getitem__(self, ref: RHRef) -> FrozenSet[RHRef]:
+        return frozenset(self.dominators(ref))
+
+    @staticmethod
+    def _reverse_postorder(entry_ref: RHRef, control_flow: RHControlFlow) -> List[RHRef]:
+        def successors(ref: RHRef) -> Iterable[RHRef]:
+            if edge := control_flow.edge_from(ref):
+                for successor in edge.successors:
+                    yield successor.ref
+
+        postorder = list()
+        visited = {entry_ref}
+        stack = [(entry_ref, successors(entry_ref))]
+        while stack:
+            ref, pending = stack[-1]
+            for successor in pending:
+                if successor not in visited:
+                    visited.add(successor)
+                    stack.append((successor, successors(successor)))
+                    break
+            else:
+                stack.pop()
+                postorder.append(ref)
+        postorder.reverse()
+        return postorder
+
+    def _number_tree(self):
+        self._preorder = dict()
+        self._postorder = dict()
+        counter = 0
+        stack = [(self._entry, iter(self._children[self._entry]))]
+        self._preorder[self._entry] = counter
+        while stack:
+            ref, pending = stack[-1]
+            child = next(pending, None)
+            counter += 1
+            if child is not None:
+                self._preorder[child] = counter
+                stack.append((child, iter(self._children[child])))
+            else:
+                stack.pop()
+                self._postorder[ref] = counter
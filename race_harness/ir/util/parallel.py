@@ -0,0 +1,513 @@
+import dataclasses
+import itertools
+from typing import Dict, FrozenSet, Iterable, List, Optional, Set, Tuple
+from race_harness.ir import RHContext, RHModule, RHInstance, RHProcess, RHEffectBlock, RHPredicate, RHRef, RHConditionalControlFlowEdge
+from race_harness.ir.mutex import RHMutualInclusion
+from race_harness.ir.util.dominance import RHControlFlowDominators
+from race_harness.error import RHError
+
+@dataclasses.dataclass
+class ParallelState:
+    feasible: Dict[RHRef, Set[RHRef]]
+    transmissions: Set[Tuple[RHRef, RHRef, RHRef]]
+    set_additions: Set[Tuple[RHRef, RHRef]]
+
+@dataclasses.dataclass(frozen=True)
+class PairState:
+    block1: Optional[RHRef]
+    block2: Optional[RHRef]
+    pending: FrozenSet[Tuple[Tuple[RHRef, RHRef], RHRef]]
+    members: FrozenSet[Tuple[RHRef, RHRef]]
+
+@dataclasses.dataclass(frozen=True)
+class PairGuard:
+    pending: Optional[Tuple[Tuple[RHRef, RHRef], RHRef]]
+    member: Optional[Tuple[RHRef, RHRef]]
+    present: Tuple[bool, bool]
+    absent: Tuple[bool, bool]
+
+@dataclasses.dataclass(frozen=True)
+class PairTransition:
+    target: RHRef
+    negated: bool
+    guards: Tuple[PairGuard, ...]
+    consumed: Tuple[Tuple[RHRef, RHRef], ...]
+    writes: Tuple[Tuple[Tuple[RHRef, RHRef], RHRef], ...]
+    member_updates: Tuple[Tuple[Tuple[RHRef, RHRef], bool], ...]
+
+class RHMayHappenInParallel:
+    def __init__(self, context: RHContext):
+        self._ctx = context
+        self._instances = list()
+        self._processes = dict()
+        self._dominance = dict()
+        self._bindings = dict()
+        self._message_senders = dict()
+        self._message_domains = dict()
+        self._ancestors = dict()
+        self._state = None
+        self._restricted = dict()
+        self._channels = set()
+        self._instance_blocks = dict()
+        self._pairs = dict()
+        self._pair_binding_cache = dict()
+        self._pair_transition_cache = dict()
+
+    def build(self, module: RHModule):
+        self._instances = list(module.instances)
+        self._processes = dict()
+        self._dominance = dict()
+        self._bindings = dict()
+        self._message_senders = dict()
+        self._message_domains = dict()
+        self._ancestors = dict()
+        self._restricted = dict()
+        self._channels = set()
+        self._instance_blocks = dict()
+        self._pairs = dict()
+        self._pair_binding_cache = dict()
+        self._pair_transition_cache = dict()
+        for process in module.processes:
+            dominance = RHControlFlowDominators(self._ctx)
+            dominance.build(process.entry_block.ref, process.control_flow)
+            self._dominance[process.ref] = dominance
+            for domain in process.protocol.in_protocol:
+                for message in domain:
+                    self._message_domains[message] = domain.ref
+            for domain in process.protocol.out_protocol:
+                for message in domain:
+                    self._message_senders.setdefault(message, set())
+                    self._message_domains[message] = domain.ref
+
+        for instance in self._instances:
+            process = module.find_process_for(instance.protocol.ref)
+            if process is None:
+                raise RHError(f'Unable to find process for instance {instance.ref}')
+            self._processes[instance.ref] = process
+            self._bindings[instance.ref] = dict(zip(instance.protocol.parameters, instance.parameters))
+            for domain in process.protocol.out_protocol:
+                for message in domain:
+                    self._message_senders[message].add(instance.ref)
+
+        self._state = self._solve(None, None)
+        self._channels = {
+            (sender_ref, receiver_ref)
+            for sender_ref, receiver_ref, _ in self._state.transmissions
+        }
+
+    def feasible_blocks(self, instance_ref: RHRef) -> Iterable[RHRef]:
+        yield from self._state.feasible.get(instance_ref, ())
+
+    def may_happen_in_parallel(self, instance1_ref: RHRef, block1_ref: RHRef, instance2_ref: RHRef, block2_ref: RHRef) -> bool:
+        if instance1_ref == instance2_ref or \
+            block1_ref not in self._state.feasible.get(instance1_ref, ()) or \
+            block2_ref not in self._state.feasible.get(instance2_ref, ()):
+            return False
+        if (instance2_ref, instance1_ref) in self._pairs:
+            cooccurring = (block2_ref, block1_ref) in self._pair_cooccurrences(instance2_ref, instance1_ref)
+        else:
+            cooccurring = (block1_ref, block2_ref) in self._pair_cooccurrences(instance1_ref, instance2_ref)
+        return cooccurring and self._histories_compatible(instance1_ref, block1_ref, instance2_ref, block2_ref)
+
+    def populate(self, mutinc: RHMutualInclusion):
+        for index, instance1 in enumerate(self._instances):
+            for instance2 in self._instances[index + 1:]:
+                for block1_ref, block2_ref in self._pair_cooccurrences(instance1.ref, instance2.ref):
+                    if self._histories_compatible(instance1.ref, block1_ref, instance2.ref, block2_ref):
+                        mutinc.add_cooccuring_states(instance1.ref, block1_ref, instance2.ref, block2_ref)
+
+    def _histories_compatible(self, instance1_ref: RHRef, block1_ref: RHRef, instance2_ref: RHRef, block2_ref: RHRef) -> bool:
+        return block2_ref in self._restrict(instance1_ref, block1_ref).feasible[instance2_ref] and \
+            block1_ref in self._restrict(instance2_ref, block2_ref).feasible[instance1_ref]
+
+    def _restrict(self, instance_ref: RHRef, block_ref: RHRef) -> ParallelState:
+        # While an instance resides in a block, its history is confined to the blocks that can reach it
+        history = self._block_ancestors(self._processes[instance_ref], block_ref).intersection(self._state.feasible[instance_ref])
+        key = (instance_ref, history)
+        state = self._restricted.get(key, None)
+        if state is None:
+            state = self._solve(instance_ref, history)
+            self._restricted[key] = state
+        return state
+
+    def _block_ancestors(self, process: RHProcess, block_ref: RHRef) -> FrozenSet[RHRef]:
+        key = (process.ref, block_ref)
+        ancestors = self._ancestors.get(key, None)
+        if ancestors is None:
+            visited = {block_ref}
+            queue = [block_ref]
+            while queue:
+                for pred in process.control_flow.edges_to(queue.pop()):
+                    if pred not in visited:
+                        visited.add(pred)
+                        queue.append(pred)
+            ancestors = frozenset(visited)
+            self._ancestors[key] = ancestors
+        return ancestors
+
+    def _pair_cooccurrences(self, instance1_ref: RHRef, instance2_ref: RHRef) -> Set[Tuple[RHRef, RHRef]]:
+        key = (instance1_ref, instance2_ref)
+        cooccurrences = self._pairs.get(key, None)
+        if cooccurrences is None:
+            instance1 = self._ctx[instance1_ref].to_instance()
+            instance2 = self._ctx[instance2_ref].to_instance()
+            if (instance1_ref, instance2_ref) in self._channels or (instance2_ref, instance1_ref) in self._channels:
+                cooccurrences = self._explore_pair(instance1, instance2)
+            else:
+                # Instances that never message each other are explored separately
+                cooccurrences = set(itertools.product(self._explore_instance(instance1), self._explore_instance(instance2)))
+            self._pairs[key] = cooccurrences
+        return cooccurrences
+
+    def _explore_instance(self, instance: RHInstance) -> Set[RHRef]:
+        blocks = self._instance_blocks.get(instance.ref, None)
+        if blocks is None:
+            blocks = set()
+            queue = [None]
+            while queue:
+                block_ref = queue.pop()
+                for successor_ref, _, _ in self._pair_steps(instance, None, block_ref, frozenset(), frozenset()):
+                    if successor_ref not in blocks:
+                        blocks.add(successor_ref)
+                        queue.append(successor_ref)
+            self._instance_blocks[instance.ref] = blocks
+        return blocks
+
+    def _explore_pair(self, instance1: RHInstance, instance2: RHInstance) -> Set[Tuple[RHRef, RHRef]]:
+        # Both instances are explored together with the messages pending between them and their membership in each
+        # other's sets. Any other instance may deliver a message it can ever send at any time
+        initial = PairState(block1=None, block2=None, pending=frozenset(), members=frozenset())
+        visited = {initial}
+        queue = [initial]
+        cooccurrences = set()
+        while queue:
+            state = queue.pop()
+            if state.block1 is not None and state.block2 is not None:
+                cooccurrences.add((state.block1, state.block2))
+            successors = [
+                PairState(block1=block_ref, block2=state.block2, pending=pending, members=members)
+                for block_ref, pending, members in self._pair_steps(instance1, instance2.ref, state.block1, state.pending, state.members)
+            ]
+            successors.extend(
+                PairState(block1=state.block1, block2=block_ref, pending=pending, members=members)
+                for block_ref, pending, members in self._pair_steps(instance2, instance1.ref, state.block2, state.pending, state.members)
+            )
+            for successor in successors:
+                if successor not in visited:
+                    visited.add(successor)
+                    queue.append(successor)
+        return cooccurrences
+
+    def _pair_steps(self, instance: RHInstance, partner_ref: Optional[RHRef], block_ref: Optional[RHRef], pending: FrozenSet[Tuple[Tuple[RHRef, RHRef], RHRef]], members: FrozenSet[Tuple[RHRef, RHRef]]) -> Iterable[Tuple[RHRef, FrozenSet[Tuple[Tuple[RHRef, RHRef], RHRef]], FrozenSet[Tuple[RHRef, RHRef]]]]:
+        for transition in self._pair_transitions(instance, partner_ref, block_ref):
+            values = [
+                self._guard_values(guard, pending, members)
+                for guard in transition.guards
+            ]
+            if transition.negated and values and not any(may_fail for _, may_fail in values):
+                continue
+            elif not transition.negated and not all(may_hold for may_hold, _ in values):
+                continue
+
+            next_pending = dict(pending)
+            for key in transition.consumed:
+                next_pending.pop(key, None)
+            next_pending.update(transition.writes)
+            next_members = set(members)
+            for member, added in transition.member_updates:
+                if added:
+                    next_members.add(member)
+                else:
+                    next_members.discard(member)
+            yield transition.target, frozenset(next_pending.items()), frozenset(next_members)
+
+    @staticmethod
+    def _guard_values(guard: PairGuard, pending: FrozenSet[Tuple[Tuple[RHRef, RHRef], RHRef]], members: FrozenSet[Tuple[RHRef, RHRef]]) -> Tuple[bool, bool]:
+        if guard.pending is not None:
+            present = guard.pending in pending
+        elif guard.member is not None:
+            present = guard.member in members
+        else:
+            present = True
+        return guard.present if present else guard.absent
+
+    def _pair_transitions(self, instance: RHInstance, partner_ref: Optional[RHRef], block_ref: Optional[RHRef]) -> List[PairTransition]:
+        key = (instance.ref, partner_ref, block_ref)
+        transitions = self._pair_transition_cache.get(key, None)
+        if transitions is not None:
+            return transitions
+
+        process = self._processes[instance.ref]
+        if block_ref is None:
+            branches = [(process.entry_block, None, False)]
+        else:
+            edge = process.control_flow.edge_from(block_ref)
+            if edge is None:
+                branches = []
+            elif isinstance(edge, RHConditionalControlFlowEdge):
+                branches = [(edge.target, edge.condition, False), (edge.alternative, edge.condition, True)]
+            else:
+                branches = [(edge.target, None, False)]
+
+        transitions = dict()
+        for block, condition, negated in branches:
+            for bindings in self._pair_bindings(instance, partner_ref, block, condition):
+                guards = list()
+                consumed = list()
+                if condition is not None:
+                    guards.extend(self._pair_guards(instance, partner_ref, condition, bindings))
+                    if not negated:
+                        for receival in self._receivals(condition):
+                            if receival.ref in bindings and bindings[receival.ref][1] == partner_ref:
+                                message, sender_ref = bindings[receival.ref]
+                                consumed.append((sender_ref, self._message_domains[message]))
+                writes = list()
+                member_updates = list()
+                for oper in block.content:
+                    if trans := oper.as_transmission():
+                        for dst in trans.destinations:
+                            dst = self._resolve_pair_value(instance, bindings, dst)
+                            domain = self._ctx[dst].as_domain()
+                            if dst == partner_ref or (domain is not None and partner_ref in domain):
+                                writes.append(((instance.ref, self._message_domains[trans.message]), trans.message))
+                    elif set_add := oper.as_set_add():
+                        if self._resolve_pair_value(instance, bindings, set_add.value) == partner_ref:
+                            member_updates.append(((instance.ref, set_add.target_set), True))
+                    elif set_del := oper.as_set_del():
+                        if self._resolve_pair_value(instance, bindings, set_del.value) == partner_ref:
+                            member_updates.append(((instance.ref, set_del.target_set), False))
+                transition = PairTransition(
+                    target=block.ref,
+                    negated=negated,
+                    guards=tuple(guards),
+                    consumed=tuple(consumed),
+                    writes=tuple(writes),
+                    member_updates=tuple(member_updates)
+                )
+                transitions[transition] = None
+        transitions = list(transitions.keys())
+        self._pair_transition_cache[key] = transitions
+        return transitions
+
+    def _pair_bindings(self, instance: RHInstance, partner_ref: Optional[RHRef], block: RHEffectBlock, condition: Optional[RHPredicate]) -> List[Dict[RHRef, Tuple[RHRef, RHRef]]]:
+        # Receivals of the edge condition and of the dominating conditions bind their senders the same way as
+        # in the state transition translation, but only the identities of the edge condition are checked
+        key = (instance.ref, partner_ref, block.ref, condition.ref if condition is not None else None)
+        bindings = self._pair_binding_cache.get(key, None)
+        if bindings is not None:
+            return bindings
+
+        process = self._processes[instance.ref]
+        conditions = [condition]
+        for edge in self._dominance[process.ref].conditional_dominators(block.ref):
+            if edge.condition != condition:
+                conditions.append(edge.condition)
+        identities = list(self._identities(condition)) if condition is not None else []
+        constants = {
+            self._bindings[instance.ref].get(ref, ref)
+            for identity in identities
+            for ref in identity
+        }
+        choices = list()
+        for dom_condition in conditions:
+            if dom_condition is None:
+                continue
+            for receival in self._receivals(dom_condition):
+                if not self._has_protocol_senders(receival):
+                    continue
+                # Senders that are neither the partner nor compared against only matter through whether they
+                # ever send the message, so a single one of them stands for the others
+                signatures = dict()
+                for message in receival.operation.as_receival().messages:
+                    for sender_ref in sorted(self._message_senders.get(message, ())):
+                        if sender_ref == partner_ref or sender_ref in constants:
+                            signature = (message, sender_ref)
+                        else:
+                            signature = (message, (sender_ref, instance.ref, message) in self._state.transmissions)
+                        signatures.setdefault(signature, (receival.ref, (message, sender_ref)))
+                choices.append(list(signatures.values()))
+
+        bindings = list()
+        for choice in itertools.product(*choices):
+            binding = dict(choice)
+            if all(
+                self._resolve_pair_value(instance, binding, left) == self._resolve_pair_value(instance, binding, right)
+                for left, right in identities
+            ):
+                bindings.append(binding)
+        self._pair_binding_cache[key] = bindings
+        return bindings
+
+    def _identities(self, predicate: RHPredicate) -> Iterable[Tuple[RHRef, RHRef]]:
+        if identity := predicate.operation.as_identity():
+            yield identity.left, identity.right
+        elif conjunction := predicate.operation.as_conjunction():
+            for conj in conjunction.conjuncts:
+                yield from self._identities(self._ctx[conj].to_predicate())
+
+    def _resolve_pair_value(self, instance: RHInstance, bindings: Dict[RHRef, Tuple[RHRef, RHRef]], ref: RHRef) -> RHRef:
+        if ref in bindings:
+            return bindings[ref][1]
+        return self._bindings[instance.ref].get(ref, ref)
+
+    def _pair_guards(self, instance: RHInstance, partner_ref: Optional[RHRef], condition: RHPredicate, bindings: Dict[RHRef, Tuple[RHRef, RHRef]]) -> Iterable[PairGuard]:
+        # Each guard tells whether it may hold and whether it may fail, depending on whether a pending message or
+        # set membership of the partner is present
+        if conjunction := condition.operation.as_conjunction():
+            for conj in conjunction.conjuncts:
+                yield from self._pair_guards(instance, partner_ref, self._ctx[conj].to_predicate(), bindings)
+        elif condition.operation.as_receival():
+            if condition.ref in bindings:
+                message, sender_ref = bindings[condition.ref]
+                if sender_ref == partner_ref:
+                    yield PairGuard(pending=((sender_ref, self._message_domains[message]), message), member=None, present=(True, False), absent=(False, True))
+                else:
+                    may_hold = (sender_ref, instance.ref, message) in self._state.transmissions
+                    yield PairGuard(pending=None, member=None, present=(may_hold, True), absent=(may_hold, True))
+        elif set_empty := condition.operation.as_set_empty():
+            elements = self._ctx[self._ctx[set_empty.target_set].to_set().domain].to_domain().items
+            contains_others = (instance.ref, set_empty.target_set) in self._state.set_additions and \
+                any(element != partner_ref for element in elements)
+            yield PairGuard(pending=None, member=(instance.ref, set_empty.target_set), present=(False, True), absent=(True, contains_others))
+        elif set_has := condition.operation.as_set_has():
+            if self._resolve_pair_value(instance, bindings, set_has.value) == partner_ref:
+                yield PairGuard(pending=None, member=(instance.ref, set_has.target_set), present=(True, True), absent=(False, True))
+            else:
+                may_hold = (instance.ref, set_has.target_set) in self._state.set_additions
+                yield PairGuard(pending=None, member=None, present=(may_hold, True), absent=(may_hold, True))
+
+    def _solve(self, frozen_instance_ref: Optional[RHRef], frozen_blocks: Optional[FrozenSet[RHRef]]) -> ParallelState:
+        state = ParallelState(
+            feasible={
+                instance.ref: set(frozen_blocks) if instance.ref == frozen_instance_ref else {self._processes[instance.ref].entry_block.ref}
+                for instance in self._instances
+            },
+            transmissions=set(),
+            set_additions=set()
+        )
+
+        fixpoint_reached = False
+        while not fixpoint_reached:
+            fixpoint_reached = True
+            for instance in self._instances:
+                if self._propagate(state, instance, instance.ref != frozen_instance_ref):
+                    fixpoint_reached = False
+        return state
+
+    def _propagate(self, state: ParallelState, instance: RHInstance, advance: bool) -> bool:
+        process = self._processes[instance.ref]
+        feasible = state.feasible[instance.ref]
+        changed = False
+        queue = list(feasible)
+        while queue:
+            block_ref = queue.pop()
+            block = self._ctx[block_ref].to_effect_block()
+            for oper in block.content:
+                if trans := oper.as_transmission():
+                    for dst in trans.destinations:
+                        for receiver_ref in self._resolve_destination(state, instance, process, block, dst):
+                            fact = (instance.ref, receiver_ref, trans.message)
+                            if fact not in state.transmissions:
+                                state.transmissions.add(fact)
+                                changed = True
+                elif set_add := oper.as_set_add():
+                    fact = (instance.ref, set_add.target_set)
+                    if fact not in state.set_additions:
+                        state.set_additions.add(fact)
+                        changed = True
+
+            edge = process.control_flow.edge_from(block_ref)
+            if edge is None or not advance:
+                continue
+            successors = list(edge.successors)
+            if isinstance(edge, RHConditionalControlFlowEdge) and not self._may_hold(state, instance, edge.condition, dict()):
+                successors = [edge.alternative]
+            for successor in successors:
+                if successor.ref not in feasible:
+                    feasible.add(successor.ref)
+                    queue.append(successor.ref)
+                    changed = True
+        return changed
+
+    def _binding_conditions(self, process: RHProcess, block: RHEffectBlock) -> Iterable[RHPredicate]:
+        for source_ref in process.control_flow.edges_to(block.ref):
+            edge = process.control_flow.edge_from(source_ref)
+            if isinstance(edge, RHConditionalControlFlowEdge):
+                yield edge.condition
+        for edge in self._dominance[process.ref].conditional_dominators(block.ref):
+            yield edge.condition
+
+    def _receivals(self, predicate: RHPredicate) -> Iterable[RHPredicate]:
+        if predicate.operation.as_receival():
+            yield predicate
+        elif conjunction := predicate.operation.as_conjunction():
+            for conj in conjunction.conjuncts:
+                yield from self._receivals(self._ctx[conj].to_predicate())
+
+    def _resolve_destination(self, state: ParallelState, instance: RHInstance, process: RHProcess, block: RHEffectBlock, dst: RHRef) -> Set[RHRef]:
+        dst = self._bindings[instance.ref].get(dst, dst)
+        entity = self._ctx[dst]
+        if entity.as_instance():
+            return {dst}
+        elif domain := entity.as_domain():
+            return set(domain.items)
+        elif entity.as_predicate():
+            for condition in self._binding_conditions(process, block):
+                for receival in self._receivals(condition):
+                    if receival.ref == dst:
+                        return self._possible_senders(state, instance, receival)
+        return set()
+
+    def _possible_senders(self, state: ParallelState, instance: RHInstance, receival: RHPredicate) -> Set[RHRef]:
+        return {
+            sender_ref
+            for message in receival.operation.as_receival().messages
+            for sender_ref in self._message_senders.get(message, ())
+            if (sender_ref, instance.ref, message) in state.transmissions
+        }
+
+    def _has_protocol_senders(self, receival: RHPredicate) -> bool:
+        return any(
+            self._message_senders.get(message, ())
+            for message in receival.operation.as_receival().messages
+        )
+
+    def _resolve_identity_side(self, instance: RHInstance, candidates: Dict[RHRef, Set[RHRef]], ref: RHRef) -> Tuple[bool, Set[RHRef]]:
+        if ref in candidates:
+            return True, candidates[ref]
+        ref = self._bindings[instance.ref].get(ref, ref)
+        if self._ctx[ref].as_instance():
+            return True, {ref}
+        return False, set()
+
+    def _may_hold(self, state: ParallelState, instance: RHInstance, condition: RHPredicate, candidates: Dict[RHRef, Set[RHRef]]) -> bool:
+        if conjunction := condition.operation.as_conjunction():
+            conjuncts = [
+                self._ctx[conj].to_predicate()
+                for conj in conjunction.conjuncts
+            ]
+            candidates = dict(candidates)
+            for conj in conjuncts:
+                for receival in self._receivals(conj):
+                    if self._has_protocol_senders(receival):
+                        candidates[receival.ref] = self._possible_senders(state, instance, receival)
+            return all(
+                self._may_hold(state, instance, conj, candidates)
+                for conj in conjuncts
+            )
+        elif condition.operation.as_receival():
+            if not self._has_protocol_senders(condition):
+                return True
+            senders = candidates.get(condition.ref, None)
+            if senders is None:
+                senders = self._possible_senders(state, instance, condition)
+            return len(senders) > 0
+        elif identity := condition.operation.as_identity():
+            left_known, left = self._resolve_identity_side(instance, candidates, identity.left)
+            right_known, right = self._resolve_identity_side(instance, candidates, identity.right)
+            if left_known and right_known:
+                return len(left.intersection(right)) > 0
+            return True
+        elif set_has := condition.operation.as_set_has():
+            return (instance.ref, set_has.target_set) in state.set_additions
+        return True
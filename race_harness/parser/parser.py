@@ -1,9 +1,9 @@
 import pathlib
 import dataclasses
-from typing import Optional
+from typing import List, Optional
 import lark
 from race_harness.error import RHError
-from race_harness.ir import RHContext, RHTransmissionOp, RHExternalActionOp, RHSetAddOp, RHSetDelOp, RHNondetPred, RHSetEmptyPred, RHSetHasPred, RHReceivalPred, RHConjunctionPred, RHEffectBlock, RHPredicate, RHModule, RHIdentityPred
+from race_harness.ir import RHContext, RHTransmissionOp, RHExternalActionOp, RHSetAddOp, RHSetDelOp, RHNondetPred, RHSetEmptyPred, RHSetHasPred, RHReceivalPred, RHConjunctionPred, RHEffectBlock, RHPredicate, RHModule, RHIdentityPred, RHProtocol, RHProcess
 from race_harness.parser.scope import RHScope
 
 SCRIPT_FILEPATH = pathlib.Path(__file__)
@@ -14,28 +14,35 @@ class BlockUncondSucc:
 
 @dataclasses.dataclass
 class BlockCondSucc:
-    target: RHEffectBlock
+    target: Optional[RHEffectBlock]
     alternative: Optional[RHEffectBlock]
     condition: RHPredicate
 
-class RHInterp(lark.visitors.Interpreter):
-    def __init__(self, context: RHContext, scope: RHScope):
+@dataclasses.dataclass
+class BlockExit:
+    # Pending successor of a block: unconditional (branch is None), branch target (True) or alternative (False)
+    block: RHEffectBlock
+    branch: Optional[bool]
+
+class RHModuleBuilder(lark.Transformer):
+    # Applied by the LALR parser on reduction: declarations enter the IR in source order, while
+    # process bodies are kept as trees until all (possibly later) declarations are known
+    def __init__(self):
         super().__init__()
+        self._ctx = None
+        self._scope = None
+
+    def reset(self, context: RHContext, scope: RHScope):
         self._ctx = context
-        self._scopes = [scope]
-        self._proto = None
-        self._current_block = None
-        self._block_succs = None
-        self._control_flow = None
+        self._scope = scope
 
-    def module(self, tree: lark.Tree):
+    def module(self, children) -> RHModule:
         protos = dict()
         instances = list()
         params = list()
-        for tld in tree.children:
-            proc = self.visit(tld)
-            if proc[0] is not None:
-                type, payload = proc[0]
+        for decl in children:
+            if decl is not None:
+                type, payload = decl
                 if type == 'proto':
                     protos[payload[0]] = (payload[1], payload[2])
                 elif type == 'instance':
@@ -46,98 +53,65 @@ class RHInterp(lark.visitors.Interpreter):
             for instance in ins:
                 for param in params:
                     self._ctx[instance].to_instance().add_parameter(self._scope.resolve(param))
-        processes = list()
-        for proto, (name, tree) in protos.items():
-            proc_scope = RHScope(self._scope)
-            self._scopes.append(proc_scope)
-            self._proto = proto
-            self._block_succs = dict()
-            for param in proto.parameters:
-                self._scope.bind(self._ctx[param].to_symbol().label, param)
-            entry_block = self._ctx.new_effect_block()
-            self._current_block = entry_block
-            self._control_flow = self._ctx.new_control_flow()
-            self.visit(tree)
-            self._link_blocks()
-            processes.append(self._ctx.new_process(proto.ref, name, entry_block.ref, self._control_flow.ref).ref)
-            self._block_succs = None
-            self._control_flow = None
-            self._proto = None
-            self._current_block = None
-            self._scopes.pop()
-
-        module = self._ctx.new_module(processes, instances)
-        return module
-
-    def channel_decl(self, tree: lark.Tree):
-        channel_name = str(tree.children[1])
+        interp = RHInterp(self._ctx, self._scope)
+        processes = [
+            interp.build_process(proto, name, body).ref
+            for proto, (name, body) in protos.items()
+        ]
+        return self._ctx.new_module(processes, instances)
+
+    def channel_decl(self, children):
+        channel_name = str(children[1])
         refs = list()
-        for child in tree.children[3].children:
-            symbol = self.visit(child)
+        for symbol in children[3].children:
             ref = self._ctx.new_symbol(symbol).ref
             self._scope.bind(symbol, ref)
             refs.append(ref)
         ref = self._ctx.new_domain(channel_name, refs).ref
         self._scope.bind(channel_name, ref)
 
-    def proc_decl(self, tree: lark.Tree):
-        decl_name = str(tree.children[1])
-        in_proto, out_proto = self.visit(tree.children[2])
-        params = self.visit(tree.children[3])
-        decl = self._ctx.new_protocol(decl_name, in_proto, out_proto, params)
+    def proc_decl(self, children):
+        decl_name = str(children[1])
+        in_proto, out_proto = children[2]
+        decl = self._ctx.new_protocol(decl_name, in_proto, out_proto, children[3])
         self._scope.bind(decl_name, decl.ref)
-        return ('proto', (decl, decl_name, tree.children[4]))
-    
-    def proc_params(self, tree: lark.Tree):
-        if len(tree.children) > 0:
-            return [
-                self._ctx.new_symbol(self.visit(child)).ref
-                for child in tree.children[1:-1]
-            ]
-        else:
-            return list()
+        return ('proto', (decl, decl_name, children[4]))
+
+    def proc_params(self, children):
+        return [
+            self._ctx.new_symbol(symbol).ref
+            for symbol in children[1:-1]
+        ]
+
+    def instance_params(self, children):
+        return children[1:-1]
 
-    def proc_protocol_decl(self, tree: lark.Tree):
+    def proc_protocol_decl(self, children):
         in_proto, out_proto = None, None
-        if len(tree.children) > 0:
-            in_proto = self.visit(tree.children[1])
-            if len(tree.children) > 2:
-                out_proto = self.visit(tree.children[3])
+        if len(children) > 0:
+            in_proto = children[1]
+            if len(children) > 2:
+                out_proto = children[3]
         return (in_proto, out_proto)
-    
-    def protocol_channel_list(self, tree: lark.Tree):
-        channel_symbol = self.visit(tree.children[0])
-        lst = [self._scope.resolve(channel_symbol)]
-        if len(tree.children) > 1:
-            lst.extend(self.protocol_channel_list(tree.children[1]))
-        return lst
-
-    def proc_single_instance(self, tree: lark.Tree):
-        instance_name = str(tree.children[1])
-        proc_name = str(tree.children[2])
-        if len(tree.children[3].children) > 0:
-            proc_params = [
-                self.visit(child)
-                for child in tree.children[3].children[1:-1]
-            ]
-        else:
-            proc_params = list()
+
+    def protocol_channel_list(self, children):
+        return [
+            self._scope.resolve(channel_symbol)
+            for channel_symbol in children
+        ]
+
+    def proc_single_instance(self, children):
+        instance_name = str(children[1])
+        proc_name = str(children[2])
         proc_ref = self._scope.resolve(proc_name)
         instance = self._ctx.new_instance(instance_name, proc_ref)
         self._scope.bind(instance_name, instance.ref)
-        return ('instance', ([instance.ref], proc_params))
-
-    def proc_multi_instance(self, tree: lark.Tree):
-        instance_name = str(tree.children[1])
-        cardinality = int(tree.children[3])
-        proc_name = str(tree.children[5])
-        if len(tree.children[6].children) > 0:
-            proc_params = [
-                self.visit(child)
-                for child in tree.children[6].children[1:-1]
-            ]
-        else:
-            proc_params = list()
+        return ('instance', ([instance.ref], children[3]))
+
+    def proc_multi_instance(self, children):
+        instance_name = str(children[1])
+        cardinality = int(children[3])
+        proc_name = str(children[5])
         proc_ref = self._scope.resolve(proc_name)
         items = list()
         for i in range(cardinality):
@@ -146,117 +120,126 @@ class RHInterp(lark.visitors.Interpreter):
             self._scope.bind(f'{instance_name}{i}', ref)
         ref = self._ctx.new_domain(instance_name, items).ref
         self._scope.bind(instance_name, ref)
-        return ('instance', (items, proc_params))
+        return ('instance', (items, children[6]))
+
+    def symbol(self, children):
+        return str(children[0])
+
+    def symbol_set(self, children):
+        return children[1:-1]
+
+class RHInterp(lark.visitors.Interpreter):
+    def __init__(self, context: RHContext, scope: RHScope):
+        super().__init__()
+        self._ctx = context
+        self._scopes = [scope]
+        self._proto = None
+        self._current_block = None
+        self._entry_block = None
+        self._exits = None
+        self._block_succs = None
+        self._control_flow = None
+
+    def build_process(self, proto: RHProtocol, name: str, body: lark.Tree) -> RHProcess:
+        proc_scope = RHScope(self._scope)
+        self._scopes.append(proc_scope)
+        self._proto = proto
+        self._block_succs = dict()
+        self._exits = list()
+        for param in proto.parameters:
+            self._scope.bind(self._ctx[param].to_symbol().label, param)
+        entry_block = self._ctx.new_effect_block()
+        self._entry_block = entry_block
+        self._current_block = entry_block
+        self._control_flow = self._ctx.new_control_flow()
+        self.visit(body)
+        if self._exits:
+            self._open_block()
+        self._link_blocks()
+        process = self._ctx.new_process(proto.ref, name, entry_block.ref, self._control_flow.ref)
+        self._block_succs = None
+        self._control_flow = None
+        self._proto = None
+        self._current_block = None
+        self._entry_block = None
+        self._exits = None
+        self._scopes.pop()
+        return process
 
     def compound_stmt(self, tree: lark.Tree):
         scope = RHScope(self._scope)
         self._scopes.append(scope)
         for item in tree.children[1:-1]:
-            open_blocks = self.visit(item)
-            if open_blocks:
-                self._current_block = self._ctx.new_effect_block()
-                for block in open_blocks:
-                    self._set_successor(block, self._current_block)
+            self.visit(item)
         self._scopes.pop()
-        return []
     
     def var_decl_stmt(self, tree: lark.Tree):
-        name = self.visit(tree.children[1])
+        name = tree.children[1]
         var_type = self.visit(tree.children[3])
         if var_type[0] == 'set':
             set = self._ctx.new_set(name, var_type[1])
             self._scope.bind(name, set.ref)
 
-    def symbol(self, tree: lark.Tree):
-        return str(tree.children[0])
-    
-    def symbol_set(self, tree: lark.Tree):
-        return [
-            self.visit(item)
-            for item in tree.children[1:-1]
-        ]
-    
     def set_var_type(self, tree: lark.Tree):
-        name = self.visit(tree.children[1])
+        name = tree.children[1]
         ref = self._scope[name]
         return ('set', ref)
     
     def unicast_send_stmt(self, tree: lark.Tree):
-        msg_name = self.visit(tree.children[1])
-        destination_name = self.visit(tree.children[2])
+        msg_name = tree.children[1]
+        destination_name = tree.children[2]
         msg = self._scope[msg_name]
         destination = self._scope[destination_name]
-        self._ctx.add_operation(self._current_block.ref, RHTransmissionOp((destination,), msg))
-        next_block = self._ctx.new_effect_block()
-        self._set_successor(self._current_block, next_block)
-        self._current_block = next_block
+        self._ctx.add_operation(self._open_block().ref, RHTransmissionOp((destination,), msg))
+        self._close_block()
     
     def multicast_send_stmt(self, tree: lark.Tree):
-        msg_name = self.visit(tree.children[1])
+        msg_name = tree.children[1]
         destination_names = tree.children[3:-1]
         msg = self._scope[msg_name]
         destinations = (
-            self._scope[self.visit(destination_name)]
+            self._scope[destination_name]
             for destination_name in destination_names
         )
-        self._ctx.add_operation(self._current_block.ref, RHTransmissionOp(destinations, msg))
-        next_block = self._ctx.new_effect_block()
-        self._set_successor(self._current_block, next_block)
-        self._current_block = next_block
+        self._ctx.add_operation(self._open_block().ref, RHTransmissionOp(destinations, msg))
+        self._close_block()
     
     def action_stmt(self, tree: lark.Tree):
         action_name = str(tree.children[1])
-        self._ctx.add_operation(self._current_block.ref, RHExternalActionOp(action_name))
-        next_block = self._ctx.new_effect_block()
-        self._set_successor(self._current_block, next_block)
-        self._current_block = next_block
+        self._ctx.add_operation(self._open_block().ref, RHExternalActionOp(action_name))
+        self._close_block()
     
     def loop_stmt(self, tree: lark.Tree):
-        loop_head_block = self._ctx.new_effect_block()
-        loop_entry_block = self._ctx.new_effect_block()
-        loop_tail_block = self._ctx.new_effect_block()
-
-        self._set_successor(self._current_block, loop_head_block)
-        self._set_successor(loop_head_block, loop_entry_block)
-        self._current_block = loop_entry_block
-        open_blocks = self.visit(tree.children[1])
-        if open_blocks:
-            for block in open_blocks:
-                self._set_successor(block, loop_head_block)
-        else:
-            self._set_successor(self._current_block, loop_head_block)
-        self._current_block = loop_tail_block
+        loop_head_block = self._head_block()
+        self.visit(tree.children[1])
+        self._jump(loop_head_block)
     
     def break_stmt(self, tree: lark.Tree):
-        label = self.visit(tree.children[1])        
-        tail = self._scope[f'snd:{label}']
-        self._set_successor(self._current_block, self._ctx[tail])
-        self._current_block = self._ctx.new_effect_block()
+        label = tree.children[1]
+        self._scope[f'snd:{label}'].extend(self._pending_exits())
+        self._exits = list()
+        self._current_block = None
     
     def continue_stmt(self, tree: lark.Tree):
-        label = self.visit(tree.children[1])        
+        label = tree.children[1]
         head = self._scope[f'fst:{label}']
-        self._set_successor(self._current_block, self._ctx[head])
-        self._current_block = self._ctx.new_effect_block()
+        self._jump(self._ctx[head])
     
     def half_branch_stmt(self, tree: lark.Tree):
         condition_tree = tree.children[1]
         body_tree = tree.children[3]
 
         self._scopes.append(RHScope(self._scope))
-        branch_entry_block = self._ctx.new_effect_block()
-        current_block = self._current_block
-
+        branch_block = self._open_block()
         condition_pred = self.visit(condition_tree)
-        self._set_branch(self._current_block, branch_entry_block, None, condition_pred)
-        self._current_block = branch_entry_block
+        self._set_branch(branch_block, condition_pred)
+        self._exits = [BlockExit(branch_block, True)]
+        self._current_block = None
         
-        open_blocks = self.visit(body_tree)
+        self.visit(body_tree)
         self._scopes.pop()
-        if open_blocks:
-            return [*open_blocks, current_block]
-        else:
-            return [self._current_block, current_block]
+        self._exits = [*self._pending_exits(), BlockExit(branch_block, False)]
+        self._current_block = None
     
     def full_branch_stmt(self, tree: lark.Tree):
         condition_tree = tree.children[1]
@@ -265,73 +248,59 @@ class RHInterp(lark.visitors.Interpreter):
 
         self._scopes.append(RHScope(self._scope))
         condition_pred = self.visit(condition_tree)
-        branch_then_entry_block = self._ctx.new_effect_block()
-        branch_else_entry_block = self._ctx.new_effect_block()
-
-        self._set_branch(self._current_block, branch_then_entry_block, branch_else_entry_block, condition_pred)
+        branch_block = self._open_block()
+        self._set_branch(branch_block, condition_pred)
 
-        exit_blocks = []
-        self._current_block = branch_then_entry_block
-        open_blocks = self.visit(then_tree)
-        if open_blocks:
-            exit_blocks.extend(open_blocks)
-        else:
-            exit_blocks.append(self._current_block)
+        self._exits = [BlockExit(branch_block, True)]
+        self._current_block = None
+        self.visit(then_tree)
+        exits = self._pending_exits()
         self._scopes.pop()
 
-        self._current_block = branch_else_entry_block
-        open_blocks = self.visit(else_tree)
-        if open_blocks:
-            exit_blocks.extend(open_blocks)
-        else:
-            exit_blocks.append(self._current_block)
-
-        return exit_blocks
+        self._exits = [BlockExit(branch_block, False)]
+        self._current_block = None
+        self.visit(else_tree)
+        self._exits = [*exits, *self._pending_exits()]
+        self._current_block = None
     
     def set_add_stmt(self, tree: lark.Tree):
-        set_name = self.visit(tree.children[3])
-        value_name = self.visit(tree.children[1])
+        set_name = tree.children[3]
+        value_name = tree.children[1]
 
         set_ref = self._scope[set_name]
         value_ref = self._scope[value_name]
-        self._ctx.add_operation(self._current_block.ref, RHSetAddOp(set_ref, value_ref))
+        self._ctx.add_operation(self._open_block().ref, RHSetAddOp(set_ref, value_ref))
     
     def set_del_stmt(self, tree: lark.Tree):
-        set_name = self.visit(tree.children[3])
-        value_name = self.visit(tree.children[1])
+        set_name = tree.children[3]
+        value_name = tree.children[1]
 
         set_ref = self._scope[set_name]
         value_ref = self._scope[value_name]
-        self._ctx.add_operation(self._current_block.ref, RHSetDelOp(set_ref, value_ref))
+        self._ctx.add_operation(self._open_block().ref, RHSetDelOp(set_ref, value_ref))
 
     def labelled_stmt(self, tree: lark.Tree):
-        label = self.visit(tree.children[0])
+        label = str(tree.children[0])
 
-        head_block = self._ctx.new_effect_block()
-        tail_block = self._ctx.new_effect_block()
+        head_block = self._head_block()
         self._scopes.append(RHScope(self._scope))
+        break_exits = list()
         self._scope.bind(f'fst:{label}', head_block.ref)
-        self._scope.bind(f'snd:{label}', tail_block.ref)
-
-        self._set_successor(self._current_block, head_block)
-        self._current_block = head_block
-        open_blocks = self.visit(tree.children[2])
-        if open_blocks:
-            for block in open_blocks:
-                self._set_successor(block, tail_block)
-        else:
-            self._set_successor(self._current_block, tail_block)
+        self._scope.bind(f'snd:{label}', break_exits)
+
+        self.visit(tree.children[2])
         self._scopes.pop()
-        self._current_block = tail_block
+        self._exits = [*self._pending_exits(), *break_exits]
+        self._current_block = None
 
     def cond_nondet(self, tree: lark.Tree):
         return self._ctx.new_predicate(RHNondetPred())
     
     def cond_single_recv(self, tree: lark.Tree):
         msg_tree = tree.children[1]
-        sender = self.visit(tree.children[3]) if len(tree.children) > 2 else None
+        sender = tree.children[3] if len(tree.children) > 2 else None
 
-        msg = self._scope[self.visit(msg_tree)]
+        msg = self._scope[msg_tree]
         pred = self._ctx.new_predicate(RHReceivalPred((msg,)))
         if sender:
             self._scope.bind(sender, pred.ref)
@@ -339,11 +308,11 @@ class RHInterp(lark.visitors.Interpreter):
     
     def cond_multi_recv(self, tree: lark.Tree):
         msg_tree = tree.children[1]
-        sender = self.visit(tree.children[3]) if len(tree.children) > 2 else None
+        sender = tree.children[3] if len(tree.children) > 2 else None
 
         msgs = [
             self._scope[msg_name]
-            for msg_name in self.visit(msg_tree)
+            for msg_name in msg_tree
         ]
         pred = self._ctx.new_predicate(RHReceivalPred(msgs))
         if sender:
@@ -351,21 +320,21 @@ class RHInterp(lark.visitors.Interpreter):
         return pred
     
     def cond_set_has(self, tree: lark.Tree):
-        set_name = self.visit(tree.children[0])
-        value_name = self.visit(tree.children[2])
+        set_name = tree.children[0]
+        value_name = tree.children[2]
 
         set_ref = self._scope[set_name]
         value_ref = self._scope[value_name]
         return self._ctx.new_predicate(RHSetHasPred(set_ref, value_ref))
     
     def cond_set_empty(self, tree: lark.Tree):
-        set_name = self.visit(tree.children[0])
+        set_name = tree.children[0]
         set_ref = self._scope[set_name]
         return self._ctx.new_predicate(RHSetEmptyPred(set_ref))
     
     def cond_is(self, tree: lark.Tree):
-        left = self._scope[self.visit(tree.children[0])]
-        right = self._scope[self.visit(tree.children[2])]
+        left = self._scope[tree.children[0]]
+        right = self._scope[tree.children[2]]
         return self._ctx.new_predicate(RHIdentityPred(left, right))
     
     def cond_and(self, tree: lark.Tree):
@@ -378,36 +347,68 @@ class RHInterp(lark.visitors.Interpreter):
     def _scope(self) -> RHScope:
         return self._scopes[-1]
     
-    def _set_successor(self, block: RHEffectBlock, successor: RHEffectBlock):
-        existing = self._block_succs.get(block)
-        if existing is not None:
-            if isinstance(existing, BlockCondSucc) and existing.alternative is None:
-                existing.alternative = successor
-            else:
-                raise RHError('Internal error in effect block successor graph encoding')
+    def _pending_exits(self) -> List[BlockExit]:
+        if self._current_block is not None:
+            return [*self._exits, BlockExit(self._current_block, None)]
+        return self._exits
+
+    def _jump(self, target: RHEffectBlock):
+        for block_exit in self._pending_exits():
+            self._set_successor(block_exit, target)
+        self._exits = list()
+        self._current_block = None
+
+    def _open_block(self) -> RHEffectBlock:
+        # Blocks are only created once an operation or a branch needs them
+        if self._current_block is None:
+            block = self._ctx.new_effect_block()
+            self._jump(block)
+            self._current_block = block
+        return self._current_block
+
+    def _head_block(self) -> RHEffectBlock:
+        # The process entry block is never a loop head, so that the entry stays outside of every loop
+        if self._current_block is None or not self._current_block.is_empty or self._current_block is self._entry_block:
+            block = self._ctx.new_effect_block()
+            self._jump(block)
+            self._current_block = block
+        return self._current_block
+
+    def _close_block(self):
+        self._exits = [BlockExit(self._current_block, None)]
+        self._current_block = None
+
+    def _set_successor(self, block_exit: BlockExit, successor: RHEffectBlock):
+        existing = self._block_succs.get(block_exit.block)
+        if block_exit.branch is None and existing is None:
+            self._block_succs[block_exit.block] = BlockUncondSucc(successor=successor)
+        elif block_exit.branch is True and isinstance(existing, BlockCondSucc) and existing.target is None:
+            existing.target = successor
+        elif block_exit.branch is False and isinstance(existing, BlockCondSucc) and existing.alternative is None:
+            existing.alternative = successor
         else:
-            self._block_succs[block] = BlockUncondSucc(successor=successor)
+            raise RHError('Internal error in effect block successor graph encoding')
 
-    def _set_branch(self, block: RHEffectBlock, target: RHEffectBlock, alternative: Optional[RHEffectBlock], condition: RHPredicate):
+    def _set_branch(self, block: RHEffectBlock, condition: RHPredicate):
         if block in self._block_succs:
             raise RHError('Internal error in effect block successor graph encoding')
-        self._block_succs[block] = BlockCondSucc(target=target, alternative=alternative, condition=condition)
+        self._block_succs[block] = BlockCondSucc(target=None, alternative=None, condition=condition)
 
     def _link_blocks(self):
         for block, successor in self._block_succs.items():
             if isinstance(successor, BlockUncondSucc):
                 self._control_flow.add_unconditional_edge(block, successor.successor)
             elif isinstance(successor, BlockCondSucc):
-                if successor.alternative is None:
+                if successor.target is None or successor.alternative is None:
                     raise RHError('Internal error in effect block successor graph encoding')
                 self._control_flow.add_conditional_edge(block, successor.target, successor.alternative, successor.condition)
 
 class RHParser:
     def __init__(self):
+        self._builder = RHModuleBuilder()
         with open(SCRIPT_FILEPATH.parent / 'rh.lark') as grammar_file:
-            self._grammar = lark.Lark(grammar_file.read(), start='module')
+            self._grammar = lark.Lark(grammar_file.read(), start='module', parser='lalr', lexer='contextual', transformer=self._builder)
     
     def parse(self, text: str, context: RHContext) -> RHModule:
-        tree = self._grammar.parse(text)
-        interp = RHInterp(context, RHScope(None))
-        return interp.visit(tree)
+        self._builder.reset(context, RHScope(None))
+        return self._grammar.parse(text)
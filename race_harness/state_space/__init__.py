@@ -0,0 +1,4 @@
+from .index import RHCooccurrenceIndex
+from .ltsmin import STModelChecker
+from .compositional import STCompositionalExplorer
+from .decompose import STCommunicationComponents
\ No newline at end of file
@@ -0,0 +1,137 @@
+import dataclasses
+import itertools
+import concurrent.futures
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from race_harness.stir import STModule, STNodeID
+from race_harness.stir.instruction import st_slot_instruction_from_key
+from race_harness.stir.slice import slice_st_module, max_st_node_id
+from race_harness.state_space.ltsmin import STModelChecker
+
+@dataclasses.dataclass
+class ComponentFootprint:
+    slots: Set[int]
+    writes: Dict[int, Set[Tuple[int, int]]]
+
+@dataclasses.dataclass
+class PairSlice:
+    module: STModule
+    slots: Dict[int, int]
+    observed: Tuple[int, int]
+
+def _explore_slice(checker: STModelChecker, pair_slice: PairSlice) -> List[Tuple[int, int, int, int]]:
+    observed_slot1, observed_slot2 = pair_slice.observed
+    result = list()
+    for slot1, node1, slot2, node2 in checker.explore(pair_slice.module):
+        if slot1 == observed_slot1 and slot2 == observed_slot2:
+            result.append((pair_slice.slots[slot1], node1, pair_slice.slots[slot2], node2))
+        elif slot1 == observed_slot2 and slot2 == observed_slot1:
+            result.append((pair_slice.slots[slot2], node2, pair_slice.slots[slot1], node1))
+    return result
+
+class STCompositionalExplorer:
+    def __init__(self, module: STModule, checker: STModelChecker, *, depth: int = 0, jobs: Optional[int] = None):
+        self._module = module
+        self._checker = checker
+        self._depth = depth
+        self._jobs = jobs
+        self._components = dict()
+        self._neighbours = dict()
+        self._build_footprints()
+
+    @property
+    def components(self) -> Iterable[int]:
+        yield from self._components.keys()
+
+    def neighbours(self, component: int) -> Iterable[int]:
+        yield from self._neighbours[component]
+
+    def slice(self, component1: int, component2: int) -> PairSlice:
+        included = {component1, component2}
+        frontier = set(included)
+        for _ in range(self._depth):
+            frontier = {
+                neighbour
+                for component in frontier
+                for neighbour in self._neighbours[component]
+                if neighbour not in included
+            }
+            included.update(frontier)
+
+        slots = set(included)
+        for component in included:
+            slots.update(self._components[component].slots)
+
+        slice_module, slot_ids = slice_st_module(self._module, slots)
+
+        havoc = dict()
+        for component, footprint in self._components.items():
+            if component in included:
+                continue
+            for slot, writes in footprint.writes.items():
+                if slot in slot_ids:
+                    havoc.setdefault(slot, set()).update(writes)
+        if havoc:
+            environment_node = STNodeID(max_st_node_id(self._module) + 1)
+            environment_slot = slice_module.state.new_node_slot(environment_node)
+            for slot, writes in sorted(havoc.items()):
+                for kind, value in sorted(writes):
+                    havoc_transition = slice_module.new_transition(environment_slot, environment_node, environment_node, False)
+                    havoc_transition.add_instruction(st_slot_instruction_from_key(kind, slot_ids[slot].identifier, value))
+
+        return PairSlice(
+            module=slice_module,
+            slots={
+                slice_slot.identifier: slot
+                for slot, slice_slot in slot_ids.items()
+            },
+            observed=(slot_ids[component1].identifier, slot_ids[component2].identifier)
+        )
+
+    def explore(self) -> Iterable[Tuple[int, int, int, int]]:
+        slices = [
+            self.slice(component1, component2)
+            for component1, component2 in itertools.combinations(sorted(self._components.keys()), 2)
+        ]
+        if self._jobs is not None and self._jobs > 1 and len(slices) > 1:
+            worker_checker = STModelChecker(
+                ltsmin=self._checker.ltsmin,
+                pins_stir=self._checker.pins_stir,
+                quiet=True,
+                numpy_exporter=self._checker.numpy_exporter
+            )
+            with concurrent.futures.ProcessPoolExecutor(max_workers=self._jobs) as executor:
+                results = list(executor.map(_explore_slice, itertools.repeat(worker_checker), slices))
+        else:
+            results = [
+                _explore_slice(self._checker, pair_slice)
+                for pair_slice in slices
+            ]
+
+        yield from sorted(itertools.chain.from_iterable(results))
+
+    def _build_footprints(self):
+        for slot in self._module.state:
+            if slot.as_node():
+                self._components[slot.identifier.identifier] = ComponentFootprint(slots=set(), writes=dict())
+
+        for transition in self._module.transitions:
+            footprint = self._components[transition.node_slot.identifier]
+            for guard in transition.guards:
+                footprint.slots.add(guard.slot_id.identifier)
+            for instr in transition.instructions:
+                if slot_instr := instr.as_slot():
+                    kind, slot, value = slot_instr.key
+                    footprint.slots.add(slot)
+                    footprint.writes.setdefault(slot, set()).add((kind, value))
+
+        users = dict()
+        for component, footprint in self._components.items():
+            for slot in footprint.slots:
+                users.setdefault(slot, set()).add(component)
+        for component, footprint in self._components.items():
+            self._neighbours[component] = sorted({
+                user
+                for slot in footprint.slots
+                for user in users[slot]
+                if user != component
+            })
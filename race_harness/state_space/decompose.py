@@ -0,0 +1,103 @@
+import dataclasses
+import itertools
+from typing import Callable, Dict, Iterable, List, Set, Tuple
+from race_harness.stir import STModule, STNodeID
+from race_harness.stir.slice import slice_st_module, max_st_node_id
+from race_harness.stir.domain import STValueDomains
+from race_harness.stir.translator import RHSTTranslator
+
+@dataclasses.dataclass
+class ComponentSlice:
+    module: STModule
+    slots: Dict[int, int]
+    observer: int
+
+class STCommunicationComponents:
+    def __init__(self, module: STModule, translator: RHSTTranslator):
+        self._module = module
+        self._components = list()
+        self._component_slots = list()
+        self._domains = STValueDomains(module)
+        self._build(translator)
+
+    @property
+    def components(self) -> List[List[int]]:
+        return self._components
+
+    def __len__(self) -> int:
+        return len(self._components)
+
+    def slice(self, index: int) -> ComponentSlice:
+        slice_module, slot_ids = slice_st_module(self._module, self._component_slots[index], self._domains.feasible_transitions)
+        observer_node = STNodeID(max_st_node_id(self._module) + 1)
+        observer_slot = slice_module.state.new_node_slot(observer_node)
+        return ComponentSlice(
+            module=slice_module,
+            slots={
+                slice_slot.identifier: slot
+                for slot, slice_slot in slot_ids.items()
+            },
+            observer=observer_slot.identifier
+        )
+
+    def explore(self, explorer: Callable[[STModule], Iterable[Tuple[int, int, int, int]]]) -> Iterable[Tuple[int, int, int, int]]:
+        cooccurrences = list()
+        reachable = dict()
+        for index in range(len(self._components)):
+            component_slice = self.slice(index)
+            for slot1, node1, slot2, node2 in explorer(component_slice.module):
+                if slot2 == component_slice.observer:
+                    reachable.setdefault(component_slice.slots[slot1], set()).add(node1)
+                elif slot1 == component_slice.observer:
+                    reachable.setdefault(component_slice.slots[slot2], set()).add(node2)
+                else:
+                    cooccurrences.append((component_slice.slots[slot1], node1, component_slice.slots[slot2], node2))
+
+        for component1, component2 in itertools.combinations(self._components, 2):
+            for slot1, slot2 in itertools.product(component1, component2):
+                if slot1 > slot2:
+                    slot1, slot2 = slot2, slot1
+                for node1, node2 in itertools.product(reachable.get(slot1, ()), reachable.get(slot2, ())):
+                    cooccurrences.append((slot1, node1, slot2, node2))
+        yield from sorted(cooccurrences)
+
+    def _build(self, translator: RHSTTranslator):
+        writers = dict()
+        for transition in self._domains.feasible_transitions:
+            for instr in transition.instructions:
+                if slot_instr := instr.as_slot():
+                    writers.setdefault(slot_instr.slot_id.identifier, set()).add(transition.node_slot.identifier)
+
+        parent = {
+            node_slot.identifier: node_slot.identifier
+            for node_slot in translator.node_slots.values()
+        }
+        def find(slot: int) -> int:
+            while parent[slot] != slot:
+                parent[slot] = parent[parent[slot]]
+                slot = parent[slot]
+            return slot
+
+        owned_slots = {
+            node_slot: set()
+            for node_slot in parent.keys()
+        }
+        for (sender_ref, receiver_ref, _), msg_slot in itertools.chain(translator.message_slots.items(), translator.message_mask_slots.items()):
+            sender_slot = translator.node_slots[sender_ref].identifier
+            receiver_slot = translator.node_slots[receiver_ref].identifier
+            owned_slots[receiver_slot].add(msg_slot.identifier)
+            if sender_slot in writers.get(msg_slot.identifier, ()):
+                owned_slots[sender_slot].add(msg_slot.identifier)
+                parent[find(sender_slot)] = find(receiver_slot)
+        for (instance_ref, _, _), elt_slot in translator.set_element_slots.items():
+            owned_slots[translator.node_slots[instance_ref].identifier].add(elt_slot.identifier)
+
+        components = dict()
+        for node_slot in sorted(parent.keys()):
+            components.setdefault(find(node_slot), list()).append(node_slot)
+        for component in components.values():
+            self._components.append(component)
+            slots = set(component)
+            for node_slot in component:
+                slots.update(owned_slots[node_slot])
+            self._component_slots.append(slots)
@@ -0,0 +1,112 @@
+import os
+import pathlib
+import concurrent.futures
+from typing import Iterable, List, Optional, Tuple
+import numpy as np
+from race_harness.stir import STModule
+
+BITSET_MAX_BITS = 1 << 26
+CHUNK_MAX_PAIRS = 1 << 24
+
+class STNodePairEncoding:
+    def __init__(self, module: STModule):
+        self._num_of_slots = len(module.state)
+        self._dtype = np.dtype(f'int{8 * module.state.value_width}')
+        self._node_columns = list()
+        max_node_value = 0
+        for slot in module.state:
+            if node_slot := slot.as_node():
+                self._node_columns.append(node_slot.identifier.identifier)
+                max_node_value = max(max_node_value, node_slot.initial_value.node_id)
+        for transition in module.transitions:
+            max_node_value = max(max_node_value, transition.target_node_id.node_id)
+        self._node_radix = max_node_value + 1
+
+    @property
+    def num_of_slots(self) -> int:
+        return self._num_of_slots
+
+    @property
+    def dtype(self) -> np.dtype:
+        return self._dtype
+
+    @property
+    def node_columns(self) -> List[int]:
+        return self._node_columns
+
+    @property
+    def node_radix(self) -> int:
+        return self._node_radix
+
+    @property
+    def num_of_pairs(self) -> int:
+        return len(self._node_columns) * (len(self._node_columns) - 1) // 2
+
+    @property
+    def num_of_codes(self) -> int:
+        num_of_ids = len(self._node_columns) * self._node_radix
+        return num_of_ids * num_of_ids
+
+    @property
+    def fits_bitset(self) -> bool:
+        return self.num_of_codes <= BITSET_MAX_BITS
+
+    def encode(self, states: np.ndarray) -> Iterable[np.ndarray]:
+        num_of_ids = len(self._node_columns) * self._node_radix
+        node_ids = np.asarray(states[:, self._node_columns], dtype=np.int64) + np.arange(len(self._node_columns), dtype=np.int64) * self._node_radix
+        for j in range(node_ids.shape[1]):
+            for k in range(j + 1, node_ids.shape[1]):
+                yield node_ids[:, j] * num_of_ids + node_ids[:, k]
+
+    def decode(self, codes: np.ndarray) -> Iterable[Tuple[int, int, int, int]]:
+        num_of_ids = len(self._node_columns) * self._node_radix
+        first_ids, second_ids = np.divmod(codes, num_of_ids)
+        first_nodes, first_values = np.divmod(first_ids, self._node_radix)
+        second_nodes, second_values = np.divmod(second_ids, self._node_radix)
+        for first_node, first_value, second_node, second_value in zip(first_nodes.tolist(), first_values.tolist(), second_nodes.tolist(), second_values.tolist()):
+            yield self._node_columns[first_node], first_value, self._node_columns[second_node], second_value
+
+def _chunk_states(state_space_filepath: str, encoding: STNodePairEncoding, begin: int, end: int) -> np.ndarray:
+    states = np.memmap(state_space_filepath, dtype=encoding.dtype, mode='r', shape=(end, encoding.num_of_slots))
+    return states[begin:end]
+
+def _export_chunk(state_space_filepath: str, encoding: STNodePairEncoding, begin: int, end: int) -> np.ndarray:
+    return np.unique(np.concatenate([
+        np.unique(codes)
+        for codes in encoding.encode(_chunk_states(state_space_filepath, encoding, begin, end))
+    ]))
+
+class STStateSpaceExporter:
+    def __init__(self, module: STModule, *, jobs: Optional[int] = None):
+        self._jobs = jobs if jobs is not None else os.cpu_count() or 1
+        self._encoding = STNodePairEncoding(module)
+
+    def export(self, state_space_filepath: pathlib.Path) -> Iterable[Tuple[int, int, int, int]]:
+        num_of_states = os.path.getsize(state_space_filepath) // (self._encoding.dtype.itemsize * self._encoding.num_of_slots)
+        if self._encoding.num_of_pairs == 0 or num_of_states == 0:
+            return
+
+        chunk_size = max(1, CHUNK_MAX_PAIRS // self._encoding.num_of_pairs)
+        chunks = [
+            (str(state_space_filepath), self._encoding, begin, min(begin + chunk_size, num_of_states))
+            for begin in range(0, num_of_states, chunk_size)
+        ]
+
+        if self._jobs > 1 and len(chunks) > 1:
+            with concurrent.futures.ProcessPoolExecutor(max_workers=self._jobs) as executor:
+                codes = self._merge_chunks(executor.map(_export_chunk, *zip(*chunks)))
+        else:
+            codes = self._merge_chunks(_export_chunk(*chunk) for chunk in chunks)
+        yield from self._encoding.decode(codes)
+
+    def _merge_chunks(self, results: Iterable[np.ndarray]) -> np.ndarray:
+        if not self._encoding.fits_bitset:
+            return np.unique(np.concatenate(list(results)))
+
+        # Chunks return their unique codes, only the parent keeps a packed bitset of all codes
+        bitset = np.zeros((self._encoding.num_of_codes + 7) // 8, dtype=np.uint8)
+        for codes in results:
+            np.bitwise_or.at(bitset, codes >> 3, np.left_shift(1, codes & 7).astype(np.uint8))
+        byte_indices = np.flatnonzero(bitset)
+        rows, bits = np.nonzero(np.unpackbits(bitset[byte_indices, np.newaxis], axis=1, bitorder='little'))
+        return byte_indices[rows] * 8 + bits
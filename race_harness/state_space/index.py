@@ -0,0 +1,207 @@
+import io
+import dataclasses
+from typing import Dict, Iterable, List, Optional, Tuple
+from race_harness.error import RHError
+from race_harness.ir import RHContext, RHModule, RHRef
+from race_harness.ir.mutex import RHMutualInclusion
+from race_harness.ir.util import rh_process_reachable_blocks
+from race_harness.stir.translator import STRHMapping
+
+INDEX_HEADER = 'cooccurrence_index 1'
+
+@dataclasses.dataclass
+class IndexedInstance:
+    label: str
+    blocks: List[int]
+    nodes: List[int]
+    block_index: Dict[int, int]
+
+class RHCooccurrenceIndex:
+    def __init__(self):
+        self._instances = list()
+        self._instance_index = dict()
+        self._rows = dict()
+
+    @property
+    def instances(self) -> Iterable[str]:
+        for instance in self._instances:
+            yield instance.label
+
+    def blocks_of(self, instance_label: str) -> Iterable[int]:
+        yield from self._get_instance(instance_label).blocks
+
+    def add_instance(self, label: str, blocks: Iterable[Tuple[int, int]]):
+        if label in self._instance_index:
+            raise RHError(f'Instance {label} is already indexed')
+        blocks = list(blocks)
+        self._instance_index[label] = len(self._instances)
+        self._instances.append(IndexedInstance(
+            label=label,
+            blocks=[block for block, _ in blocks],
+            nodes=[node for _, node in blocks],
+            block_index={
+                block: index
+                for index, (block, _) in enumerate(blocks)
+            }
+        ))
+
+    def add_cooccurrence(self, instance1_label: str, block1: int, instance2_label: str, block2: int):
+        (instance1, row), (instance2, column) = self._order(instance1_label, block1, instance2_label, block2)
+        rows = self._rows.get((instance1, instance2), None)
+        if rows is None:
+            rows = [0] * len(self._instances[instance1].blocks)
+            self._rows[(instance1, instance2)] = rows
+        rows[row] |= 1 << column
+
+    def is_cooccurring(self, instance1_label: str, block1: int, instance2_label: str, block2: int) -> bool:
+        (instance1, row), (instance2, column) = self._order(instance1_label, block1, instance2_label, block2)
+        rows = self._rows.get((instance1, instance2), None)
+        return rows is not None and (rows[row] >> column) & 1 == 1
+
+    def cooccurring_blocks(self, instance1_label: str, block1: int, instance2_label: str) -> Iterable[int]:
+        instance1 = self._instance_index.get(instance1_label, None)
+        instance2 = self._instance_index.get(instance2_label, None)
+        if instance1 is None or instance2 is None:
+            raise RHError(f'Unable to find indexed instance {instance1_label if instance1 is None else instance2_label}')
+        if instance1 == instance2:
+            return
+        position = self._get_block_position(self._instances[instance1], block1)
+        blocks2 = self._instances[instance2].blocks
+        if instance1 < instance2:
+            rows = self._rows.get((instance1, instance2), None)
+            if rows is not None:
+                bitset = rows[position]
+                while bitset:
+                    lowest = bitset & -bitset
+                    yield blocks2[lowest.bit_length() - 1]
+                    bitset ^= lowest
+        else:
+            rows = self._rows.get((instance2, instance1), None)
+            if rows is not None:
+                for row, bitset in enumerate(rows):
+                    if (bitset >> position) & 1:
+                        yield blocks2[row]
+
+    def cooccurring(self, instance_label: str, block: int) -> Iterable[Tuple[str, int]]:
+        for other in self._instances:
+            for other_block in self.cooccurring_blocks(instance_label, block, other.label):
+                yield other.label, other_block
+
+    def populate(self, context: RHContext, module: RHModule, mutinc: RHMutualInclusion):
+        instance_refs = {
+            instance.label: instance.ref
+            for instance in module.instances
+        }
+        def resolve(instance: IndexedInstance, position: int) -> Tuple[RHRef, RHRef]:
+            instance_ref = instance_refs.get(instance.label, None)
+            block = context.get(RHRef(uid=instance.blocks[position], context=context))
+            if instance_ref is None or block is None or block.as_effect_block() is None:
+                raise RHError(f'Co-occurrence index entry {instance.label}@{instance.blocks[position]} does not match the model')
+            return instance_ref, block.ref
+
+        for (instance1, instance2), rows in self._rows.items():
+            indexed1 = self._instances[instance1]
+            indexed2 = self._instances[instance2]
+            for row, bitset in enumerate(rows):
+                while bitset:
+                    lowest = bitset & -bitset
+                    mutinc.add_cooccuring_states(*resolve(indexed1, row), *resolve(indexed2, lowest.bit_length() - 1))
+                    bitset ^= lowest
+
+    def save(self, out: io.TextIOBase):
+        out.write(f'{INDEX_HEADER}\n')
+        out.write(f'instances {len(self._instances)}\n')
+        for instance in self._instances:
+            out.write(f'instance {instance.label} blocks {len(instance.blocks)}\n')
+            for block, node in zip(instance.blocks, instance.nodes):
+                out.write(f'block {block} node {node}\n')
+        out.write(f'pairs {len(self._rows)}\n')
+        for (instance1, instance2), rows in sorted(self._rows.items()):
+            out.write(f'pair {instance1} {instance2}\n')
+            for bitset in rows:
+                out.write(f'{bitset:x}\n')
+
+    @staticmethod
+    def build(module: RHModule, mutinc: RHMutualInclusion, mapping: STRHMapping) -> 'RHCooccurrenceIndex':
+        nodes = {
+            instance_block: node.node_id
+            for node, instance_block in mapping
+        }
+        index = RHCooccurrenceIndex()
+        for instance in module.instances:
+            process = module.find_process_for(instance.protocol.ref)
+            if process is None:
+                raise RHError(f'Unable to find process for instance {instance.ref}')
+            index.add_instance(instance.label, (
+                (block.ref.uid, nodes.get((instance.ref, block.ref), -1))
+                for block in sorted(rh_process_reachable_blocks(process), key=lambda block: block.ref)
+            ))
+
+        labels = {
+            instance.ref: instance.label
+            for instance in module.instances
+        }
+        for (instance1_ref, block1_ref), (instance2_ref, block2_ref) in mutinc:
+            index.add_cooccurrence(labels[instance1_ref], block1_ref.uid, labels[instance2_ref], block2_ref.uid)
+        return index
+
+    @staticmethod
+    def is_index(fp: io.TextIOBase) -> bool:
+        position = fp.tell()
+        header = fp.readline().strip()
+        fp.seek(position)
+        return header == INDEX_HEADER
+
+    @staticmethod
+    def load(fp: io.TextIOBase) -> 'RHCooccurrenceIndex':
+        def expect(prefix: str) -> List[str]:
+            line = fp.readline().split()
+            if not line or line[0] != prefix:
+                raise RHError(f'Malformed co-occurrence index: expected {prefix}')
+            return line[1:]
+
+        if fp.readline().strip() != INDEX_HEADER:
+            raise RHError('Malformed co-occurrence index: unexpected header')
+
+        index = RHCooccurrenceIndex()
+        num_of_instances, = expect('instances')
+        for _ in range(int(num_of_instances)):
+            label, _, num_of_blocks = expect('instance')
+            blocks = list()
+            for _ in range(int(num_of_blocks)):
+                block, _, node = expect('block')
+                blocks.append((int(block), int(node)))
+            index.add_instance(label, blocks)
+
+        num_of_pairs, = expect('pairs')
+        for _ in range(int(num_of_pairs)):
+            instance1, instance2 = expect('pair')
+            instance1, instance2 = int(instance1), int(instance2)
+            index._rows[(instance1, instance2)] = [
+                int(fp.readline(), 16)
+                for _ in range(len(index._instances[instance1].blocks))
+            ]
+        return index
+
+    def _get_instance(self, label: str) -> IndexedInstance:
+        instance = self._instance_index.get(label, None)
+        if instance is None:
+            raise RHError(f'Unable to find indexed instance {label}')
+        return self._instances[instance]
+
+    def _get_block_position(self, instance: IndexedInstance, block: int) -> int:
+        position = instance.block_index.get(block, None)
+        if position is None:
+            raise RHError(f'Unable to find block %{block} of indexed instance {instance.label}')
+        return position
+
+    def _order(self, instance1_label: str, block1: int, instance2_label: str, block2: int) -> Tuple[Tuple[int, int], Tuple[int, int]]:
+        instance1 = self._instance_index.get(instance1_label, None)
+        instance2 = self._instance_index.get(instance2_label, None)
+        if instance1 is None or instance2 is None:
+            raise RHError(f'Unable to find indexed instance {instance1_label if instance1 is None else instance2_label}')
+        if instance1 == instance2:
+            raise RHError(f'Co-occurrence is not indexed within instance {instance1_label}')
+        key1 = (instance1, self._get_block_position(self._instances[instance1], block1))
+        key2 = (instance2, self._get_block_position(self._instances[instance2], block2))
+        return (key1, key2) if instance1 < instance2 else (key2, key1)
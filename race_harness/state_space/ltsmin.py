@@ -0,0 +1,90 @@
+import sys
+import os
+import pathlib
+import tempfile
+import subprocess
+import csv
+from typing import Optional, Iterable, Tuple
+from race_harness.stir import STModule
+from race_harness.stir.serialize import STSerialize
+
+class STModelChecker:
+    def __init__(self, *, ltsmin: pathlib.Path, pins_stir: pathlib.Path, quiet: bool = False, numpy_exporter: bool = False, jobs: Optional[int] = None):
+        self._ltsmin = ltsmin
+        self._pins_stir = pins_stir
+        self._quiet = quiet
+        self._numpy_exporter = numpy_exporter
+        self._jobs = jobs
+
+    @property
+    def ltsmin(self) -> pathlib.Path:
+        return self._ltsmin
+
+    @property
+    def pins_stir(self) -> pathlib.Path:
+        return self._pins_stir
+
+    @property
+    def quiet(self) -> bool:
+        return self._quiet
+
+    @property
+    def numpy_exporter(self) -> bool:
+        return self._numpy_exporter
+
+    @property
+    def jobs(self) -> Optional[int]:
+        return self._jobs
+
+    def explore(self, st_module: STModule) -> Iterable[Tuple[int, int, int, int]]:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            stir_filepath = pathlib.Path(tmpdir) / 'module.stir'
+            state_space_bin_filepath = pathlib.Path(tmpdir) / 'state_space.bin'
+            with open(stir_filepath, 'w') as stir_file:
+                serializer = STSerialize(stir_file)
+                serializer.serialize_module(st_module)
+
+            pins2lts_seq_filepath = str((self._ltsmin / 'bin/pins2lts-seq').resolve())
+            libpins_stir_filepath = str((self._pins_stir / 'libpins-stir.so').resolve())
+            stir_bin_export_filepath = str((self._pins_stir / 'stir-bin-export').resolve())
+            pins2lts_seq_proc = subprocess.Popen(
+                args=[
+                    pins2lts_seq_filepath,
+                    libpins_stir_filepath
+                ],
+                executable=pins2lts_seq_filepath,
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.DEVNULL if self._quiet else sys.stderr,
+                stderr=subprocess.DEVNULL if self._quiet else sys.stderr,
+                shell=False,
+                env={
+                    **os.environ,
+                    'PINS_STIR_MODEL': str(stir_filepath),
+                    'PINS_STIR_OUTPUT': str(state_space_bin_filepath)
+                }
+            )
+            pins2lts_seq_proc.wait()
+
+            if self._numpy_exporter:
+                from race_harness.state_space.export import STStateSpaceExporter
+                exporter = STStateSpaceExporter(st_module, jobs=self._jobs)
+                yield from exporter.export(state_space_bin_filepath)
+                return
+
+            stir_bin_export = subprocess.Popen(
+                args=[
+                    stir_bin_export_filepath,
+                    str(stir_filepath),
+                    str(state_space_bin_filepath)
+                ],
+                executable=stir_bin_export_filepath,
+                stdout=subprocess.PIPE,
+                shell=False
+            )
+            output = b''
+            for buf in stir_bin_export.stdout:
+                output += buf
+            stir_bin_export.wait()
+
+            for line in csv.reader(output.decode().splitlines()):
+                yield tuple(int(value) for value in line)
@@ -0,0 +1,199 @@
+import time
+import dataclasses
+from typing import Iterable, List, Optional, Tuple
+import numpy as np
+from race_harness.stir import STModule
+from race_harness.stir.module import INSTR_EXTERNAL_ACTION, INSTR_SET_INT, INSTR_SET_BIT, GUARD_INT, GUARD_BIT, GUARD_INT_SET
+from race_harness.stir.transform import expand_st_module_alternatives
+from race_harness.state_space.export import STNodePairEncoding
+
+@dataclasses.dataclass
+class SaturationSample:
+    elapsed: float
+    steps: int
+    num_of_pairs: int
+    new_pairs_per_second: float
+
+class STRandomSimulator:
+    def __init__(self, module: STModule, *, walkers: int = 1024, max_depth: Optional[int] = None, seed: Optional[int] = None):
+        self._walkers = walkers
+        self._max_depth = max_depth
+        self._rng = np.random.default_rng(seed)
+        self._encoding = STNodePairEncoding(module)
+        self._saturation = list()
+
+        self._initial_state = np.zeros(len(module.state), dtype=np.int32)
+        for slot in module.state:
+            if int_slot := slot.as_int():
+                self._initial_state[int_slot.identifier.identifier] = int_slot.initial_value
+            elif node_slot := slot.as_node():
+                self._initial_state[node_slot.identifier.identifier] = node_slot.initial_value.node_id
+
+        columns = expand_st_module_alternatives(module).columns()
+        component = np.frombuffer(columns.node_slot, dtype=np.int32).astype(np.intp)
+        source = np.frombuffer(columns.source_node, dtype=np.int32)
+        # Transitions are ordered by component and source node, so the candidates leaving a node are contiguous
+        order = np.lexsort((source, component))
+        self._component = component[order]
+        self._source = source[order]
+        self._target = np.frombuffer(columns.target_node, dtype=np.int32)[order]
+        self._invert = np.frombuffer(columns.invert_guard, dtype=np.int8).astype(np.bool_)[order]
+
+        self._components, first, component_index = np.unique(self._component, return_index=True, return_inverse=True)
+        last = np.append(first[1:], len(self._component)) - 1
+        self._node_low = self._source[first].astype(np.int64)
+        self._node_span = self._source[last] - self._node_low + 1
+        self._node_base = np.cumsum(self._node_span) - self._node_span
+        keys = self._node_base[component_index] + self._source - self._node_low[component_index]
+        self._candidate_start = np.zeros(int(self._node_span.sum()), dtype=np.int64)
+        self._candidate_count = np.zeros(int(self._node_span.sum()), dtype=np.int64)
+        unique_keys, candidate_start, candidate_count = np.unique(keys, return_index=True, return_counts=True)
+        self._candidate_start[unique_keys] = candidate_start
+        self._candidate_count[unique_keys] = candidate_count
+
+        guard_offsets = np.frombuffer(columns.guard_offsets, dtype=np.int64)
+        self._guard_start = guard_offsets[:-1][order]
+        self._guard_count = np.diff(guard_offsets)[order]
+        self._guard_kind = np.frombuffer(columns.guard_kind, dtype=np.int8)
+        self._guard_slot = np.frombuffer(columns.guard_slot, dtype=np.int32).astype(np.intp)
+        self._guard_value = np.frombuffer(columns.guard_value, dtype=np.int64)
+        self._value_sets = [np.array(values, dtype=np.int64) for values in columns.value_sets]
+
+        instr_offsets = np.frombuffer(columns.instr_offsets, dtype=np.int64)
+        instr_kind = np.frombuffer(columns.instr_kind, dtype=np.int8)
+        selected = instr_kind != INSTR_EXTERNAL_ACTION
+        owners = np.repeat(np.arange(len(instr_offsets) - 1), np.diff(instr_offsets))[selected]
+        instr_count = np.bincount(owners, minlength=len(instr_offsets) - 1)
+        self._instr_start = (np.cumsum(instr_count) - instr_count)[order]
+        self._instr_count = instr_count[order]
+        self._instr_kind = instr_kind[selected]
+        self._instr_slot = np.frombuffer(columns.instr_slot, dtype=np.int32).astype(np.intp)[selected]
+        self._instr_value = np.frombuffer(columns.instr_value, dtype=np.int64)[selected]
+
+    @staticmethod
+    def _ranges(starts: np.ndarray, counts: np.ndarray) -> np.ndarray:
+        offsets = np.cumsum(counts) - counts
+        return np.repeat(starts - offsets, counts) + np.arange(int(offsets[-1] + counts[-1]) if len(counts) else 0)
+
+    @property
+    def saturation(self) -> List[SaturationSample]:
+        return self._saturation
+
+    def simulate(self, *, time_budget: Optional[float] = None, step_budget: Optional[int] = None, report_interval: float = 1.0) -> Iterable[Tuple[int, int, int, int]]:
+        self._saturation = list()
+        if self._encoding.num_of_pairs == 0:
+            return
+
+        if self._encoding.fits_bitset:
+            bitset = np.zeros(self._encoding.num_of_codes, dtype=np.bool_)
+            def record(states: np.ndarray):
+                for codes in self._encoding.encode(states):
+                    bitset[codes] = True
+            def count() -> int:
+                return int(np.count_nonzero(bitset))
+        else:
+            observed = set()
+            def record(states: np.ndarray):
+                for codes in self._encoding.encode(states):
+                    observed.update(np.unique(codes).tolist())
+            def count() -> int:
+                return len(observed)
+
+        states = np.tile(self._initial_state, (self._walkers, 1))
+        depth = np.zeros(self._walkers, dtype=np.int64)
+        record(states)
+
+        start = time.monotonic()
+        last_report, last_count = start, count()
+        steps = 0
+        while (step_budget is None or steps < step_budget) and (time_budget is None or time.monotonic() - start < time_budget):
+            walkers, chosen = self._choose(states)
+            self._fire(states, walkers, chosen)
+            depth += 1
+            steps += 1
+
+            restart = np.ones(self._walkers, dtype=np.bool_)
+            restart[walkers] = False
+            if self._max_depth is not None:
+                restart |= depth >= self._max_depth
+            states[restart] = self._initial_state
+            depth[restart] = 0
+            record(states)
+
+            now = time.monotonic()
+            if now - last_report >= report_interval:
+                current_count = count()
+                self._saturation.append(SaturationSample(
+                    elapsed=now - start,
+                    steps=steps,
+                    num_of_pairs=current_count,
+                    new_pairs_per_second=(current_count - last_count) / (now - last_report)
+                ))
+                last_report, last_count = now, current_count
+
+        now = time.monotonic()
+        current_count = count()
+        self._saturation.append(SaturationSample(
+            elapsed=now - start,
+            steps=steps,
+            num_of_pairs=current_count,
+            new_pairs_per_second=(current_count - last_count) / max(now - last_report, 1e-9)
+        ))
+
+        if self._encoding.fits_bitset:
+            codes = np.flatnonzero(bitset)
+        else:
+            codes = np.array(sorted(observed), dtype=np.int64)
+        yield from self._encoding.decode(codes)
+
+    def _choose(self, states: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        # Candidates are the transitions leaving each walker's current nodes; one enabled candidate is picked
+        # uniformly at random per walker
+        local = states[:, self._components] - self._node_low
+        known = (local >= 0) & (local < self._node_span)
+        keys = np.where(known, self._node_base + local, 0).ravel()
+        counts = np.where(known.ravel(), self._candidate_count[keys], 0)
+        candidates = self._ranges(self._candidate_start[keys], counts)
+        candidate_walkers = np.repeat(np.arange(self._walkers), len(self._components))
+        candidate_walkers = np.repeat(candidate_walkers, counts)
+
+        guard_counts = self._guard_count[candidates]
+        guards = self._ranges(self._guard_start[candidates], guard_counts)
+        values = states[np.repeat(candidate_walkers, guard_counts), self._guard_slot[guards]]
+        kinds, guard_values = self._guard_kind[guards], self._guard_value[guards]
+        held = np.where(
+            kinds == GUARD_INT,
+            values == guard_values,
+            np.where(kinds == GUARD_BIT, (values >> np.where(kinds == GUARD_BIT, guard_values, 0)) & 1 == 1, values == 0)
+        )
+        int_sets = kinds == GUARD_INT_SET
+        for value_set in np.unique(guard_values[int_sets]):
+            members = int_sets & (guard_values == value_set)
+            held[members] = np.isin(values[members], self._value_sets[value_set])
+
+        satisfied = np.ones(len(candidates), dtype=np.bool_)
+        guarded = guard_counts > 0
+        if len(guards):
+            satisfied[guarded] = np.logical_and.reduceat(held, (np.cumsum(guard_counts) - guard_counts)[guarded])
+        enabled = satisfied != self._invert[candidates]
+
+        num_of_enabled = np.bincount(candidate_walkers[enabled], minlength=self._walkers)
+        picks = np.floor(self._rng.random(self._walkers) * num_of_enabled).astype(np.int64)
+        ranks = np.cumsum(enabled) - 1 - (np.cumsum(num_of_enabled) - num_of_enabled)[candidate_walkers]
+        selected = enabled & (ranks == picks[candidate_walkers])
+        return candidate_walkers[selected], candidates[selected]
+
+    def _fire(self, states: np.ndarray, walkers: np.ndarray, chosen: np.ndarray):
+        states[walkers, self._component[chosen]] = self._target[chosen]
+        instr_counts = self._instr_count[chosen]
+        for position in range(int(instr_counts.max(initial=0))):
+            mask = instr_counts > position
+            targets, instrs = walkers[mask], self._instr_start[chosen[mask]] + position
+            slots, kinds, values = self._instr_slot[instrs], self._instr_kind[instrs], self._instr_value[instrs]
+            current = states[targets, slots]
+            bits = np.left_shift(1, np.where(kinds == INSTR_SET_INT, 0, values), dtype=np.int32)
+            states[targets, slots] = np.where(
+                kinds == INSTR_SET_INT,
+                values,
+                np.where(kinds == INSTR_SET_BIT, current | bits, current & ~bits)
+            )
@@ -1,6 +1,6 @@
 from .state import STSlotID, STSlot, STIntSlot, STState
-from .guard import STGuardCondition, STIntGuardCondition
-from .instruction import STInstruction, STExternalActionInstruction, STSetIntInstruction
+from .guard import STGuardCondition, STIntGuardCondition, STBitGuardCondition, STMaskZeroGuardCondition, STIntSetGuardCondition
+from .instruction import STInstruction, STExternalActionInstruction, STSlotInstruction, STSetIntInstruction, STSetBitInstruction, STClearBitInstruction
 from .node import STNodeID
-from .transition import STTransitionID, STTransition
+from .transition import STTransitionID, STTransition, STTransitionAlternative
 from .module import STModule
\ No newline at end of file
@@ -1,104 +1,35 @@
-import copy
-from race_harness.stir.transition import STTransition
-from race_harness.stir.module import STModule
+from typing import Tuple
+from race_harness.stir.module import STModule, STTransitionColumns, GUARD_INT_SET
 
-class STTransitionHandle:
-    def __init__(self, transition: STTransition):
-        self._transition = transition
+STTransitionKey = Tuple[int, int, int, int, int, Tuple[Tuple[int, int, object, int], ...], Tuple[Tuple[int, int, int, int], ...]]
 
-    @property
-    def transition(self) -> STTransition:
-        return self._transition
-    
-    def __hash__(self):
-        res = 31 * hash(self.transition.node_slot) + \
-            29 * hash(self.transition.source_node_id) + \
-            23 * hash(self.transition.target_node_id) + \
-            17 * hash(self.transition.invert_guard)
-        for guard in self.transition.guards:
-            if int_guard := guard.as_int():
-                res = res * 13 + 7 * hash(int_guard.slot_id) + 3 * hash(int_guard.value)
-        for instr in self.transition.instructions:
-            if ext_act := instr.as_external_action():
-                res = 13 * res + 7 * hash(ext_act.action)
-            elif set_int := instr.as_set_int():
-                res = 13 * res + 7 * hash(set_int.slot_id) + 3 * hash(set_int.value)
+def st_transition_key(columns: STTransitionColumns, index: int) -> STTransitionKey:
+    guard_start, guard_end = columns.guard_offsets[index], columns.guard_offsets[index + 1]
+    instr_start, instr_end = columns.instr_offsets[index], columns.instr_offsets[index + 1]
+    # Guards form a conjunction, instructions are order-sensitive
+    return (
+        columns.node_slot[index],
+        columns.source_node[index],
+        columns.target_node[index],
+        columns.invert_guard[index],
+        columns.alternatives[index],
+        tuple(sorted(set(
+            (kind, slot, columns.value_sets[value] if kind == GUARD_INT_SET else value, alternative)
+            for kind, slot, value, alternative in zip(columns.guard_kind[guard_start:guard_end], columns.guard_slot[guard_start:guard_end], columns.guard_value[guard_start:guard_end], columns.guard_alternative[guard_start:guard_end])
+        ))),
+        tuple(zip(columns.instr_kind[instr_start:instr_end], columns.instr_slot[instr_start:instr_end], columns.instr_value[instr_start:instr_end], columns.instr_alternative[instr_start:instr_end]))
+    )
 
-        return res
-    
-    def __eq__(self, value):
-        if not isinstance(value, STTransitionHandle):
-            return False
-        
-        if self.transition.node_slot != value.transition.node_slot:
-            return False
-        
-        if self.transition.source_node_id != value.transition.source_node_id:
-            return False
-        
-        if self.transition.target_node_id != value.transition.target_node_id:
-            return False
-        
-        if self.transition.invert_guard != value.transition.invert_guard:
-            return False
-        
-        def match_guards(tr1: STTransition, tr2: STTransition):
-            for guard in tr1.guards:
-                found = False
-                for guard2 in tr2.guards:
-                    if guard.as_int() and guard2.as_int() and \
-                        guard.as_int().slot_id == guard2.as_int().slot_id and \
-                        guard.as_int().value == guard2.as_int().value:
-                        found = True
-                        break
-                if not found:
-                    return False
-            return True
-        
-        def match_instr(tr1: STTransition, tr2: STTransition):
-            for instr in tr1.instructions:
-                found = False
-                for instr2 in tr2.instructions:
-                    if instr.as_external_action() and instr2.as_external_action() and \
-                        instr.as_external_action().action == instr2.as_external_action().action:
-                        found = True
-                        break
-                    elif instr.as_set_int() and instr2.as_set_int() and \
-                        instr.as_set_int().slot_id == instr2.as_set_int().slot_id and \
-                        instr.as_set_int().value == instr2.as_set_int().value:
-                        found = True
-                        break
-                if not found:
-                    return False
-            return True
-        
-        if not match_guards(value.transition, self.transition) or \
-            not match_guards(self.transition, value.transition) or \
-            not match_instr(value.transition, self.transition) or \
-            not match_instr(self.transition, value.transition):
-            return False
-        
-        return True
-        
+def compact_st_module(module: STModule) -> STModule:
+    compacted_module = module.derive()
+    columns = module.columns()
 
-def compact_st_module(module: STModule):
-    comapcted_module = copy.deepcopy(module)
-    comapcted_module._transitions.clear()
-
-    index = dict()
-    for transition in module.transitions:
-        handle = STTransitionHandle(transition)
-        if handle not in index:
-            index[handle] = transition.identifier
-
-            copy_trans = comapcted_module.new_transition(
-                transition.node_slot,
-                transition.source_node_id,
-                transition.target_node_id,
-                transition.invert_guard
-            )
-            for guard in transition.guards:
-                copy_trans.add_guard(copy.deepcopy(guard))
-            for instr in transition.instructions:
-                copy_trans.add_instruction(copy.deepcopy(instr))
-    return comapcted_module
\ No newline at end of file
+    index = set()
+    unique = list()
+    for transition_index in range(len(columns)):
+        key = st_transition_key(columns, transition_index)
+        if key not in index:
+            index.add(key)
+            unique.append(transition_index)
+    compacted_module.copy_transitions(columns, unique)
+    return compacted_module
@@ -0,0 +1,116 @@
+from typing import Dict, Iterable, Optional, Set, Tuple
+from race_harness.stir.module import STModule
+from race_harness.stir.transition import STTransition
+
+class STValueDomains:
+    def __init__(self, module: STModule):
+        self._module = module
+        self._values = dict()
+        self._set_bits = dict()
+        self._cleared_bits = dict()
+        self._feasible = set()
+        self._build()
+
+    def values(self, slot: int) -> Set[int]:
+        return self._values[slot]
+
+    def is_bitwise(self, slot: int) -> bool:
+        return slot in self._set_bits or slot in self._cleared_bits
+
+    def constant(self, slot: int) -> Optional[int]:
+        if self.is_bitwise(slot) or len(self._values[slot]) != 1:
+            return None
+        return next(iter(self._values[slot]))
+
+    def value_range(self, slot: int) -> Tuple[int, int]:
+        values = self._values[slot]
+        if not self.is_bitwise(slot):
+            return min(values), max(values)
+        if min(values) < 0:
+            return -(1 << 31), (1 << 31) - 1
+        mask = 0
+        for value in values:
+            mask |= value
+        for bit in self._set_bits.get(slot, ()):
+            mask |= 1 << bit
+        return 0, mask
+
+    def is_feasible(self, transition: STTransition) -> bool:
+        return transition.identifier in self._feasible
+
+    @property
+    def feasible_transitions(self) -> Iterable[STTransition]:
+        for transition in self._module.transitions:
+            if transition.identifier in self._feasible:
+                yield transition
+
+    def _build(self):
+        for slot in self._module.state:
+            if int_slot := slot.as_int():
+                self._values[slot.identifier.identifier] = {int_slot.initial_value}
+            elif node_slot := slot.as_node():
+                self._values[slot.identifier.identifier] = {node_slot.initial_value.node_id}
+
+        pending = list(self._module.transitions)
+        changed = True
+        while changed:
+            changed = False
+            remaining = list()
+            for transition in pending:
+                if not self._may_fire(transition):
+                    remaining.append(transition)
+                    continue
+                self._feasible.add(transition.identifier)
+                changed = True
+                self._values[transition.node_slot.identifier].add(transition.target_node_id.node_id)
+                for instr in transition.instructions:
+                    if set_int := instr.as_set_int():
+                        self._values[set_int.slot_id.identifier].add(set_int.value)
+                    elif set_bit := instr.as_set_bit():
+                        self._set_bits.setdefault(set_bit.slot_id.identifier, set()).add(set_bit.bit)
+                    elif clear_bit := instr.as_clear_bit():
+                        self._cleared_bits.setdefault(clear_bit.slot_id.identifier, set()).add(clear_bit.bit)
+            pending = remaining
+
+    def _may_hold_bit(self, slot: int, bit: int) -> bool:
+        return bit in self._set_bits.get(slot, ()) or any((value >> bit) & 1 for value in self._values[slot])
+
+    def _may_be_zero(self, slot: int) -> bool:
+        cleared = self._cleared_bits.get(slot, set())
+        return any(
+            value < 0 or all(not (value >> bit) & 1 or bit in cleared for bit in range(value.bit_length()))
+            for value in self._values[slot]
+        )
+
+    def _may_fire(self, transition: STTransition) -> bool:
+        if transition.source_node_id.node_id not in self._values[transition.node_slot.identifier]:
+            return False
+        if transition.invert_guard:
+            return True
+        return any(
+            self._may_hold(alternative.guards)
+            for alternative in transition.alternatives
+        )
+
+    def _may_hold(self, guards) -> bool:
+        for guard in guards:
+            slot = guard.slot_id.identifier
+            if int_guard := guard.as_int():
+                if not self.is_bitwise(slot) and int_guard.value not in self._values[slot]:
+                    return False
+            elif int_set_guard := guard.as_int_set():
+                if not self.is_bitwise(slot) and not any(value in self._values[slot] for value in int_set_guard.values):
+                    return False
+            elif bit_guard := guard.as_bit():
+                if not self._may_hold_bit(slot, bit_guard.bit):
+                    return False
+            elif guard.as_mask_zero():
+                if not self._may_be_zero(slot):
+                    return False
+        return True
+
+def infer_st_value_ranges(module: STModule):
+    domains = STValueDomains(module)
+    for slot in module.state:
+        lower, upper = domains.value_range(slot.identifier.identifier)
+        module.state.set_value_range(slot.identifier, lower, upper)
@@ -1,16 +1,49 @@
 import abc
+from typing import Iterable, Tuple
 from race_harness.stir.state import STSlotID
 from race_harness.util.coerce import with_coercion_methods
 
+GUARD_INT = 0
+GUARD_BIT = 1
+GUARD_MASK_ZERO = 2
+GUARD_INT_SET = 3
+
 @with_coercion_methods
 class STGuardCondition(abc.ABC):
+    __slots__ = ()
+
     def __init__(self):
         super().__init__()
-    
+
     def as_int(self) -> 'STIntGuardCondition':
         return None
 
+    def as_bit(self) -> 'STBitGuardCondition':
+        return None
+
+    def as_mask_zero(self) -> 'STMaskZeroGuardCondition':
+        return None
+
+    def as_int_set(self) -> 'STIntSetGuardCondition':
+        return None
+
+    @property
+    @abc.abstractmethod
+    def slot_id(self) -> STSlotID: pass
+
+    @property
+    @abc.abstractmethod
+    def key(self) -> Tuple[int, int, object]: pass
+
+    @abc.abstractmethod
+    def holds(self, value: int) -> bool: pass
+
+    @abc.abstractmethod
+    def with_slot(self, slot_id: STSlotID) -> 'STGuardCondition': pass
+
 class STIntGuardCondition(STGuardCondition):
+    __slots__ = ('_slot_id', '_value')
+
     def __init__(self, slot_id: STSlotID, value: int):
         super().__init__()
         self._slot_id = slot_id
@@ -18,14 +51,125 @@ class STIntGuardCondition(STGuardCondition):
 
     def as_int(self):
         return self
-    
+
     @property
     def slot_id(self) -> STSlotID:
         return self._slot_id
-    
+
     @property
     def value(self) -> int:
         return self._value
-    
+
+    @property
+    def key(self) -> Tuple[int, int, int]:
+        return (GUARD_INT, self.slot_id.identifier, self.value)
+
+    def holds(self, value: int) -> bool:
+        return value == self.value
+
+    def with_slot(self, slot_id: STSlotID) -> 'STIntGuardCondition':
+        return STIntGuardCondition(slot_id, self.value)
+
     def __str__(self):
         return f'int {self.slot_id} {self.value}'
+
+class STBitGuardCondition(STGuardCondition):
+    __slots__ = ('_slot_id', '_bit')
+
+    def __init__(self, slot_id: STSlotID, bit: int):
+        super().__init__()
+        self._slot_id = slot_id
+        self._bit = bit
+
+    def as_bit(self):
+        return self
+
+    @property
+    def slot_id(self) -> STSlotID:
+        return self._slot_id
+
+    @property
+    def bit(self) -> int:
+        return self._bit
+
+    @property
+    def key(self) -> Tuple[int, int, int]:
+        return (GUARD_BIT, self.slot_id.identifier, self.bit)
+
+    def holds(self, value: int) -> bool:
+        return (value >> self.bit) & 1 == 1
+
+    def with_slot(self, slot_id: STSlotID) -> 'STBitGuardCondition':
+        return STBitGuardCondition(slot_id, self.bit)
+
+    def __str__(self):
+        return f'bit {self.slot_id} {self.bit}'
+
+class STMaskZeroGuardCondition(STGuardCondition):
+    __slots__ = ('_slot_id',)
+
+    def __init__(self, slot_id: STSlotID):
+        super().__init__()
+        self._slot_id = slot_id
+
+    def as_mask_zero(self):
+        return self
+
+    @property
+    def slot_id(self) -> STSlotID:
+        return self._slot_id
+
+    @property
+    def key(self) -> Tuple[int, int, int]:
+        return (GUARD_MASK_ZERO, self.slot_id.identifier, 0)
+
+    def holds(self, value: int) -> bool:
+        return value == 0
+
+    def with_slot(self, slot_id: STSlotID) -> 'STMaskZeroGuardCondition':
+        return STMaskZeroGuardCondition(slot_id)
+
+    def __str__(self):
+        return f'zero {self.slot_id}'
+
+class STIntSetGuardCondition(STGuardCondition):
+    __slots__ = ('_slot_id', '_values')
+
+    def __init__(self, slot_id: STSlotID, values: Iterable[int]):
+        super().__init__()
+        self._slot_id = slot_id
+        self._values = tuple(sorted(set(values)))
+
+    def as_int_set(self):
+        return self
+
+    @property
+    def slot_id(self) -> STSlotID:
+        return self._slot_id
+
+    @property
+    def values(self) -> Tuple[int, ...]:
+        return self._values
+
+    @property
+    def key(self) -> Tuple[int, int, Tuple[int, ...]]:
+        return (GUARD_INT_SET, self.slot_id.identifier, self.values)
+
+    def holds(self, value: int) -> bool:
+        return value in self.values
+
+    def with_slot(self, slot_id: STSlotID) -> 'STIntSetGuardCondition':
+        return STIntSetGuardCondition(slot_id, self.values)
+
+    def __str__(self):
+        return 'in {} {{{}}}'.format(self.slot_id, ', '.join(str(value) for value in self.values))
+
+def st_guard_from_key(kind: int, slot: int, value) -> STGuardCondition:
+    if kind == GUARD_INT:
+        return STIntGuardCondition(STSlotID(slot), value)
+    elif kind == GUARD_BIT:
+        return STBitGuardCondition(STSlotID(slot), value)
+    elif kind == GUARD_INT_SET:
+        return STIntSetGuardCondition(STSlotID(slot), value)
+    else:
+        return STMaskZeroGuardCondition(STSlotID(slot))
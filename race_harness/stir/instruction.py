@@ -1,19 +1,38 @@
 import abc
+from typing import Tuple
 from race_harness.util.coerce import with_coercion_methods
 from race_harness.stir.state import STSlotID
 
+INSTR_EXTERNAL_ACTION = 0
+INSTR_SET_INT = 1
+INSTR_SET_BIT = 2
+INSTR_CLEAR_BIT = 3
+
 @with_coercion_methods
 class STInstruction(abc.ABC):
+    __slots__ = ()
+
     def __init__(self):
         super().__init__()
 
     def as_external_action(self) -> 'STExternalActionInstruction':
         return None
-    
+
+    def as_slot(self) -> 'STSlotInstruction':
+        return None
+
     def as_set_int(self) -> 'STSetIntInstruction':
         return None
 
+    def as_set_bit(self) -> 'STSetBitInstruction':
+        return None
+
+    def as_clear_bit(self) -> 'STClearBitInstruction':
+        return None
+
 class STExternalActionInstruction(STInstruction):
+    __slots__ = ('_action',)
+
     def __init__(self, action: str):
         super().__init__()
         self._action = action
@@ -24,11 +43,33 @@ class STExternalActionInstruction(STInstruction):
     @property
     def action(self) -> str:
         return self._action
-    
+
     def __str__(self):
         return f'do {self.action}'
-    
-class STSetIntInstruction(STInstruction):
+
+class STSlotInstruction(STInstruction):
+    __slots__ = ()
+
+    def as_slot(self):
+        return self
+
+    @property
+    @abc.abstractmethod
+    def slot_id(self) -> STSlotID: pass
+
+    @property
+    @abc.abstractmethod
+    def key(self) -> Tuple[int, int, int]: pass
+
+    @abc.abstractmethod
+    def apply(self, value: int) -> int: pass
+
+    @abc.abstractmethod
+    def with_slot(self, slot_id: STSlotID) -> 'STSlotInstruction': pass
+
+class STSetIntInstruction(STSlotInstruction):
+    __slots__ = ('_slot_id', '_value')
+
     def __init__(self, slot_id: STSlotID, value: int):
         super().__init__()
         self._slot_id = slot_id
@@ -40,12 +81,92 @@ class STSetIntInstruction(STInstruction):
     @property
     def slot_id(self) -> STSlotID:
         return self._slot_id
-    
+
     @property
     def value(self) -> int:
         return self._value
-    
+
+    @property
+    def key(self) -> Tuple[int, int, int]:
+        return (INSTR_SET_INT, self.slot_id.identifier, self.value)
+
+    def apply(self, value: int) -> int:
+        return self.value
+
+    def with_slot(self, slot_id: STSlotID) -> 'STSetIntInstruction':
+        return STSetIntInstruction(slot_id, self.value)
+
     def __str__(self):
         return f'setint {self.slot_id} {self.value}'
 
-    
+class STSetBitInstruction(STSlotInstruction):
+    __slots__ = ('_slot_id', '_bit')
+
+    def __init__(self, slot_id: STSlotID, bit: int):
+        super().__init__()
+        self._slot_id = slot_id
+        self._bit = bit
+
+    def as_set_bit(self):
+        return self
+
+    @property
+    def slot_id(self) -> STSlotID:
+        return self._slot_id
+
+    @property
+    def bit(self) -> int:
+        return self._bit
+
+    @property
+    def key(self) -> Tuple[int, int, int]:
+        return (INSTR_SET_BIT, self.slot_id.identifier, self.bit)
+
+    def apply(self, value: int) -> int:
+        return value | (1 << self.bit)
+
+    def with_slot(self, slot_id: STSlotID) -> 'STSetBitInstruction':
+        return STSetBitInstruction(slot_id, self.bit)
+
+    def __str__(self):
+        return f'setbit {self.slot_id} {self.bit}'
+
+class STClearBitInstruction(STSlotInstruction):
+    __slots__ = ('_slot_id', '_bit')
+
+    def __init__(self, slot_id: STSlotID, bit: int):
+        super().__init__()
+        self._slot_id = slot_id
+        self._bit = bit
+
+    def as_clear_bit(self):
+        return self
+
+    @property
+    def slot_id(self) -> STSlotID:
+        return self._slot_id
+
+    @property
+    def bit(self) -> int:
+        return self._bit
+
+    @property
+    def key(self) -> Tuple[int, int, int]:
+        return (INSTR_CLEAR_BIT, self.slot_id.identifier, self.bit)
+
+    def apply(self, value: int) -> int:
+        return value & ~(1 << self.bit)
+
+    def with_slot(self, slot_id: STSlotID) -> 'STClearBitInstruction':
+        return STClearBitInstruction(slot_id, self.bit)
+
+    def __str__(self):
+        return f'clearbit {self.slot_id} {self.bit}'
+
+def st_slot_instruction_from_key(kind: int, slot: int, value: int) -> STSlotInstruction:
+    if kind == INSTR_SET_INT:
+        return STSetIntInstruction(STSlotID(slot), value)
+    elif kind == INSTR_SET_BIT:
+        return STSetBitInstruction(STSlotID(slot), value)
+    else:
+        return STClearBitInstruction(STSlotID(slot), value)
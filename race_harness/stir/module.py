@@ -1,57 +1,328 @@
 import io
-from typing import Iterable, Optional
+import array
+import dataclasses
+from typing import Iterable, List, Optional, Tuple
 from race_harness.stir.state import STState, STSlotID
 from race_harness.stir.node import STNodeID
-from race_harness.stir.transition import STTransition, STTransitionID
+from race_harness.stir.guard import STGuardCondition, GUARD_INT, GUARD_BIT, GUARD_MASK_ZERO, GUARD_INT_SET, st_guard_from_key
+from race_harness.stir.instruction import STInstruction, STExternalActionInstruction, INSTR_EXTERNAL_ACTION, INSTR_SET_INT, INSTR_SET_BIT, INSTR_CLEAR_BIT, st_slot_instruction_from_key
+from race_harness.stir.transition import STTransition, STTransitionID, STTransitionAlternative
 from race_harness.error import RHError
 
+@dataclasses.dataclass(frozen=True)
+class STTransitionColumns:
+    identifier: array.array
+    node_slot: array.array
+    source_node: array.array
+    target_node: array.array
+    invert_guard: array.array
+    alternatives: array.array
+    guard_offsets: array.array
+    guard_kind: array.array
+    guard_slot: array.array
+    guard_value: array.array
+    guard_alternative: array.array
+    instr_offsets: array.array
+    instr_kind: array.array
+    instr_slot: array.array
+    instr_value: array.array
+    instr_alternative: array.array
+    actions: List[str]
+    value_sets: List[Tuple[int, ...]]
+
+    def __len__(self) -> int:
+        return len(self.identifier)
+
 class STModule:
     def __init__(self):
-        self._nodes = set()
-        self._transitions = dict()
+        self._num_of_nodes = 0
         self._state = STState()
+        self._num_of_transitions = 0
+        self._transition_node_slot = array.array('i')
+        self._transition_source = array.array('i')
+        self._transition_target = array.array('i')
+        self._transition_invert = array.array('b')
+        self._transition_alive = array.array('b')
+        self._transition_alternatives = array.array('i')
+        self._transition_guard_start = array.array('q')
+        self._transition_guard_count = array.array('i')
+        self._transition_instr_start = array.array('q')
+        self._transition_instr_count = array.array('i')
+        self._guard_kind = array.array('b')
+        self._guard_slot = array.array('i')
+        self._guard_value = array.array('q')
+        self._guard_alternative = array.array('i')
+        self._instr_kind = array.array('b')
+        self._instr_slot = array.array('i')
+        self._instr_value = array.array('q')
+        self._instr_alternative = array.array('i')
+        self._actions = list()
+        self._action_index = dict()
+        self._value_sets = list()
+        self._value_set_index = dict()
+
+    def derive(self, state: Optional[STState] = None) -> 'STModule':
+        module = STModule()
+        module._num_of_nodes = self._num_of_nodes
+        module._state = state if state is not None else self._state.copy()
+        return module
 
     def new_node(self) -> STNodeID:
-        node = STNodeID(len(self._nodes))
-        self._nodes.add(node)
+        node = STNodeID(self._num_of_nodes)
+        self._num_of_nodes += 1
         return node
 
     def new_transition(self, node_slot: STSlotID, source_node: STNodeID, target_node: STNodeID, invert_guard: bool) -> STTransition:
-        trans_id = STTransitionID(len(self._transitions))
-        trans = STTransition(trans_id, node_slot, source_node, target_node, invert_guard)
-        self._transitions[trans_id] = trans
-        return trans
-    
+        index = len(self._transition_alive)
+        self._transition_node_slot.append(node_slot.identifier)
+        self._transition_source.append(source_node.node_id)
+        self._transition_target.append(target_node.node_id)
+        self._transition_invert.append(1 if invert_guard else 0)
+        self._transition_alive.append(1)
+        self._transition_alternatives.append(1)
+        self._transition_guard_start.append(len(self._guard_slot))
+        self._transition_guard_count.append(0)
+        self._transition_instr_start.append(len(self._instr_kind))
+        self._transition_instr_count.append(0)
+        self._num_of_transitions += 1
+        return STTransition(self, index)
+
     def delete_transition(self, transition_id: STTransitionID):
-        del self._transitions[transition_id]
-    
+        index = transition_id.transition_id
+        if not self._is_alive(index):
+            raise RHError(f'Unable to find transition {transition_id} in module')
+        self._transition_alive[index] = 0
+        self._num_of_transitions -= 1
+
     @property
     def nodes(self) -> Iterable[STNodeID]:
-        yield from self._nodes
-    
+        for node_id in range(self._num_of_nodes):
+            yield STNodeID(node_id)
+
     @property
     def transitions(self) -> Iterable[STTransition]:
-        yield from self._transitions.values()
+        for index, alive in enumerate(self._transition_alive):
+            if alive:
+                yield STTransition(self, index)
 
     @property
     def state(self) -> STState:
         return self._state
 
     def get_transition(self, transiton_id: STTransitionID) -> Optional[STTransition]:
-        return self._transitions.get(transiton_id, None)
-    
+        if self._is_alive(transiton_id.transition_id):
+            return STTransition(self, transiton_id.transition_id)
+        return None
+
+    def columns(self) -> STTransitionColumns:
+        columns = STTransitionColumns(
+            identifier=array.array('i'),
+            node_slot=array.array('i'),
+            source_node=array.array('i'),
+            target_node=array.array('i'),
+            invert_guard=array.array('b'),
+            alternatives=array.array('i'),
+            guard_offsets=array.array('q', [0]),
+            guard_kind=array.array('b'),
+            guard_slot=array.array('i'),
+            guard_value=array.array('q'),
+            guard_alternative=array.array('i'),
+            instr_offsets=array.array('q', [0]),
+            instr_kind=array.array('b'),
+            instr_slot=array.array('i'),
+            instr_value=array.array('q'),
+            instr_alternative=array.array('i'),
+            actions=list(self._actions),
+            value_sets=list(self._value_sets)
+        )
+        for index, alive in enumerate(self._transition_alive):
+            if not alive:
+                continue
+            guard_start = self._transition_guard_start[index]
+            guard_end = guard_start + self._transition_guard_count[index]
+            instr_start = self._transition_instr_start[index]
+            instr_end = instr_start + self._transition_instr_count[index]
+            columns.identifier.append(index)
+            columns.node_slot.append(self._transition_node_slot[index])
+            columns.source_node.append(self._transition_source[index])
+            columns.target_node.append(self._transition_target[index])
+            columns.invert_guard.append(1 if self._transition_invert[index] and guard_end > guard_start else 0)
+            columns.alternatives.append(self._transition_alternatives[index])
+            columns.guard_kind.extend(self._guard_kind[guard_start:guard_end])
+            columns.guard_slot.extend(self._guard_slot[guard_start:guard_end])
+            columns.guard_value.extend(self._guard_value[guard_start:guard_end])
+            columns.guard_alternative.extend(self._guard_alternative[guard_start:guard_end])
+            columns.guard_offsets.append(len(columns.guard_slot))
+            columns.instr_kind.extend(self._instr_kind[instr_start:instr_end])
+            columns.instr_slot.extend(self._instr_slot[instr_start:instr_end])
+            columns.instr_value.extend(self._instr_value[instr_start:instr_end])
+            columns.instr_alternative.extend(self._instr_alternative[instr_start:instr_end])
+            columns.instr_offsets.append(len(columns.instr_kind))
+        return columns
+
+    def copy_transitions(self, columns: STTransitionColumns, indices: Iterable[int]):
+        action_indices = list()
+        for action in columns.actions:
+            action_index = self._action_index.get(action, None)
+            if action_index is None:
+                action_index = len(self._actions)
+                self._actions.append(action)
+                self._action_index[action] = action_index
+            action_indices.append(action_index)
+        value_set_indices = [self._get_value_set(values) for values in columns.value_sets]
+
+        for index in indices:
+            guard_start, guard_end = columns.guard_offsets[index], columns.guard_offsets[index + 1]
+            instr_start, instr_end = columns.instr_offsets[index], columns.instr_offsets[index + 1]
+            self._transition_node_slot.append(columns.node_slot[index])
+            self._transition_source.append(columns.source_node[index])
+            self._transition_target.append(columns.target_node[index])
+            self._transition_invert.append(columns.invert_guard[index])
+            self._transition_alive.append(1)
+            self._transition_alternatives.append(columns.alternatives[index])
+            self._transition_guard_start.append(len(self._guard_slot))
+            self._transition_guard_count.append(guard_end - guard_start)
+            self._transition_instr_start.append(len(self._instr_kind))
+            self._transition_instr_count.append(instr_end - instr_start)
+            self._guard_kind.extend(columns.guard_kind[guard_start:guard_end])
+            self._guard_slot.extend(columns.guard_slot[guard_start:guard_end])
+            self._guard_alternative.extend(columns.guard_alternative[guard_start:guard_end])
+            for position in range(guard_start, guard_end):
+                if columns.guard_kind[position] == GUARD_INT_SET:
+                    self._guard_value.append(value_set_indices[columns.guard_value[position]])
+                else:
+                    self._guard_value.append(columns.guard_value[position])
+            self._instr_kind.extend(columns.instr_kind[instr_start:instr_end])
+            self._instr_slot.extend(columns.instr_slot[instr_start:instr_end])
+            self._instr_alternative.extend(columns.instr_alternative[instr_start:instr_end])
+            for position in range(instr_start, instr_end):
+                if columns.instr_kind[position] == INSTR_EXTERNAL_ACTION:
+                    self._instr_value.append(action_indices[columns.instr_value[position]])
+                else:
+                    self._instr_value.append(columns.instr_value[position])
+            self._num_of_transitions += 1
+
+    def _is_alive(self, index: int) -> bool:
+        return 0 <= index < len(self._transition_alive) and self._transition_alive[index] != 0
+
+    def _get_value_set(self, values: Tuple[int, ...]) -> int:
+        value_set_index = self._value_set_index.get(values, None)
+        if value_set_index is None:
+            value_set_index = len(self._value_sets)
+            self._value_sets.append(values)
+            self._value_set_index[values] = value_set_index
+        return value_set_index
+
+    def _guard_at(self, position: int) -> STGuardCondition:
+        kind, value = self._guard_kind[position], self._guard_value[position]
+        if kind == GUARD_INT_SET:
+            value = self._value_sets[value]
+        return st_guard_from_key(kind, self._guard_slot[position], value)
+
+    def _instruction_at(self, position: int) -> STInstruction:
+        if self._instr_kind[position] == INSTR_EXTERNAL_ACTION:
+            return STExternalActionInstruction(self._actions[self._instr_value[position]])
+        return st_slot_instruction_from_key(self._instr_kind[position], self._instr_slot[position], self._instr_value[position])
+
+    def _transition_guards(self, index: int) -> Iterable[STGuardCondition]:
+        start = self._transition_guard_start[index]
+        for position in range(start, start + self._transition_guard_count[index]):
+            yield self._guard_at(position)
+
+    def _transition_instructions(self, index: int) -> Iterable[STInstruction]:
+        start = self._transition_instr_start[index]
+        for position in range(start, start + self._transition_instr_count[index]):
+            yield self._instruction_at(position)
+
+    def _transition_alternative_list(self, index: int) -> Iterable[STTransitionAlternative]:
+        guard_start = self._transition_guard_start[index]
+        guard_end = guard_start + self._transition_guard_count[index]
+        instr_start = self._transition_instr_start[index]
+        instr_end = instr_start + self._transition_instr_count[index]
+        for alternative in range(self._transition_alternatives[index]):
+            yield STTransitionAlternative(
+                guards=[
+                    self._guard_at(position)
+                    for position in range(guard_start, guard_end)
+                    if self._guard_alternative[position] == alternative
+                ],
+                instructions=[
+                    self._instruction_at(position)
+                    for position in range(instr_start, instr_end)
+                    if self._instr_alternative[position] in (-1, alternative)
+                ]
+            )
+
+    def _add_transition_alternative(self, index: int) -> int:
+        if self._transition_invert[index]:
+            raise RHError('Inverted transition guards cannot have alternatives')
+        alternative = self._transition_alternatives[index]
+        self._transition_alternatives[index] = alternative + 1
+        return alternative
+
+    def _check_alternative(self, index: int, alternative: int):
+        if not 0 <= alternative < self._transition_alternatives[index]:
+            raise RHError(f'Unable to find alternative {alternative} of transition {STTransitionID(index)}')
+
+    def _add_transition_guard(self, index: int, guard: STGuardCondition, alternative: int):
+        if not isinstance(guard, STGuardCondition):
+            raise RHError(f'Unsupported guard condition {guard}')
+        self._check_alternative(index, alternative)
+        kind, slot, value = guard.key
+        if kind == GUARD_INT_SET:
+            value = self._get_value_set(value)
+        start, count = self._transition_guard_start[index], self._transition_guard_count[index]
+        if start + count != len(self._guard_slot):
+            self._transition_guard_start[index] = len(self._guard_slot)
+            self._guard_kind.extend(self._guard_kind[start:start + count])
+            self._guard_slot.extend(self._guard_slot[start:start + count])
+            self._guard_value.extend(self._guard_value[start:start + count])
+            self._guard_alternative.extend(self._guard_alternative[start:start + count])
+        self._guard_kind.append(kind)
+        self._guard_slot.append(slot)
+        self._guard_value.append(value)
+        self._guard_alternative.append(alternative)
+        self._transition_guard_count[index] = count + 1
+
+    def _add_transition_instruction(self, index: int, instruction: STInstruction, alternative: Optional[int]):
+        if slot_instr := instruction.as_slot():
+            kind, slot, value = slot_instr.key
+        elif ext_act := instruction.as_external_action():
+            action_index = self._action_index.get(ext_act.action, None)
+            if action_index is None:
+                action_index = len(self._actions)
+                self._actions.append(ext_act.action)
+                self._action_index[ext_act.action] = action_index
+            kind, slot, value = INSTR_EXTERNAL_ACTION, -1, action_index
+        else:
+            raise RHError(f'Unsupported instruction {instruction}')
+        if alternative is not None:
+            self._check_alternative(index, alternative)
+        start, count = self._transition_instr_start[index], self._transition_instr_count[index]
+        if start + count != len(self._instr_kind):
+            self._transition_instr_start[index] = len(self._instr_kind)
+            self._instr_kind.extend(self._instr_kind[start:start + count])
+            self._instr_slot.extend(self._instr_slot[start:start + count])
+            self._instr_value.extend(self._instr_value[start:start + count])
+            self._instr_alternative.extend(self._instr_alternative[start:start + count])
+        self._instr_kind.append(kind)
+        self._instr_slot.append(slot)
+        self._instr_value.append(value)
+        self._instr_alternative.append(alternative if alternative is not None else -1)
+        self._transition_instr_count[index] = count + 1
+
     def __getitem__(self, transition_id: STTransitionID) -> STTransition:
         transition = self.get_transition(transition_id)
         if transition is None:
             raise RHError(f'Unable to find transition {transition_id} in module')
         return transition
-    
+
     def __len__(self) -> int:
-        return len(self._transitions)
-    
+        return self._num_of_transitions
+
     def __iter__(self) -> Iterable[STTransition]:
-        yield from self._transitions.values()
-    
+        yield from self.transitions
+
     def __str__(self):
         out = io.StringIO()
         out.write(str(self.state))
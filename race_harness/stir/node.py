@@ -1,4 +1,6 @@
 class STNodeID:
+    __slots__ = ('_node_id',)
+
     def __init__(self, node_id: int):
         self._node_id = node_id
 
@@ -1,5 +1,6 @@
 import io
 from race_harness.stir import STModule, STState
+from race_harness.stir.module import INSTR_EXTERNAL_ACTION, INSTR_SET_INT, INSTR_SET_BIT, GUARD_INT, GUARD_BIT, GUARD_INT_SET
 
 class STSerialize:
     def __init__(self, out: io.TextIOBase):
@@ -16,20 +17,42 @@ class STSerialize:
                 self._out.write(f'slot {int_slot.identifier.identifier} int {int_slot.initial_value}\n')
             elif node_slot := slot.as_node():
                 self._out.write(f'slot {node_slot.identifier.identifier} node {node_slot.initial_value.node_id}\n')
+        if state.value_width < 4:
+            self._out.write(f'dump_width {state.value_width}\n')
 
     def serialize_transitions(self, module: STModule):
-        self._out.write(f'transitions {len(module)}\n')
-        for transition in module:
-            num_of_instr = sum(
-                1
-                for instr in transition.instructions
-                if instr.as_set_int() is not None
-            )
-            self._out.write(f'transition {transition.identifier.transition_id} component {transition.node_slot.identifier} src {transition.source_node_id.node_id} dst {transition.target_node_id.node_id} guards {transition.num_of_guards} {1 if transition.invert_guard else 0} instructions {num_of_instr}\n')
-            for guard in transition.guards:
-                if int_guard := guard.as_int():
-                    self._out.write(f'int_guard {int_guard.slot_id.identifier} {int_guard.value}\n')
+        columns = module.columns()
+        self._out.write(f'transitions {len(columns)}\n')
+        for index in range(len(columns)):
+            guard_start, guard_end = columns.guard_offsets[index], columns.guard_offsets[index + 1]
+            instr_start, instr_end = columns.instr_offsets[index], columns.instr_offsets[index + 1]
+            slot_instr_positions = [
+                position
+                for position in range(instr_start, instr_end)
+                if columns.instr_kind[position] != INSTR_EXTERNAL_ACTION
+            ]
+            self._out.write(f'transition {columns.identifier[index]} component {columns.node_slot[index]} src {columns.source_node[index]} dst {columns.target_node[index]} guards {guard_end - guard_start} {columns.invert_guard[index]} instructions {len(slot_instr_positions)}\n')
+            if columns.alternatives[index] > 1:
+                self._out.write(f'alternatives {columns.alternatives[index]}\n')
+            for position in range(guard_start, guard_end):
+                if columns.alternatives[index] > 1:
+                    self._out.write(f'@{columns.guard_alternative[position]} ')
+                if columns.guard_kind[position] == GUARD_INT:
+                    self._out.write(f'int_guard {columns.guard_slot[position]} {columns.guard_value[position]}\n')
+                elif columns.guard_kind[position] == GUARD_BIT:
+                    self._out.write(f'bit_guard {columns.guard_slot[position]} {columns.guard_value[position]}\n')
+                elif columns.guard_kind[position] == GUARD_INT_SET:
+                    values = columns.value_sets[columns.guard_value[position]]
+                    self._out.write('int_set_guard {} {} {}\n'.format(columns.guard_slot[position], len(values), ' '.join(str(value) for value in values)))
+                else:
+                    self._out.write(f'zero_guard {columns.guard_slot[position]}\n')
 
-            for instr in transition.instructions:
-                if set_int := instr.as_set_int():
-                    self._out.write(f'set_int_instr {set_int.slot_id.identifier} {set_int.value}\n')
\ No newline at end of file
+            for position in slot_instr_positions:
+                if columns.instr_alternative[position] >= 0:
+                    self._out.write(f'@{columns.instr_alternative[position]} ')
+                if columns.instr_kind[position] == INSTR_SET_INT:
+                    self._out.write(f'set_int_instr {columns.instr_slot[position]} {columns.instr_value[position]}\n')
+                elif columns.instr_kind[position] == INSTR_SET_BIT:
+                    self._out.write(f'set_bit_instr {columns.instr_slot[position]} {columns.instr_value[position]}\n')
+                else:
+                    self._out.write(f'clear_bit_instr {columns.instr_slot[position]} {columns.instr_value[position]}\n')
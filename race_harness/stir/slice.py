@@ -0,0 +1,53 @@
+from typing import Dict, Iterable, Optional, Tuple
+from race_harness.stir.module import STModule
+from race_harness.stir.state import STSlotID
+from race_harness.stir.transition import STTransition
+from race_harness.stir.instruction import STInstruction
+
+def _slice_instruction(instr: STInstruction, slot_ids: Dict[int, STSlotID]) -> STInstruction:
+    if slot_instr := instr.as_slot():
+        return slot_instr.with_slot(slot_ids[slot_instr.slot_id.identifier])
+    return instr
+
+def slice_st_module(module: STModule, slots: Iterable[int], transitions: Optional[Iterable[STTransition]] = None) -> Tuple[STModule, Dict[int, STSlotID]]:
+    slots = set(slots)
+    slice_module = STModule()
+    slot_ids = dict()
+    for slot in module.state:
+        identifier = slot.identifier.identifier
+        if identifier not in slots:
+            continue
+        if int_slot := slot.as_int():
+            slot_ids[identifier] = slice_module.state.new_int_slot(int_slot.initial_value)
+        elif node_slot := slot.as_node():
+            slot_ids[identifier] = slice_module.state.new_node_slot(node_slot.initial_value)
+        if value_range := module.state.value_range(slot.identifier):
+            slice_module.state.set_value_range(slot_ids[identifier], *value_range)
+
+    for transition in (transitions if transitions is not None else module.transitions):
+        if transition.node_slot.identifier not in slots:
+            continue
+        slice_transition = slice_module.new_transition(slot_ids[transition.node_slot.identifier], transition.source_node_id, transition.target_node_id, transition.invert_guard)
+        if transition.num_of_alternatives > 1:
+            for index, alternative in enumerate(transition.alternatives):
+                if index > 0:
+                    slice_transition.add_alternative()
+                for guard in alternative.guards:
+                    slice_transition.add_guard(guard.with_slot(slot_ids[guard.slot_id.identifier]), index)
+                for instr in alternative.instructions:
+                    slice_transition.add_instruction(_slice_instruction(instr, slot_ids), index)
+            continue
+        for guard in transition.guards:
+            slice_transition.add_guard(guard.with_slot(slot_ids[guard.slot_id.identifier]))
+        for instr in transition.instructions:
+            slice_transition.add_instruction(_slice_instruction(instr, slot_ids))
+    return slice_module, slot_ids
+
+def max_st_node_id(module: STModule) -> int:
+    max_node_id = 0
+    for slot in module.state:
+        if node_slot := slot.as_node():
+            max_node_id = max(max_node_id, node_slot.initial_value.node_id)
+    for transition in module.transitions:
+        max_node_id = max(max_node_id, transition.source_node_id.node_id, transition.target_node_id.node_id)
+    return max_node_id
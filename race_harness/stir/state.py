@@ -1,11 +1,13 @@
 import io
 import abc
-from typing import Optional, Union, Iterable
+from typing import Optional, Union, Iterable, Tuple
 from race_harness.error import RHError
 from race_harness.stir.node import STNodeID
 from race_harness.util.coerce import with_coercion_methods
 
 class STSlotID:
+    __slots__ = ('_identifier',)
+
     def __init__(self, identifier: int):
         self._identifier = identifier
 
@@ -24,6 +26,8 @@ class STSlotID:
 
 @with_coercion_methods
 class STSlot(abc.ABC):
+    __slots__ = ('_identifier',)
+
     def __init__(self, identifier: STSlotID):
         super().__init__()
         self._identifier = identifier
@@ -43,6 +47,8 @@ class STSlot(abc.ABC):
     def initial_value(self) -> Union[bool, int]: pass
 
 class STIntSlot(STSlot):
+    __slots__ = ('_init_value',)
+
     def __init__(self, identifier: STSlotID, initial_value: int):
         super().__init__(identifier)
         self._init_value = initial_value
@@ -58,6 +64,8 @@ class STIntSlot(STSlot):
         return f'{self.identifier}: int = {self.initial_value}'
     
 class STNodeSlot(STSlot):
+    __slots__ = ('_init_value',)
+
     def __init__(self, identifier: STSlotID, initial_value: STNodeID):
         super().__init__(identifier)
         self._init_value = initial_value
@@ -75,6 +83,7 @@ class STNodeSlot(STSlot):
 class STState:
     def __init__(self):
         self._slots = dict()
+        self._value_ranges = dict()
 
     def new_int_slot(self, init_value: int) -> STSlotID:
         slot_id = STSlotID(len(self._slots))
@@ -86,6 +95,30 @@ class STState:
         self._slots[slot_id] = STNodeSlot(slot_id, init_value)
         return slot_id
     
+    def copy(self) -> 'STState':
+        state = STState()
+        state._slots.update(self._slots)
+        state._value_ranges.update(self._value_ranges)
+        return state
+
+    def set_value_range(self, identifier: STSlotID, lower: int, upper: int):
+        self._value_ranges[identifier] = (lower, upper)
+
+    def value_range(self, identifier: STSlotID) -> Optional[Tuple[int, int]]:
+        return self._value_ranges.get(identifier, None)
+
+    @property
+    def value_width(self) -> int:
+        width = 1
+        for identifier in self._slots.keys():
+            value_range = self._value_ranges.get(identifier, None)
+            if value_range is None:
+                return 4
+            lower, upper = value_range
+            while width < 4 and not -(1 << (8 * width - 1)) <= lower <= upper < (1 << (8 * width - 1)):
+                width *= 2
+        return width
+
     def get_slot(self, identifier: STSlotID) -> Optional[STSlot]:
         return self._slots.get(identifier, None)
     
@@ -0,0 +1,6 @@
+from .renaming import STRenaming
+from .slots import optimize_st_module_slots
+from .nodes import optimize_st_module_nodes
+from .lbe import optimize_st_module_local_transitions
+from .liveness import optimize_st_module_slot_liveness
+from .alternatives import merge_st_module_alternatives, expand_st_module_alternatives
\ No newline at end of file
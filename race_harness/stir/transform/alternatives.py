@@ -0,0 +1,156 @@
+from typing import Dict, List, Tuple
+from race_harness.stir.module import STModule
+from race_harness.stir.guard import STGuardCondition, STIntGuardCondition, STIntSetGuardCondition
+from race_harness.stir.instruction import STInstruction
+from race_harness.stir.transform.renaming import STRenaming
+from race_harness.error import RHError
+
+STAlternative = Tuple[List[STGuardCondition], List[STInstruction]]
+
+def _instruction_key(instr: STInstruction):
+    if slot_instr := instr.as_slot():
+        return slot_instr.key
+    return (-1, -1, instr.as_external_action().action)
+
+def _alternative_key(alternative: STAlternative):
+    guards, instructions = alternative
+    return (
+        tuple(sorted(set(guard.key for guard in guards))),
+        tuple(_instruction_key(instr) for instr in instructions)
+    )
+
+def _value_set_keys(alternative: STAlternative):
+    guards, instructions = alternative
+    instr_key = tuple(_instruction_key(instr) for instr in instructions)
+    for position, guard in enumerate(guards):
+        if guard.as_int() or guard.as_int_set():
+            others = tuple(sorted(set(
+                other.key
+                for other_position, other in enumerate(guards)
+                if other_position != position
+            )))
+            yield position, (guard.slot_id.identifier, others, instr_key)
+
+def _guard_values(guard: STGuardCondition) -> Tuple[int, ...]:
+    if int_guard := guard.as_int():
+        return (int_guard.value,)
+    return guard.as_int_set().values
+
+def _collapse_value_sets(alternatives: List[STAlternative]) -> List[STAlternative]:
+    # Alternatives that only differ in the value of a single int guard are fused into a set-membership guard
+    changed = True
+    while changed:
+        changed = False
+        buckets = dict()
+        for index, alternative in enumerate(alternatives):
+            for position, key in _value_set_keys(alternative):
+                buckets.setdefault(key, list()).append((index, position))
+
+        merged = set()
+        collapsed = list()
+        for index, alternative in enumerate(alternatives):
+            if index in merged:
+                continue
+            for position, key in _value_set_keys(alternative):
+                members = [
+                    (member_index, member_position)
+                    for member_index, member_position in buckets[key]
+                    if member_index not in merged
+                ]
+                if len(members) < 2:
+                    continue
+                guards, instructions = alternative
+                values = set()
+                for member_index, member_position in members:
+                    values.update(_guard_values(alternatives[member_index][0][member_position]))
+                    merged.add(member_index)
+                guards = list(guards)
+                guards[position] = STIntSetGuardCondition(guards[position].slot_id, values)
+                collapsed.append((guards, instructions))
+                changed = True
+                break
+            else:
+                collapsed.append(alternative)
+        alternatives = collapsed
+    return alternatives
+
+def _unique_alternatives(alternatives: List[STAlternative]) -> List[STAlternative]:
+    unique = dict()
+    for alternative in alternatives:
+        unique.setdefault(_alternative_key(alternative), alternative)
+    return list(unique.values())
+
+def merge_st_module_alternatives(module: STModule) -> Tuple[STModule, STRenaming]:
+    merged_module = module.derive()
+    groups: Dict[object, list] = dict()
+    for transition in module.transitions:
+        if transition.invert_guard:
+            key = transition.identifier
+        else:
+            key = (transition.node_slot, transition.source_node_id, transition.target_node_id)
+        group = groups.setdefault(key, list())
+        if transition.invert_guard:
+            group.append((transition, list(transition.guards), list(transition.instructions)))
+        else:
+            group.extend(
+                (alternative.guards, alternative.instructions)
+                for alternative in transition.alternatives
+            )
+
+    for key, group in groups.items():
+        if not isinstance(key, tuple):
+            transition, guards, instructions = group[0]
+            merged_transition = merged_module.new_transition(transition.node_slot, transition.source_node_id, transition.target_node_id, True)
+            for guard in guards:
+                merged_transition.add_guard(guard)
+            for instr in instructions:
+                merged_transition.add_instruction(instr)
+            continue
+
+        alternatives = _collapse_value_sets(_unique_alternatives(group))
+        merged_transition = merged_module.new_transition(*key, False)
+        common = all(
+            _alternative_key(([], instructions)) == _alternative_key(([], alternatives[0][1]))
+            for _, instructions in alternatives
+        )
+        for index, (guards, instructions) in enumerate(alternatives):
+            if index > 0:
+                merged_transition.add_alternative()
+            for guard in guards:
+                merged_transition.add_guard(guard, index)
+            if not common:
+                for instr in instructions:
+                    merged_transition.add_instruction(instr, index)
+        if common:
+            for instr in alternatives[0][1]:
+                merged_transition.add_instruction(instr)
+    return merged_module, STRenaming()
+
+def expand_st_module_alternatives(module: STModule) -> STModule:
+    expanded_module = module.derive()
+    for transition in module.transitions:
+        if transition.invert_guard:
+            if any(guard.as_int_set() for guard in transition.guards):
+                raise RHError(f'Unable to expand inverted set-membership guard of transition {transition.identifier}')
+            alternatives = [(list(transition.guards), list(transition.instructions))]
+        else:
+            alternatives = list()
+            for alternative in transition.alternatives:
+                expansions = [list()]
+                for guard in alternative.guards:
+                    if int_set_guard := guard.as_int_set():
+                        expansions = [
+                            guards + [STIntGuardCondition(int_set_guard.slot_id, value)]
+                            for guards in expansions
+                            for value in int_set_guard.values
+                        ]
+                    else:
+                        expansions = [guards + [guard] for guards in expansions]
+                alternatives.extend((guards, alternative.instructions) for guards in expansions)
+        for guards, instructions in alternatives:
+            expanded_transition = expanded_module.new_transition(transition.node_slot, transition.source_node_id, transition.target_node_id, transition.invert_guard)
+            for guard in guards:
+                expanded_transition.add_guard(guard)
+            for instr in instructions:
+                expanded_transition.add_instruction(instr)
+    return expanded_module
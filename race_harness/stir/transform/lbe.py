@@ -0,0 +1,163 @@
+import dataclasses
+import itertools
+from typing import Dict, List, Optional, Set, Tuple
+from race_harness.stir.module import STModule
+from race_harness.stir.node import STNodeID
+from race_harness.stir.state import STSlotID
+from race_harness.stir.guard import STGuardCondition
+from race_harness.stir.instruction import STInstruction
+from race_harness.stir.transform.renaming import STRenaming
+
+@dataclasses.dataclass
+class LocalTransition:
+    component: int
+    source: int
+    target: int
+    invert_guard: bool
+    guards: List[STGuardCondition]
+    instructions: List[STInstruction]
+
+def _private_slots(module: STModule) -> Set[int]:
+    users = dict()
+    for transition in module.transitions:
+        component = transition.node_slot.identifier
+        for guard in transition.guards:
+            users.setdefault(guard.slot_id.identifier, set()).add(component)
+        for instr in transition.instructions:
+            if slot_instr := instr.as_slot():
+                users.setdefault(slot_instr.slot_id.identifier, set()).add(component)
+    return {
+        slot
+        for slot, components in users.items()
+        if len(components) == 1
+    }
+
+def _writes_private(transition: LocalTransition, private_slots: Set[int]) -> bool:
+    return all(
+        instr.as_slot().slot_id.identifier in private_slots
+        for instr in transition.instructions
+        if instr.as_slot()
+    )
+
+def _written_values(transition: LocalTransition) -> Tuple[Dict[int, int], Set[int]]:
+    writes = dict()
+    partial = set()
+    for instr in transition.instructions:
+        if set_int := instr.as_set_int():
+            writes[set_int.slot_id.identifier] = set_int.value
+            partial.discard(set_int.slot_id.identifier)
+        elif slot_instr := instr.as_slot():
+            slot = slot_instr.slot_id.identifier
+            if slot in writes:
+                writes[slot] = slot_instr.apply(writes[slot])
+            else:
+                partial.add(slot)
+    return writes, partial
+
+def _is_fusible(first: LocalTransition, second: LocalTransition) -> bool:
+    _, partial = _written_values(first)
+    return all(guard.slot_id.identifier not in partial for guard in second.guards)
+
+def _fuse(first: LocalTransition, second: LocalTransition) -> Optional[LocalTransition]:
+    writes, _ = _written_values(first)
+    guards = list()
+    holds = True
+    for guard in second.guards:
+        slot = guard.slot_id.identifier
+        if slot in writes:
+            holds = holds and guard.holds(writes[slot])
+        else:
+            guards.append(guard)
+    if second.invert_guard and not holds:
+        guards = list()
+    elif second.invert_guard and not guards:
+        return None
+    elif not second.invert_guard and not holds:
+        return None
+    return LocalTransition(
+        component=first.component,
+        source=first.source,
+        target=second.target,
+        invert_guard=second.invert_guard and holds,
+        guards=guards,
+        instructions=first.instructions + second.instructions
+    )
+
+def optimize_st_module_local_transitions(module: STModule) -> Tuple[STModule, STRenaming]:
+    private_slots = _private_slots(module)
+    transitions = dict()
+    incoming = dict()
+    outgoing = dict()
+    identifiers = itertools.count()
+    def add_transition(transition: LocalTransition):
+        identifier = next(identifiers)
+        transitions[identifier] = transition
+        incoming.setdefault((transition.component, transition.target), set()).add(identifier)
+        outgoing.setdefault((transition.component, transition.source), set()).add(identifier)
+    def drop_transition(identifier: int):
+        transition = transitions.pop(identifier)
+        incoming[(transition.component, transition.target)].discard(identifier)
+        outgoing[(transition.component, transition.source)].discard(identifier)
+
+    pinned = set()
+    represented = dict()
+    for slot in module.state:
+        if node_slot := slot.as_node():
+            pinned.add((slot.identifier.identifier, node_slot.initial_value.node_id))
+            represented[(slot.identifier.identifier, node_slot.initial_value.node_id)] = {node_slot.initial_value.node_id}
+    for transition in module.transitions:
+        local_transition = LocalTransition(
+            component=transition.node_slot.identifier,
+            source=transition.source_node_id.node_id,
+            target=transition.target_node_id.node_id,
+            invert_guard=transition.invert_guard,
+            guards=list(transition.guards),
+            instructions=list(transition.instructions)
+        )
+        add_transition(local_transition)
+        for node in (local_transition.source, local_transition.target):
+            represented[(local_transition.component, node)] = {node}
+        if any(instr.as_external_action() for instr in local_transition.instructions):
+            pinned.add((local_transition.component, local_transition.target))
+
+    changed = True
+    while changed:
+        changed = False
+        for node in sorted(represented.keys()):
+            if node in pinned or node not in represented:
+                continue
+            ins = [transitions[identifier] for identifier in incoming.get(node, ())]
+            outs = [transitions[identifier] for identifier in outgoing.get(node, ())]
+            if not ins or not outs or len(ins) * len(outs) > len(ins) + len(outs):
+                continue
+            if any(transition.source == transition.target for transition in outs):
+                continue
+            if any(transition.guards or not _writes_private(transition, private_slots) for transition in ins):
+                continue
+            if not all(_is_fusible(first, second) for first in ins for second in outs):
+                continue
+
+            for identifier in list(incoming[node]) + list(outgoing[node]):
+                drop_transition(identifier)
+            for first in ins:
+                represented[(node[0], first.source)].update(represented[node])
+                for second in outs:
+                    fused = _fuse(first, second)
+                    if fused is not None:
+                        add_transition(fused)
+            del represented[node]
+            changed = True
+
+    renaming = STRenaming()
+    for (component, node), originals in represented.items():
+        for original in originals:
+            renaming.map_node(component, original, node)
+
+    optimized = module.derive(module.state)
+    for transition in transitions.values():
+        optimized_transition = optimized.new_transition(STSlotID(transition.component), STNodeID(transition.source), STNodeID(transition.target), transition.invert_guard)
+        for guard in transition.guards:
+            optimized_transition.add_guard(guard)
+        for instr in transition.instructions:
+            optimized_transition.add_instruction(instr)
+    return optimized, renaming
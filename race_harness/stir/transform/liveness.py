@@ -0,0 +1,62 @@
+from typing import Dict, Set, Tuple
+from race_harness.stir.module import STModule
+from race_harness.stir.instruction import STSetIntInstruction
+from race_harness.stir.state import STSlotID
+from race_harness.stir.transform.renaming import STRenaming
+
+def _live_slots(module: STModule, component: int, readable: Set[int]) -> Dict[int, Set[int]]:
+    transitions = [
+        transition
+        for transition in module.transitions
+        if transition.node_slot.identifier == component
+    ]
+    live = dict()
+    for transition in transitions:
+        live.setdefault(transition.source_node_id.node_id, set())
+        live.setdefault(transition.target_node_id.node_id, set())
+
+    changed = True
+    while changed:
+        changed = False
+        for transition in reversed(transitions):
+            reads = {
+                guard.slot_id.identifier
+                for guard in transition.guards
+            } & readable
+            writes = {
+                instr.as_set_int().slot_id.identifier
+                for instr in transition.instructions
+                if instr.as_set_int()
+            }
+            live_in = (live[transition.target_node_id.node_id] - writes) | reads
+            if not live_in <= live[transition.source_node_id.node_id]:
+                live[transition.source_node_id.node_id].update(live_in)
+                changed = True
+    return live
+
+def optimize_st_module_slot_liveness(module: STModule) -> Tuple[STModule, STRenaming]:
+    readers = dict()
+    for transition in module.transitions:
+        for guard in transition.guards:
+            readers.setdefault(guard.slot_id.identifier, set()).add(transition.node_slot.identifier)
+    owned = dict()
+    for slot, components in readers.items():
+        if len(components) == 1:
+            owned.setdefault(next(iter(components)), set()).add(slot)
+
+    live = {
+        component: _live_slots(module, component, slots)
+        for component, slots in owned.items()
+    }
+    optimized = module.derive(module.state)
+    for transition in module.transitions:
+        component = transition.node_slot.identifier
+        optimized_transition = optimized.new_transition(transition.node_slot, transition.source_node_id, transition.target_node_id, transition.invert_guard)
+        for guard in transition.guards:
+            optimized_transition.add_guard(guard)
+        for instr in transition.instructions:
+            optimized_transition.add_instruction(instr)
+        if component in live:
+            for slot in sorted(owned[component] - live[component][transition.target_node_id.node_id]):
+                optimized_transition.add_instruction(STSetIntInstruction(STSlotID(slot), module.state[STSlotID(slot)].initial_value))
+    return optimized, STRenaming()
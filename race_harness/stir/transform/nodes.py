@@ -0,0 +1,84 @@
+from typing import Dict, Tuple
+from race_harness.stir.module import STModule
+from race_harness.stir.node import STNodeID
+from race_harness.stir.compact import compact_st_module
+from race_harness.stir.transform.renaming import STRenaming
+
+def _component_nodes(module: STModule) -> Dict[int, set]:
+    nodes = dict()
+    for slot in module.state:
+        if node_slot := slot.as_node():
+            nodes[slot.identifier.identifier] = {node_slot.initial_value.node_id}
+    for transition in module.transitions:
+        nodes[transition.node_slot.identifier].add(transition.source_node_id.node_id)
+        nodes[transition.node_slot.identifier].add(transition.target_node_id.node_id)
+    return nodes
+
+def _bisimulation_classes(module: STModule, component: int, nodes: set) -> Dict[int, int]:
+    edges = {node: list() for node in nodes}
+    for transition in module.transitions:
+        if transition.node_slot.identifier != component:
+            continue
+        label = (
+            transition.invert_guard,
+            tuple(sorted(set(
+                guard.key
+                for guard in transition.guards
+            ))),
+            tuple(
+                instr.as_slot().key
+                for instr in transition.instructions
+                if instr.as_slot()
+            )
+        )
+        edges[transition.source_node_id.node_id].append((label, transition.target_node_id.node_id))
+
+    classes = {node: 0 for node in nodes}
+    num_of_classes = 1
+    while True:
+        signatures = dict()
+        refined = dict()
+        for node in sorted(nodes):
+            signature = (classes[node], frozenset((label, classes[target]) for label, target in edges[node]))
+            refined[node] = signatures.setdefault(signature, len(signatures))
+        classes = refined
+        if len(signatures) == num_of_classes:
+            return classes
+        num_of_classes = len(signatures)
+
+def optimize_st_module_nodes(module: STModule, *, bisimulation: bool = False) -> Tuple[STModule, STRenaming]:
+    renaming = STRenaming()
+    renumbering = dict()
+    for component, nodes in _component_nodes(module).items():
+        if bisimulation:
+            classes = _bisimulation_classes(module, component, nodes)
+        else:
+            classes = {
+                node: index
+                for index, node in enumerate(sorted(nodes))
+            }
+        for node, renamed in classes.items():
+            renumbering[(component, node)] = STNodeID(renamed)
+            renaming.map_node(component, node, renamed)
+
+    renumbered = STModule()
+    for slot in module.state:
+        if int_slot := slot.as_int():
+            renumbered.state.new_int_slot(int_slot.initial_value)
+        elif node_slot := slot.as_node():
+            renumbered.state.new_node_slot(renumbering[(slot.identifier.identifier, node_slot.initial_value.node_id)])
+    for transition in module.transitions:
+        component = transition.node_slot.identifier
+        renumbered_transition = renumbered.new_transition(
+            transition.node_slot,
+            renumbering[(component, transition.source_node_id.node_id)],
+            renumbering[(component, transition.target_node_id.node_id)],
+            transition.invert_guard
+        )
+        for guard in transition.guards:
+            renumbered_transition.add_guard(guard)
+        for instr in transition.instructions:
+            renumbered_transition.add_instruction(instr)
+    if bisimulation:
+        renumbered = compact_st_module(renumbered)
+    return renumbered, renaming
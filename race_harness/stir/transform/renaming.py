@@ -0,0 +1,51 @@
+import itertools
+from typing import Iterable, List, Tuple
+
+class STRenaming:
+    def __init__(self):
+        self._slots = dict()
+        self._nodes = dict()
+
+    def map_slot(self, original: int, renamed: int):
+        self._slots[renamed] = original
+
+    def map_node(self, slot: int, original: int, renamed: int):
+        self._nodes.setdefault((slot, renamed), list()).append(original)
+
+    def original_slot(self, renamed: int) -> int:
+        return self._slots.get(renamed, renamed)
+
+    def original_nodes(self, slot: int, renamed: int) -> List[int]:
+        return self._nodes.get((slot, renamed), [renamed])
+
+    def then(self, renaming: 'STRenaming') -> 'STRenaming':
+        composed = STRenaming()
+        if renaming._slots:
+            for renamed, original in renaming._slots.items():
+                composed.map_slot(self.original_slot(original), renamed)
+        else:
+            composed._slots.update(self._slots)
+        if renaming._nodes:
+            for (slot, renamed), originals in renaming._nodes.items():
+                for original in originals:
+                    for node in self.original_nodes(renaming.original_slot(slot), original):
+                        composed.map_node(slot, node, renamed)
+        else:
+            renamed_slots = {
+                original: renamed
+                for renamed, original in renaming._slots.items()
+            }
+            for (slot, renamed), originals in self._nodes.items():
+                composed._nodes[(renamed_slots.get(slot, slot), renamed)] = list(originals)
+        return composed
+
+    def restore(self, cooccurrences: Iterable[Tuple[int, int, int, int]]) -> Iterable[Tuple[int, int, int, int]]:
+        restored = set()
+        for slot1, node1, slot2, node2 in cooccurrences:
+            original_slot1, original_slot2 = self.original_slot(slot1), self.original_slot(slot2)
+            for original_node1, original_node2 in itertools.product(self.original_nodes(slot1, node1), self.original_nodes(slot2, node2)):
+                if original_slot1 < original_slot2:
+                    restored.add((original_slot1, original_node1, original_slot2, original_node2))
+                else:
+                    restored.add((original_slot2, original_node2, original_slot1, original_node1))
+        yield from sorted(restored)
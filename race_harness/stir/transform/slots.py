@@ -0,0 +1,100 @@
+from typing import Tuple
+from race_harness.stir.module import STModule
+from race_harness.stir.state import STState, STSlotID
+from race_harness.stir.domain import STValueDomains
+from race_harness.stir.transform.renaming import STRenaming
+
+def _eliminate_slots(module: STModule) -> Tuple[STModule, bool]:
+    domains = STValueDomains(module)
+    guarded = set()
+    for transition in domains.feasible_transitions:
+        for guard in transition.guards:
+            guarded.add(guard.slot_id.identifier)
+
+    constants = dict()
+    kept = set()
+    for slot in module.state:
+        identifier = slot.identifier.identifier
+        if slot.as_node():
+            kept.add(identifier)
+        elif domains.constant(identifier) is not None:
+            constants[identifier] = domains.constant(identifier)
+        elif identifier in guarded:
+            kept.add(identifier)
+
+    optimized = module.derive(module.state)
+    changed = False
+    for transition in module.transitions:
+        if not domains.is_feasible(transition):
+            changed = True
+            continue
+
+        guards = list()
+        holds = True
+        for guard in transition.guards:
+            slot = guard.slot_id.identifier
+            if slot in constants:
+                holds = holds and guard.holds(constants[slot])
+            else:
+                guards.append(guard)
+        if transition.invert_guard:
+            if not holds:
+                guards = list()
+            elif not guards:
+                changed = True
+                continue
+        elif not holds:
+            changed = True
+            continue
+
+        optimized_transition = optimized.new_transition(transition.node_slot, transition.source_node_id, transition.target_node_id, transition.invert_guard and holds)
+        for guard in guards:
+            optimized_transition.add_guard(guard)
+        for instr in transition.instructions:
+            if (slot_instr := instr.as_slot()) and slot_instr.slot_id.identifier not in kept:
+                changed = True
+                continue
+            optimized_transition.add_instruction(instr)
+        changed = changed or len(guards) < transition.num_of_guards
+    return optimized, changed
+
+def _renumber_slots(module: STModule) -> Tuple[STModule, STRenaming]:
+    used = set()
+    for transition in module.transitions:
+        used.add(transition.node_slot.identifier)
+        for guard in transition.guards:
+            used.add(guard.slot_id.identifier)
+        for instr in transition.instructions:
+            if slot_instr := instr.as_slot():
+                used.add(slot_instr.slot_id.identifier)
+
+    renaming = STRenaming()
+    state = STState()
+    slot_ids = dict()
+    for slot in module.state:
+        identifier = slot.identifier.identifier
+        if int_slot := slot.as_int():
+            if identifier in used:
+                slot_ids[identifier] = state.new_int_slot(int_slot.initial_value)
+        elif node_slot := slot.as_node():
+            slot_ids[identifier] = state.new_node_slot(node_slot.initial_value)
+        if identifier in slot_ids:
+            renaming.map_slot(identifier, slot_ids[identifier].identifier)
+
+    renumbered = module.derive(state)
+    for transition in module.transitions:
+        renumbered_transition = renumbered.new_transition(slot_ids[transition.node_slot.identifier], transition.source_node_id, transition.target_node_id, transition.invert_guard)
+        for guard in transition.guards:
+            renumbered_transition.add_guard(guard.with_slot(slot_ids[guard.slot_id.identifier]))
+        for instr in transition.instructions:
+            if slot_instr := instr.as_slot():
+                renumbered_transition.add_instruction(slot_instr.with_slot(slot_ids[slot_instr.slot_id.identifier]))
+            else:
+                renumbered_transition.add_instruction(instr)
+    return renumbered, renaming
+
+def optimize_st_module_slots(module: STModule) -> Tuple[STModule, STRenaming]:
+    changed = True
+    while changed:
+        module, changed = _eliminate_slots(module)
+    return _renumber_slots(module)
@@ -1,11 +1,14 @@
 import io
-from typing import Iterable
+import dataclasses
+from typing import Iterable, List, Optional
 from race_harness.stir.guard import STGuardCondition
 from race_harness.stir.instruction import STInstruction
 from race_harness.stir.state import STSlotID
 from race_harness.stir.node import STNodeID
     
 class STTransitionID:
+    __slots__ = ('_transition_id',)
+
     def __init__(self, transition_id: int):
         self._transition_id = transition_id
 
@@ -22,62 +25,91 @@ class STTransitionID:
     def __str__(self):
         return f'@{self.transition_id}'
 
+@dataclasses.dataclass
+class STTransitionAlternative:
+    guards: List[STGuardCondition]
+    instructions: List[STInstruction]
+
 class STTransition:
-    def __init__(self, transition_id: STTransitionID, node_slot: STSlotID, source_node_id: STNodeID, target_node_id: STNodeID, invert_gurard: bool):
-        self._transition_id = transition_id
-        self._node_slot = node_slot
-        self._source_node_id = source_node_id
-        self._target_node_id = target_node_id
-        self._invert_guard = invert_gurard
-        self._guards = list()
-        self._instructions = list()
+    __slots__ = ('_module', '_index')
+
+    def __init__(self, module, index: int):
+        self._module = module
+        self._index = index
 
     @property
     def identifier(self) -> STTransitionID:
-        return self._transition_id
+        return STTransitionID(self._index)
     
     @property
     def node_slot(self) -> STSlotID:
-        return self._node_slot
+        return STSlotID(self._module._transition_node_slot[self._index])
 
     @property
     def source_node_id(self) -> STNodeID:
-        return self._source_node_id
+        return STNodeID(self._module._transition_source[self._index])
     
     @property
     def target_node_id(self) -> STNodeID:
-        return self._target_node_id
+        return STNodeID(self._module._transition_target[self._index])
     
     @property
     def invert_guard(self) -> bool:
-        return self._invert_guard and len(self._guards) > 0
+        return self._module._transition_invert[self._index] != 0 and self.num_of_guards > 0
 
     @property
     def guards(self) -> Iterable[STGuardCondition]:
-        yield from self._guards
+        yield from self._module._transition_guards(self._index)
 
     @property
     def instructions(self) -> Iterable[STInstruction]:
-        yield from self._instructions
+        yield from self._module._transition_instructions(self._index)
+
+    @property
+    def alternatives(self) -> Iterable[STTransitionAlternative]:
+        yield from self._module._transition_alternative_list(self._index)
 
-    def add_guard(self, guard: STGuardCondition):
-        self._guards.append(guard)
+    def add_guard(self, guard: STGuardCondition, alternative: int = 0):
+        self._module._add_transition_guard(self._index, guard, alternative)
 
-    def add_instruction(self, instruction: STInstruction):
-        self._instructions.append(instruction)
+    def add_instruction(self, instruction: STInstruction, alternative: Optional[int] = None):
+        self._module._add_transition_instruction(self._index, instruction, alternative)
+
+    def add_alternative(self) -> int:
+        return self._module._add_transition_alternative(self._index)
+
+    @property
+    def num_of_alternatives(self) -> int:
+        return self._module._transition_alternatives[self._index]
 
     @property
     def num_of_guards(self) -> int:
-        return len(self._guards)
+        return self._module._transition_guard_count[self._index]
     
     @property
     def num_of_instructions(self) -> int:
-        return len(self._instructions)
+        return self._module._transition_instr_count[self._index]
+
+    def __eq__(self, value):
+        return isinstance(value, STTransition) and self._module is value._module and self._index == value._index
+
+    def __hash__(self):
+        return hash(self._index)
 
     def __str__(self):
         out = io.StringIO()
         out.write(f'({self.node_slot}: {self.source_node_id} -> {self.target_node_id})')
-        if self._guards:
+        if self.num_of_alternatives > 1:
+            for alternative in self.alternatives:
+                out.write(' | if (\n')
+                for guard in alternative.guards:
+                    out.write(f'  {guard}\n')
+                out.write(') {\n')
+                for instr in alternative.instructions:
+                    out.write(f'  {instr}\n')
+                out.write('}')
+            return out.getvalue()
+        if self.num_of_guards:
             if self.invert_guard:
                 out.write(f' if !(\n')
             else:
@@ -85,7 +117,7 @@ class STTransition:
             for guard in self.guards:
                 out.write(f'  {guard}\n')
             out.write(')')
-        if self._instructions:
+        if self.num_of_instructions:
             out.write(' {\n')
             for instr in self.instructions:
                 out.write(f'  {instr}\n')
@@ -1,2 +1,2 @@
-from .rhst import RHSTTranslator
+from .rhst import RHSTTranslator, STChannelEncoding
 from .mapping import STRHMapping
\ No newline at end of file
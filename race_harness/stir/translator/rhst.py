@@ -1,10 +1,28 @@
+import enum
+import array
 import dataclasses
+import concurrent.futures
 from typing import Dict, List, Tuple, Optional, Iterable, Set
-from race_harness.ir import RHModule, RHContext, RHProtocol, RHProcess, RHInstance, RHEffectBlock, RHUnconditionalControlFlowEdge, RHConditionalControlFlowEdge, RHPredicate, RHRef, RHSet, RHDomain
+from race_harness.ir import RHModule, RHContext, RHProcess, RHInstance, RHEffectBlock, RHUnconditionalControlFlowEdge, RHConditionalControlFlowEdge, RHPredicate, RHRef, RHSet, RHDomain
 from race_harness.ir.util.dominance import RHControlFlowDominators
-from race_harness.stir import STModule, STNodeID, STExternalActionInstruction, STSlotID, STTransition, STSetIntInstruction, STIntGuardCondition
+from race_harness.ir.util.communication import RHCommunicationIndex
+from race_harness.ir.entities.block import RHTransmissionOp
+from race_harness.stir.module import STTransitionColumns
+from race_harness.stir import STModule, STNodeID, STInstruction, STExternalActionInstruction, STSlotID, STTransition, STSetIntInstruction, STSetBitInstruction, STClearBitInstruction, STIntGuardCondition, STBitGuardCondition, STMaskZeroGuardCondition
 from race_harness.stir.translator.mapping import STRHMapping
 
+SET_MASK_WIDTH = 31
+
+class STChannelEncoding(enum.Enum):
+    # One slot per sender/receiver pair holding the pending message
+    Pairwise = 'pairwise'
+    # One slot per sender holding the last multicast message plus per-receiver consumption bits.
+    # Equivalent to pairwise, hence only chosen for domains whose senders always multicast to the same receivers
+    Broadcast = 'broadcast'
+    # One slot per receiver holding the pending (sender, message). Lossy: a pending message is overwritten by
+    # a message from another sender, so interleavings with several pending senders (and their co-occurrences) are lost
+    Mailbox = 'mailbox'
+
 @dataclasses.dataclass
 class BlockContext:
     block: RHEffectBlock
@@ -17,49 +35,68 @@ class InstanceContext:
     entry_node: STNodeID
     exit_node: STNodeID
     node_slot: STSlotID
-    dominance: RHControlFlowDominators
+
+@dataclasses.dataclass
+class TemplateTransition:
+    source_node: int
+    target_node: int
+    block: RHEffectBlock
+    neg_condition: bool
+    condition: Optional[RHPredicate]
+    # Identities with a protocol parameter side, the bindings are indexed by the values of their other sides
+    identities: List[Tuple[RHRef, RHRef]]
+    bindings: Dict[Tuple[Optional[RHRef], ...], List[Dict[RHRef, Tuple[RHRef, RHRef]]]]
+
+@dataclasses.dataclass
+class ProcessTemplate:
+    # Template node 0 is the instance entry node, node i > 0 stands for the block blocks[i - 1]
+    process: RHProcess
+    blocks: List[RHEffectBlock]
+    transitions: List[TemplateTransition]
 
 @dataclasses.dataclass
 class TranslatorContext:
     module: RHModule
-    protocol_impl: Dict[RHProtocol, RHProcess]
+    communication: RHCommunicationIndex
     instance_context: Dict[RHInstance, InstanceContext]
     blocks: Dict[Tuple[RHInstance, RHEffectBlock], BlockContext]
     message_slots: Dict[Tuple[RHRef, RHRef, RHRef], STSlotID]
+    message_mask_slots: Dict[Tuple[RHRef, RHRef, RHRef], STSlotID]
+    channel_encodings: Dict[RHRef, STChannelEncoding]
+    broadcast_receivers: Dict[Tuple[RHRef, RHRef], Dict[RHRef, int]]
     set_element_slots: Dict[Tuple[RHRef, RHRef, RHRef], STSlotID]
     message_domains: Dict[RHRef, RHDomain]
-    outbound_messaging: Dict[RHRef, Set[RHProcess]]
-    inbound_messaging: Dict[RHRef, Set[RHProcess]]
+    templates: Dict[RHProcess, ProcessTemplate]
 
 @dataclasses.dataclass
-class BindingsContainer:
-    bindings: Dict[RHRef, RHRef]
-
-    def __hash__(self):
-        res = 0
-        for key, value in self.bindings.items():
-            res = res * 31 + hash(key) * 17 + hash(value)
-        return res
-    
-    def __eq__(self, other):
-        if not isinstance(other, BindingsContainer):
-            return False
-        
-        for key, value in self.bindings.items():
-            if key not in other.bindings or value != other.bindings[key]:
-                return False
-            
-        for key, value in other.bindings.items():
-            if key not in self.bindings or value != self.bindings[key]:
-                return False
-        
-        return True
+class InstanceFragment:
+    # Translation of a single instance into a local module, merged by replaying its slot requests
+    columns: STTransitionColumns
+    num_of_nodes: int
+    node_slot: int
+    blocks: List[Tuple[int, int]]
+    slot_requests: List[Tuple[str, Tuple[int, ...], List[int]]]
 
 class RHSTTranslator:
-    def __init__(self, context: RHContext, st_module: STModule):
+    def __init__(self, context: RHContext, st_module: STModule, *, bitmask_sets: bool = False, channel_encoding: STChannelEncoding = STChannelEncoding.Pairwise, jobs: Optional[int] = None, communication: Optional[RHCommunicationIndex] = None):
         self._context = context
         self._st_module = st_module
+        self._bitmask_sets = bitmask_sets
+        self._channel_encoding = channel_encoding
+        self._jobs = jobs
+        self._communication = communication
+        self._slot_requests = None
         self._mapping = STRHMapping()
+        self._node_slots = dict()
+        self._message_slots = dict()
+        self._message_mask_slots = dict()
+        self._channel_encodings = dict()
+        self._broadcast_slots = dict()
+        self._mailbox_slots = dict()
+        self._mailbox_values = dict()
+        self._set_element_slots = dict()
+        self._set_mask_slots = dict()
+        self._set_element_positions = dict()
 
     @property
     def st_module(self) -> STModule:
@@ -68,114 +105,329 @@ class RHSTTranslator:
     @property
     def mapping(self) -> STRHMapping:
         return self._mapping
+
+    @property
+    def node_slots(self) -> Dict[RHRef, STSlotID]:
+        return self._node_slots
+
+    @property
+    def message_slots(self) -> Dict[Tuple[RHRef, RHRef, RHRef], STSlotID]:
+        return self._message_slots
+
+    @property
+    def message_mask_slots(self) -> Dict[Tuple[RHRef, RHRef, RHRef], STSlotID]:
+        return self._message_mask_slots
+
+    @property
+    def channel_encodings(self) -> Dict[RHRef, STChannelEncoding]:
+        return self._channel_encodings
+
+    @property
+    def set_element_slots(self) -> Dict[Tuple[RHRef, RHRef, RHRef], STSlotID]:
+        return self._set_element_slots
+
+    @property
+    def set_mask_slots(self) -> Dict[Tuple[RHRef, RHRef], List[STSlotID]]:
+        return self._set_mask_slots
     
     def translate_module(self, module: RHModule):
+        communication = self._communication
+        if communication is None:
+            communication = RHCommunicationIndex(self._context)
+            communication.build(module)
         trans_ctx = TranslatorContext(
             module=module,
-            protocol_impl=dict(),
+            communication=communication,
             instance_context=dict(),
             blocks=dict(),
-            message_slots=dict(),
-            set_element_slots=dict(),
-            message_domains=dict(),
-            outbound_messaging=dict(),
-            inbound_messaging=dict()
+            message_slots=self._message_slots,
+            message_mask_slots=self._message_mask_slots,
+            channel_encodings=self._channel_encodings,
+            broadcast_receivers=dict(),
+            set_element_slots=self._set_element_slots,
+            message_domains=communication.message_domains,
+            templates=dict()
         )
-        for process in module.processes:
-            trans_ctx.protocol_impl[process.protocol] = process
-            for domain in process.protocol.in_protocol:
-                for message in domain:
-                    trans_ctx.message_domains[message] = domain
-                if domain not in trans_ctx.inbound_messaging:
-                    trans_ctx.inbound_messaging[domain.ref] = set()
-                trans_ctx.inbound_messaging[domain.ref].add(process)
-
-            for domain in process.protocol.out_protocol:
-                for message in domain:
-                    trans_ctx.message_domains[message] = domain
-                if domain.ref not in trans_ctx.outbound_messaging:
-                    trans_ctx.outbound_messaging[domain.ref] = set()
-                trans_ctx.outbound_messaging[domain.ref].add(process)
         for instance in module.instances:
             entry_node = self._st_module.new_node()
             trans_ctx.instance_context[instance] = InstanceContext(
                 instance=instance,
-                process=trans_ctx.protocol_impl[instance.protocol],
+                process=communication.instance_process(instance.ref),
                 entry_node=entry_node,
                 exit_node=self._st_module.new_node(),
-                node_slot=self._st_module.state.new_node_slot(entry_node),
-                dominance=RHControlFlowDominators(self._context)
+                node_slot=self._st_module.state.new_node_slot(entry_node)
             )
-            trans_ctx.instance_context[instance].dominance.build(trans_ctx.instance_context[instance].process.entry_block.ref, trans_ctx.instance_context[instance].process.control_flow)
+            self._node_slots[instance.ref] = trans_ctx.instance_context[instance].node_slot
 
+        self._choose_channel_encodings(trans_ctx)
+        if self._jobs is not None and self._jobs > 1 and len(trans_ctx.instance_context) > 1:
+            self._translate_instances_parallel(trans_ctx)
+            return
         for instance_ctx in trans_ctx.instance_context.values():
             self.translate_instance(trans_ctx, instance_ctx)
 
     def translate_instance(self, trans_ctx: TranslatorContext, instance_ctx: InstanceContext):
-        visited_blocks = set()
-        block_queue = [(instance_ctx.entry_node, False, None, instance_ctx.process.entry_block)]
+        template = trans_ctx.templates.get(instance_ctx.process, None)
+        if template is None:
+            template = self.translate_process(trans_ctx, instance_ctx.process)
+            trans_ctx.templates[instance_ctx.process] = template
+        self.instantiate_template(trans_ctx, instance_ctx, template)
 
+    def _translate_instances_parallel(self, trans_ctx: TranslatorContext):
+        for instance_ctx in trans_ctx.instance_context.values():
+            if instance_ctx.process not in trans_ctx.templates:
+                trans_ctx.templates[instance_ctx.process] = self.translate_process(trans_ctx, instance_ctx.process)
+
+        with concurrent.futures.ProcessPoolExecutor(max_workers=self._jobs, initializer=_init_fragment_worker, initargs=(self, trans_ctx)) as executor:
+            fragments = executor.map(_translate_fragment, [instance.ref.uid for instance in trans_ctx.instance_context.keys()])
+            for instance_ctx, fragment in zip(trans_ctx.instance_context.values(), fragments):
+                self._merge_fragment(trans_ctx, instance_ctx, fragment)
+
+    def translate_fragment(self, trans_ctx: TranslatorContext, instance: RHInstance) -> InstanceFragment:
+        translator = RHSTTranslator(self._context, STModule(), bitmask_sets=self._bitmask_sets, channel_encoding=self._channel_encoding, communication=trans_ctx.communication)
+        translator._mailbox_values = self._mailbox_values
+        translator._set_element_positions = self._set_element_positions
+        translator._slot_requests = dict()
+        local_ctx = dataclasses.replace(
+            trans_ctx,
+            blocks=dict(),
+            message_slots=translator._message_slots,
+            message_mask_slots=translator._message_mask_slots,
+            set_element_slots=translator._set_element_slots
+        )
+        entry_node = translator._st_module.new_node()
+        instance_ctx = InstanceContext(
+            instance=instance,
+            process=trans_ctx.instance_context[instance].process,
+            entry_node=entry_node,
+            exit_node=translator._st_module.new_node(),
+            node_slot=translator._st_module.state.new_node_slot(entry_node)
+        )
+        translator.translate_instance(local_ctx, instance_ctx)
+        return InstanceFragment(
+            columns=translator._st_module.columns(),
+            num_of_nodes=sum(1 for _ in translator._st_module.nodes),
+            node_slot=instance_ctx.node_slot.identifier,
+            blocks=[
+                (node.node_id, block_ref.uid)
+                for node, (_, block_ref) in translator._mapping
+            ],
+            slot_requests=[
+                (kind, args, self._flatten_slots(slots))
+                for (kind, args), slots in translator._slot_requests.items()
+            ]
+        )
+
+    def _merge_fragment(self, trans_ctx: TranslatorContext, instance_ctx: InstanceContext, fragment: InstanceFragment):
+        nodes = [instance_ctx.entry_node.node_id, instance_ctx.exit_node.node_id]
+        for _ in range(len(nodes), fragment.num_of_nodes):
+            nodes.append(self._st_module.new_node().node_id)
+        for node, block_uid in fragment.blocks:
+            block = self._context[RHRef(block_uid, self._context)].to_effect_block()
+            trans_ctx.blocks[(instance_ctx.instance, block)] = BlockContext(block=block, node=STNodeID(nodes[node]))
+            self._mapping.map_to(STNodeID(nodes[node]), instance_ctx.instance.ref, block.ref)
+
+        slots = {fragment.node_slot: instance_ctx.node_slot.identifier, -1: -1}
+        for kind, args, local_slots in fragment.slot_requests:
+            refs = [RHRef(uid, self._context) for uid in args]
+            if kind == 'msg':
+                global_slots = self._get_msg_slot(trans_ctx, *refs)
+            elif kind == 'mailbox':
+                global_slots = self._get_mailbox_slot(trans_ctx, *refs)
+            elif kind == 'broadcast':
+                global_slots = self._get_broadcast_slots(trans_ctx, *refs)
+            elif kind == 'set_element':
+                global_slots = self._get_set_element_slot(trans_ctx, instance_ctx, *refs)
+            else:
+                global_slots = self._get_set_mask_slots(trans_ctx, instance_ctx, *refs)
+            slots.update(zip(local_slots, self._flatten_slots(global_slots)))
+
+        columns = fragment.columns
+        self._st_module.copy_transitions(dataclasses.replace(
+            columns,
+            node_slot=array.array('i', (slots[slot] for slot in columns.node_slot)),
+            source_node=array.array('i', (nodes[node] for node in columns.source_node)),
+            target_node=array.array('i', (nodes[node] for node in columns.target_node)),
+            guard_slot=array.array('i', (slots[slot] for slot in columns.guard_slot)),
+            instr_slot=array.array('i', (slots[slot] for slot in columns.instr_slot))
+        ), range(len(columns)))
+
+    @staticmethod
+    def _flatten_slots(slots) -> List[int]:
+        if isinstance(slots, STSlotID):
+            return [slots.identifier]
+        return [
+            slot
+            for subslots in slots
+            for slot in RHSTTranslator._flatten_slots(subslots)
+        ]
+
+    def _request_slots(self, kind: str, refs: Tuple[RHRef, ...], slots):
+        if self._slot_requests is not None:
+            self._slot_requests.setdefault((kind, tuple(ref.uid for ref in refs)), slots)
+        return slots
+
+    def translate_process(self, trans_ctx: TranslatorContext, process: RHProcess) -> ProcessTemplate:
+        dominance = RHControlFlowDominators(self._context)
+        dominance.build(process.entry_block.ref, process.control_flow)
+        template = ProcessTemplate(
+            process=process,
+            blocks=list(),
+            transitions=list()
+        )
+        parameters = set(process.protocol.parameters)
+        enumerations = dict()
+
+        visited_blocks = set()
+        block_nodes = dict()
+        block_queue = [(0, False, None, process.entry_block)]
         while block_queue:
             pred_node, neg_condition, condition, block = block_queue.pop()
             if (pred_node, block) in visited_blocks:
                 continue
             visited_blocks.add((pred_node, block))
 
-            block_ctx = trans_ctx.blocks.get((instance_ctx.instance, block), None)
-            if block_ctx is None:
+            node = block_nodes.get(block, None)
+            if node is None:
+                template.blocks.append(block)
+                node = len(template.blocks)
+                block_nodes[block] = node
+            self.traverse_block(process, block, node, block_queue)
+            enumeration = enumerations.get((block, condition), None)
+            if enumeration is None:
+                enumeration = self._enumerate_block_bindings(trans_ctx, process, dominance, parameters, block, condition)
+                enumerations[(block, condition)] = enumeration
+            param_identities, bindings = enumeration
+            template.transitions.append(TemplateTransition(
+                source_node=pred_node,
+                target_node=node,
+                block=block,
+                neg_condition=neg_condition,
+                condition=condition,
+                identities=param_identities,
+                bindings=bindings
+            ))
+        return template
+
+    def _enumerate_block_bindings(self, trans_ctx: TranslatorContext, process: RHProcess, dominance: RHControlFlowDominators, parameters: Set[RHRef], block: RHEffectBlock, condition: Optional[RHPredicate]) -> Tuple[List[Tuple[RHRef, RHRef]], Dict[Tuple[Optional[RHRef], ...], List[Dict[RHRef, Tuple[RHRef, RHRef]]]]]:
+        identities = self._condition_identities(condition)
+        param_identities = [
+            (left, right)
+            for left, right in identities
+            if left in parameters or right in parameters
+        ]
+        bindings = dict()
+        for binding in self._enumerate_conditions_bindings(trans_ctx, self._dominating_conditions(process, dominance, block, condition), [
+            identity
+            for identity in identities
+            if identity not in param_identities
+        ]):
+            key = tuple(
+                None if left in parameters and right in parameters else self._resolve_binding(binding, right if left in parameters else left)
+                for left, right in param_identities
+            )
+            bindings.setdefault(key, list()).append(binding)
+        return param_identities, bindings
+
+    def instantiate_template(self, trans_ctx: TranslatorContext, instance_ctx: InstanceContext, template: ProcessTemplate):
+        nodes = [instance_ctx.entry_node]
+        parameters = {
+            param_id: (None, param)
+            for param_id, param in zip(instance_ctx.instance.protocol.parameters, instance_ctx.instance.parameters)
+        }
+        translations = dict()
+        for template_transition in template.transitions:
+            if template_transition.target_node == len(nodes):
                 block_ctx = BlockContext(
-                    block=block,
+                    block=template_transition.block,
                     node=self._st_module.new_node()
                 )
-                trans_ctx.blocks[(instance_ctx.instance, block)] = block_ctx
-                self._mapping.map_to(block_ctx.node, instance_ctx.instance.ref, block.ref)
-            self.traverse_block(instance_ctx, block_ctx, block_queue)
-            self.translate_block(trans_ctx, instance_ctx, block_ctx, pred_node, neg_condition, condition)
+                trans_ctx.blocks[(instance_ctx.instance, template_transition.block)] = block_ctx
+                self._mapping.map_to(block_ctx.node, instance_ctx.instance.ref, template_transition.block.ref)
+                nodes.append(block_ctx.node)
+            block_ctx = trans_ctx.blocks[(instance_ctx.instance, template_transition.block)]
+            source_node = nodes[template_transition.source_node]
+            # Transitions into the same block under the same condition only differ in their source node
+            translation_key = (template_transition.block, template_transition.neg_condition, template_transition.condition)
+            translated = translations.get(translation_key, None)
+            if translated is not None:
+                for transition in translated:
+                    self._copy_transition(transition, source_node)
+                continue
+            translated = list()
+            key = self._parameter_identities_key(parameters, template_transition.identities)
+            for bindings in template_transition.bindings.get(key, ()):
+                transition = self.translate_block(trans_ctx, instance_ctx, block_ctx, source_node, template_transition.neg_condition, template_transition.condition, {
+                    **parameters,
+                    **bindings
+                })
+                if transition is not None:
+                    translated.append(transition)
+            translations[translation_key] = translated
+
+    def _copy_transition(self, transition: STTransition, source_node: STNodeID) -> STTransition:
+        copy = self._st_module.new_transition(transition.node_slot, source_node, transition.target_node_id, transition.invert_guard)
+        for guard in transition.guards:
+            copy.add_guard(guard)
+        for instr in transition.instructions:
+            copy.add_instruction(instr)
+        return copy
 
-    def traverse_block(self, instance_ctx: InstanceContext, block_ctx: BlockContext, block_queue: List[Tuple[STNodeID, bool, RHPredicate, RHEffectBlock]]):
-        edge = instance_ctx.process.control_flow.edge_from(block_ctx.block.ref)
+    def _parameter_identities_key(self, parameters: Dict[RHRef, Tuple[None, RHRef]], identities: List[Tuple[RHRef, RHRef]]) -> Optional[Tuple[Optional[RHRef], ...]]:
+        key = list()
+        for left, right in identities:
+            if left in parameters and right in parameters:
+                if parameters[left][1] != parameters[right][1]:
+                    return None
+                key.append(None)
+            else:
+                key.append(parameters[left if left in parameters else right][1])
+        return tuple(key)
+
+    def traverse_block(self, process: RHProcess, block: RHEffectBlock, node: int, block_queue: List[Tuple[int, bool, RHPredicate, RHEffectBlock]]):
+        edge = process.control_flow.edge_from(block.ref)
         if edge is not None:
             if isinstance(edge, RHUnconditionalControlFlowEdge):
-                block_queue.append((block_ctx.node, False, None, edge.target))
+                block_queue.append((node, False, None, edge.target))
             elif isinstance(edge, RHConditionalControlFlowEdge):
-                block_queue.append((block_ctx.node, False, edge.condition, edge.target))
-                block_queue.append((block_ctx.node, True, edge.condition, edge.alternative))
+                block_queue.append((node, False, edge.condition, edge.target))
+                block_queue.append((node, True, edge.condition, edge.alternative))
 
-    def translate_block(self, trans_ctx: TranslatorContext, instance_ctx: InstanceContext, block_ctx: BlockContext, pred_node: STNodeID, neg_condition: bool, condition: Optional[RHPredicate]):
+    def _dominating_conditions(self, process: RHProcess, dominance: RHControlFlowDominators, block: RHEffectBlock, condition: Optional[RHPredicate]) -> List[Optional[RHPredicate]]:
         dom_conditions = [condition]
-        for dom in instance_ctx.dominance[block_ctx.block.ref]:
-            if edge := instance_ctx.process.control_flow.edge_from(dom):
-                if isinstance(edge, RHConditionalControlFlowEdge) and edge.condition != condition:
-                    dom_conditions.append(edge.condition)
-        for bindings in self._enumerate_conditions_bindings(trans_ctx, instance_ctx, dom_conditions):
-            transition = self._st_module.new_transition(instance_ctx.node_slot, pred_node, block_ctx.node, neg_condition)
-            if condition is not None:
-                if not self.translate_condition(trans_ctx, instance_ctx, transition, neg_condition, condition, bindings):
-                    self._st_module.delete_transition(transition.identifier)
-                    continue
-
-            for oper in block_ctx.block.content:
-                if ext_action := oper.as_external_action():
-                    transition.add_instruction(STExternalActionInstruction(ext_action.external_action))
-                elif trans := oper.as_transmission():
-                    for dst in trans.destinations:
-                        _, dst = bindings.get(dst, (None, dst))
-                        dst_entity = self._context[dst]
-                        if dst_entity.as_instance():
-                            msg_slot = self._get_msg_slot(trans_ctx, instance_ctx.instance.ref, dst_entity.ref, trans.message)
-                            transition.add_instruction(STSetIntInstruction(msg_slot, trans.message.uid))
-                        elif dst_entity.as_domain():
-                            for subdst in dst_entity.as_domain().items:
-                                msg_slot = self._get_msg_slot(trans_ctx, instance_ctx.instance.ref, subdst, trans.message)
-                                transition.add_instruction(STSetIntInstruction(msg_slot, trans.message.uid))
-                elif set_add := oper.as_set_add():
-                    _, value = bindings.get(set_add.value, (None, set_add.value))
+        for edge in dominance.conditional_dominators(block.ref):
+            if edge.condition != condition:
+                dom_conditions.append(edge.condition)
+        return dom_conditions
+
+    def translate_block(self, trans_ctx: TranslatorContext, instance_ctx: InstanceContext, block_ctx: BlockContext, pred_node: STNodeID, neg_condition: bool, condition: Optional[RHPredicate], bindings: Dict[RHRef, Tuple[RHRef, RHRef]]) -> Optional[STTransition]:
+        transition = self._st_module.new_transition(instance_ctx.node_slot, pred_node, block_ctx.node, neg_condition)
+        if condition is not None:
+            if not self.translate_condition(trans_ctx, instance_ctx, transition, neg_condition, condition, bindings):
+                self._st_module.delete_transition(transition.identifier)
+                return None
+
+        for oper in block_ctx.block.content:
+            if ext_action := oper.as_external_action():
+                transition.add_instruction(STExternalActionInstruction(ext_action.external_action))
+            elif trans := oper.as_transmission():
+                for instr in self._translate_transmission(trans_ctx, instance_ctx, trans, bindings):
+                    transition.add_instruction(instr)
+            elif set_add := oper.as_set_add():
+                _, value = bindings.get(set_add.value, (None, set_add.value))
+                if mask_bit := self._get_set_element_bit(trans_ctx, instance_ctx, set_add.target_set, value):
+                    transition.add_instruction(STSetBitInstruction(*mask_bit))
+                else:
                     elt_slot = self._get_set_element_slot(trans_ctx, instance_ctx, set_add.target_set, value)
                     transition.add_instruction(STSetIntInstruction(elt_slot, 1))
-                elif set_del := oper.as_set_del():
-                    _, value = bindings.get(set_del.value, (None, set_del.value))
+            elif set_del := oper.as_set_del():
+                _, value = bindings.get(set_del.value, (None, set_del.value))
+                if mask_bit := self._get_set_element_bit(trans_ctx, instance_ctx, set_del.target_set, value):
+                    transition.add_instruction(STClearBitInstruction(*mask_bit))
+                else:
                     elt_slot = self._get_set_element_slot(trans_ctx, instance_ctx, set_del.target_set, value)
                     transition.add_instruction(STSetIntInstruction(elt_slot, 0))
+        return transition
 
     def translate_condition(self, trans_ctx: TranslatorContext, instance_ctx: InstanceContext, transition: STTransition, neg_condition: bool, condition: RHPredicate, bindings: Dict[RHRef, Tuple[RHRef, RHRef]]):
         if condition.operation.as_nondet():
@@ -188,27 +440,159 @@ class RHSTTranslator:
             else:
                 return False
         elif set_empty := condition.operation.as_set_empty():
-            set: RHSet = self._context[set_empty.target_set].to_set()
-            for elt in self._context[set.domain].to_domain():
-                slot_id = self._get_set_element_slot(trans_ctx, instance_ctx, set_empty.target_set, elt)
-                transition.add_guard(STIntGuardCondition(slot_id, 0))
+            if self._bitmask_sets:
+                for mask_slot in self._get_set_mask_slots(trans_ctx, instance_ctx, set_empty.target_set):
+                    transition.add_guard(STMaskZeroGuardCondition(mask_slot))
+            else:
+                set: RHSet = self._context[set_empty.target_set].to_set()
+                for elt in self._context[set.domain].to_domain():
+                    slot_id = self._get_set_element_slot(trans_ctx, instance_ctx, set_empty.target_set, elt)
+                    transition.add_guard(STIntGuardCondition(slot_id, 0))
         elif set_has := condition.operation.as_set_has():
             value = bindings.get(set_has.value, set_has.value)
-            slot_id = self._get_set_element_slot(trans_ctx, instance_ctx, set_has.target_set, value)
-            transition.add_guard(STIntGuardCondition(slot_id, 1))
+            if mask_bit := self._get_set_element_bit(trans_ctx, instance_ctx, set_has.target_set, value):
+                transition.add_guard(STBitGuardCondition(*mask_bit))
+            else:
+                slot_id = self._get_set_element_slot(trans_ctx, instance_ctx, set_has.target_set, value)
+                transition.add_guard(STIntGuardCondition(slot_id, 1))
         elif condition.operation.as_receival():
             if condition.ref in bindings:
                 msg, sender = bindings[condition.ref]
-                slot_id = self._get_msg_slot(trans_ctx, sender, instance_ctx.instance.ref, msg)
-                transition.add_guard(STIntGuardCondition(slot_id, msg.uid))
-                if not neg_condition:
-                    transition.add_instruction(STSetIntInstruction(slot_id, -1))
+                self._translate_receival(trans_ctx, transition, sender, instance_ctx.instance.ref, msg, not neg_condition)
         elif conjunction := condition.operation.as_conjunction():
             for conj in conjunction.conjuncts:
                 if not self.translate_condition(trans_ctx, instance_ctx, transition, neg_condition, self._context[conj].to_predicate(), bindings):
                     return False
         return True
 
+    def _translate_transmission(self, trans_ctx: TranslatorContext, instance_ctx: InstanceContext, trans: RHTransmissionOp, bindings: Dict[RHRef, Tuple[RHRef, RHRef]]) -> Iterable[STInstruction]:
+        sender_ref = instance_ctx.instance.ref
+        broadcast_key = (sender_ref, trans_ctx.message_domains[trans.message].ref)
+        for dst in trans.destinations:
+            _, dst = bindings.get(dst, (None, dst))
+            dst_entity = self._context[dst]
+            if dst_entity.as_domain() and broadcast_key in trans_ctx.broadcast_receivers:
+                msg_slot, mask_slots = self._get_broadcast_slots(trans_ctx, *broadcast_key)
+                yield STSetIntInstruction(msg_slot, trans.message.uid)
+                num_of_receivers = len(trans_ctx.broadcast_receivers[broadcast_key])
+                for word, mask_slot in enumerate(mask_slots):
+                    yield STSetIntInstruction(mask_slot, (1 << min(SET_MASK_WIDTH, num_of_receivers - word * SET_MASK_WIDTH)) - 1)
+            elif dst_entity.as_instance():
+                yield self._translate_message_write(trans_ctx, sender_ref, dst_entity.ref, trans.message)
+            elif dst_entity.as_domain():
+                for subdst in dst_entity.as_domain().items:
+                    yield self._translate_message_write(trans_ctx, sender_ref, subdst, trans.message)
+
+    def _translate_message_write(self, trans_ctx: TranslatorContext, sender_ref: RHRef, receiver_ref: RHRef, message_ref: RHRef) -> STInstruction:
+        if trans_ctx.channel_encodings[trans_ctx.message_domains[message_ref].ref] == STChannelEncoding.Mailbox:
+            slot_id = self._get_mailbox_slot(trans_ctx, sender_ref, receiver_ref, message_ref)
+            return STSetIntInstruction(slot_id, self._mailbox_values[(sender_ref, message_ref)])
+        slot_id = self._get_msg_slot(trans_ctx, sender_ref, receiver_ref, message_ref)
+        return STSetIntInstruction(slot_id, message_ref.uid)
+
+    def _translate_receival(self, trans_ctx: TranslatorContext, transition: STTransition, sender_ref: RHRef, receiver_ref: RHRef, message_ref: RHRef, consume: bool):
+        domain_ref = trans_ctx.message_domains[message_ref].ref
+        receivers = trans_ctx.broadcast_receivers.get((sender_ref, domain_ref), dict())
+        if receiver_ref in receivers:
+            msg_slot, mask_slots = self._get_broadcast_slots(trans_ctx, sender_ref, domain_ref)
+            mask_slot, bit = mask_slots[receivers[receiver_ref] // SET_MASK_WIDTH], receivers[receiver_ref] % SET_MASK_WIDTH
+            transition.add_guard(STIntGuardCondition(msg_slot, message_ref.uid))
+            transition.add_guard(STBitGuardCondition(mask_slot, bit))
+            if consume:
+                transition.add_instruction(STClearBitInstruction(mask_slot, bit))
+        elif trans_ctx.channel_encodings[domain_ref] == STChannelEncoding.Mailbox:
+            slot_id = self._get_mailbox_slot(trans_ctx, sender_ref, receiver_ref, message_ref)
+            transition.add_guard(STIntGuardCondition(slot_id, self._mailbox_values[(sender_ref, message_ref)]))
+            if consume:
+                transition.add_instruction(STSetIntInstruction(slot_id, -1))
+        else:
+            slot_id = self._get_msg_slot(trans_ctx, sender_ref, receiver_ref, message_ref)
+            transition.add_guard(STIntGuardCondition(slot_id, message_ref.uid))
+            if consume:
+                transition.add_instruction(STSetIntInstruction(slot_id, -1))
+
+    def _get_broadcast_slots(self, trans_ctx: TranslatorContext, sender_ref: RHRef, domain_ref: RHRef) -> Tuple[STSlotID, List[STSlotID]]:
+        key = (sender_ref, domain_ref)
+        slots = self._broadcast_slots.get(key, None)
+        if slots is None:
+            receivers = trans_ctx.broadcast_receivers[key]
+            msg_slot = self._st_module.state.new_int_slot(-1)
+            mask_slots = [
+                self._st_module.state.new_int_slot(0)
+                for _ in range(0, len(receivers), SET_MASK_WIDTH)
+            ]
+            for receiver_ref, position in receivers.items():
+                trans_ctx.message_slots[(sender_ref, receiver_ref, domain_ref)] = msg_slot
+                trans_ctx.message_mask_slots[(sender_ref, receiver_ref, domain_ref)] = mask_slots[position // SET_MASK_WIDTH]
+            slots = (msg_slot, mask_slots)
+            self._broadcast_slots[key] = slots
+        return self._request_slots('broadcast', (sender_ref, domain_ref), slots)
+
+    def _get_mailbox_slot(self, trans_ctx: TranslatorContext, sender_ref: RHRef, receiver_ref: RHRef, message_ref: RHRef) -> STSlotID:
+        domain_ref = trans_ctx.message_domains[message_ref].ref
+        slot_id = self._mailbox_slots.get((receiver_ref, domain_ref), None)
+        if slot_id is None:
+            slot_id = self._st_module.state.new_int_slot(-1)
+            self._mailbox_slots[(receiver_ref, domain_ref)] = slot_id
+        trans_ctx.message_slots[(sender_ref, receiver_ref, domain_ref)] = slot_id
+        return self._request_slots('mailbox', (sender_ref, receiver_ref, message_ref), slot_id)
+
+    def _choose_channel_encodings(self, trans_ctx: TranslatorContext):
+        receivers = dict()
+        for instance_ctx in trans_ctx.instance_context.values():
+            parameters = dict(zip(instance_ctx.instance.protocol.parameters, instance_ctx.instance.parameters))
+            for block in self._process_blocks(instance_ctx.process):
+                for oper in block.content:
+                    if trans := oper.as_transmission():
+                        key = (instance_ctx.instance.ref, trans_ctx.message_domains[trans.message].ref)
+                        targets = set()
+                        for dst in trans.destinations:
+                            dst_domain = self._context[parameters.get(dst, dst)].as_domain()
+                            if dst_domain is None:
+                                targets = None
+                                break
+                            targets.update(dst_domain.items)
+                        if targets is None or receivers.get(key, targets) != targets:
+                            receivers[key] = None
+                        else:
+                            receivers[key] = targets
+
+        domain_receivers = dict()
+        for (sender_ref, domain_ref), targets in receivers.items():
+            domain_receivers.setdefault(domain_ref, dict())[sender_ref] = targets
+        for domain_ref in {domain.ref for domain in trans_ctx.message_domains.values()}:
+            sender_targets = domain_receivers.get(domain_ref, dict())
+            if self._channel_encoding != STChannelEncoding.Pairwise and sender_targets and all(
+                targets is not None and 1 + (len(targets) + SET_MASK_WIDTH - 1) // SET_MASK_WIDTH < len(targets)
+                for targets in sender_targets.values()
+            ):
+                trans_ctx.channel_encodings[domain_ref] = STChannelEncoding.Broadcast
+                for sender_ref, targets in sender_targets.items():
+                    trans_ctx.broadcast_receivers[(sender_ref, domain_ref)] = {
+                        receiver_ref: position
+                        for position, receiver_ref in enumerate(sorted(targets))
+                    }
+            elif self._channel_encoding == STChannelEncoding.Mailbox:
+                trans_ctx.channel_encodings[domain_ref] = STChannelEncoding.Mailbox
+                domain = self._context[domain_ref].to_domain()
+                for sender_position, instance in enumerate(sorted(trans_ctx.instance_context.keys(), key=lambda instance: instance.ref)):
+                    for message_position, message_ref in enumerate(sorted(domain.items)):
+                        self._mailbox_values[(instance.ref, message_ref)] = sender_position * len(domain) + message_position
+            else:
+                trans_ctx.channel_encodings[domain_ref] = STChannelEncoding.Pairwise
+
+    def _process_blocks(self, process: RHProcess) -> Iterable[RHEffectBlock]:
+        visited = set()
+        queue = [process.entry_block]
+        while queue:
+            block = queue.pop()
+            if block.ref in visited:
+                continue
+            visited.add(block.ref)
+            yield block
+            if edge := process.control_flow.edge_from(block.ref):
+                queue.extend(edge.successors)
+
     def _get_msg_slot(self, trans_ctx: TranslatorContext, sender_ref: RHRef, receiver_ref: RHRef, message_ref: RHRef) -> STSlotID:
         domain_ref = trans_ctx.message_domains[message_ref].ref
         key = (sender_ref, receiver_ref, domain_ref)
@@ -216,7 +600,7 @@ class RHSTTranslator:
         if slot_id is None:
             slot_id = self._st_module.state.new_int_slot(-1)
             trans_ctx.message_slots[key] = slot_id
-        return slot_id
+        return self._request_slots('msg', (sender_ref, receiver_ref, message_ref), slot_id)
     
     def _get_set_element_slot(self, trans_ctx: TranslatorContext, instance_ctx: InstanceContext, set_ref: RHRef, element_ref: RHRef) -> STSlotID:
         key = (instance_ctx.instance.ref, set_ref, element_ref)
@@ -224,81 +608,133 @@ class RHSTTranslator:
         if slot_id is None:
             slot_id = self._st_module.state.new_int_slot(0)
             trans_ctx.set_element_slots[key] = slot_id
-        return slot_id
+        return self._request_slots('set_element', (set_ref, element_ref), slot_id)
     
-    def _enumerate_conditions_bindings(self, trans_ctx: TranslatorContext, instance_ctx: InstanceContext, conditions: List[RHPredicate]) -> Iterable[Dict[RHRef, Tuple[RHRef, RHRef]]]:
-        if not conditions:
-            yield dict()
-            return
+    def _get_set_mask_slots(self, trans_ctx: TranslatorContext, instance_ctx: InstanceContext, set_ref: RHRef) -> List[STSlotID]:
+        key = (instance_ctx.instance.ref, set_ref)
+        mask_slots = self._set_mask_slots.get(key, None)
+        if mask_slots is None:
+            positions = self._get_set_element_positions(set_ref)
+            mask_slots = [
+                self._st_module.state.new_int_slot(0)
+                for _ in range(0, max(len(positions), 1), SET_MASK_WIDTH)
+            ]
+            for element_ref, position in positions.items():
+                trans_ctx.set_element_slots[(instance_ctx.instance.ref, set_ref, element_ref)] = mask_slots[position // SET_MASK_WIDTH]
+            self._set_mask_slots[key] = mask_slots
+        return self._request_slots('set_mask', (set_ref,), mask_slots)
 
-        head = conditions[0]
-        tail = conditions[1:]
-        has_bindings = False
-        for binding in self._enumerate_condition_bindings(trans_ctx, instance_ctx, head):
-            for binding2 in self._enumerate_conditions_bindings(trans_ctx, instance_ctx, tail):
-                yield {
-                    **binding,
-                    **binding2
-                }
-                has_bindings = True
-        if not has_bindings:
-            yield dict()
-    
-    def _enumerate_condition_bindings(self, trans_ctx: TranslatorContext, instance_ctx: InstanceContext, condition: Optional[RHPredicate]) -> Iterable[Dict[RHRef, Tuple[RHRef, RHRef]]]:
-        base = {
-            param_id: (None, param)
-            for param_id, param in zip(instance_ctx.instance.protocol.parameters, instance_ctx.instance.parameters)
-        }
+    def _get_set_element_bit(self, trans_ctx: TranslatorContext, instance_ctx: InstanceContext, set_ref: RHRef, element_ref: RHRef) -> Optional[Tuple[STSlotID, int]]:
+        if not self._bitmask_sets:
+            return None
+        position = self._get_set_element_positions(set_ref).get(element_ref, None)
+        if position is None:
+            return None
+        mask_slots = self._get_set_mask_slots(trans_ctx, instance_ctx, set_ref)
+        return mask_slots[position // SET_MASK_WIDTH], position % SET_MASK_WIDTH
 
-        if condition is None:
-            yield base
-            return
-        
-        visited = set()
-        for binding in self._enumerate_condition_bindings_impl(trans_ctx, instance_ctx, condition):
-            container = BindingsContainer(binding)
-            if container not in visited:
-                yield {
-                    **base,
-                    **binding
-                }
-                visited.add(container)
-        if not visited:
-            yield base
-    
-    def _enumerate_condition_bindings_impl(self, trans_ctx: TranslatorContext, instance_ctx: InstanceContext, condition: RHPredicate) -> Iterable[Dict[RHRef, Tuple[RHRef, RHRef]]]:
-        if condition.operation.as_receival():
-            for msg in condition.operation.as_receival().messages:
-                for instance in self._enum_sender_instances(trans_ctx, msg):
-                    yield {
-                        condition.ref: (msg, instance.ref)
-                    }
-        elif condition.operation.as_conjunction():
-            yield from self._enum_conjunction_bindings(trans_ctx, instance_ctx, condition.operation.as_conjunction().conjuncts)
+    def _get_set_element_positions(self, set_ref: RHRef) -> Dict[RHRef, int]:
+        positions = self._set_element_positions.get(set_ref, None)
+        if positions is None:
+            set: RHSet = self._context[set_ref].to_set()
+            positions = {
+                element_ref: position
+                for position, element_ref in enumerate(sorted(self._context[set.domain].to_domain()))
+            }
+            self._set_element_positions[set_ref] = positions
+        return positions
 
-    def _enum_conjunction_bindings(self, trans_ctx: TranslatorContext, instance_ctx: InstanceContext, conjuncts: List[RHRef]) -> Iterable[Dict[RHRef, Tuple[RHRef, RHRef]]]:
-        if not conjuncts:
-            return
+    def _enumerate_conditions_bindings(self, trans_ctx: TranslatorContext, conditions: List[Optional[RHPredicate]], identities: List[Tuple[RHRef, RHRef]]) -> Iterable[Dict[RHRef, Tuple[RHRef, RHRef]]]:
+        choices = [
+            choice
+            for condition in conditions
+            for choice in self._condition_choices(trans_ctx, condition)
+        ]
+        # Each identity is checked as soon as the last choice binding one of its sides has been made
+        checks = [list() for _ in range(len(choices) + 1)]
+        for left, right in identities:
+            depth = 0
+            for position, choice in enumerate(choices):
+                if any(left in binding or right in binding for binding in choice):
+                    depth = position + 1
+            checks[depth].append((left, right))
 
-        conj_head = conjuncts[0]
-        conj_tail = conjuncts[1:]
+        visited = set()
+        for binding in self._solve_bindings(choices, checks, 0, dict()):
+            key = frozenset(binding.items())
+            if key not in visited:
+                visited.add(key)
+                yield binding
 
-        if not conj_tail:
-            yield from self._enumerate_condition_bindings(trans_ctx, instance_ctx, self._context[conj_head].to_predicate())
+    def _solve_bindings(self, choices: List[List[Dict[RHRef, Tuple[RHRef, RHRef]]]], checks: List[List[Tuple[RHRef, RHRef]]], depth: int, bound: Dict[RHRef, Tuple[RHRef, RHRef]]) -> Iterable[Dict[RHRef, Tuple[RHRef, RHRef]]]:
+        for left, right in checks[depth]:
+            if self._resolve_binding(bound, left) != self._resolve_binding(bound, right):
+                return
+        if depth == len(choices):
+            yield bound
             return
-        
-        for variant in self._enumerate_condition_bindings(trans_ctx, instance_ctx, self._context[conj_head].to_predicate()):
-            for subvariant in self._enum_conjunction_bindings(trans_ctx, instance_ctx, conj_tail):
-                yield {
-                    **variant,
-                    **subvariant
+        for binding in choices[depth]:
+            yield from self._solve_bindings(choices, checks, depth + 1, {
+                **bound,
+                **binding
+            })
+
+    def _condition_choices(self, trans_ctx: TranslatorContext, condition: Optional[RHPredicate]) -> List[List[Dict[RHRef, Tuple[RHRef, RHRef]]]]:
+        if condition is None:
+            return []
+        elif receival := condition.operation.as_receival():
+            senders = dict.fromkeys(
+                (msg, instance.ref)
+                for msg in receival.messages
+                for instance in self._enum_sender_instances(trans_ctx, msg)
+            )
+            if not senders:
+                return []
+            return [[
+                {
+                    condition.ref: sender
                 }
+                for sender in senders
+            ]]
+        elif conjunction := condition.operation.as_conjunction():
+            return [
+                choice
+                for conj in conjunction.conjuncts
+                for choice in self._condition_choices(trans_ctx, self._context[conj].to_predicate())
+            ]
+        return []
+
+    def _condition_identities(self, condition: Optional[RHPredicate]) -> List[Tuple[RHRef, RHRef]]:
+        if condition is None:
+            return []
+        elif identity := condition.operation.as_identity():
+            return [(identity.left, identity.right)]
+        elif conjunction := condition.operation.as_conjunction():
+            return [
+                pair
+                for conj in conjunction.conjuncts
+                for pair in self._condition_identities(self._context[conj].to_predicate())
+            ]
+        return []
+
+    @staticmethod
+    def _resolve_binding(bindings: Dict[RHRef, Tuple[RHRef, RHRef]], ref: RHRef) -> RHRef:
+        return bindings.get(ref, (None, ref))[1]
 
     def _enum_sender_instances(self, trans_ctx: TranslatorContext, msg: RHRef) -> Iterable[RHInstance]:
-        for process in self._enum_senders(trans_ctx, msg):
-            for instance_ctx in trans_ctx.instance_context.values():
-                if instance_ctx.process.ref == process.ref:
-                    yield instance_ctx.instance
+        yield from trans_ctx.communication.domain_sender_instances(trans_ctx.message_domains[msg].ref)
+
+
+_FRAGMENT_WORKER = None
+
+def _init_fragment_worker(translator: RHSTTranslator, trans_ctx: TranslatorContext):
+    global _FRAGMENT_WORKER
+    _FRAGMENT_WORKER = (translator, trans_ctx, {
+        instance.ref.uid: instance
+        for instance in trans_ctx.instance_context.keys()
+    })
+
+def _translate_fragment(instance_uid: int) -> InstanceFragment:
+    translator, trans_ctx, instances = _FRAGMENT_WORKER
+    return translator.translate_fragment(trans_ctx, instances[instance_uid])
 
-    def _enum_senders(self, trans_ctx: TranslatorContext, msg: RHRef) -> Iterable[RHProcess]:
-        yield from trans_ctx.outbound_messaging.get(trans_ctx.message_domains[msg].ref, ())